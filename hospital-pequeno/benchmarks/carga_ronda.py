@@ -0,0 +1,327 @@
+"""
+Prueba de carga de una ronda de la mañana contra gunicorn.
+
+Cada técnico simulado es un hilo con su propia sesión que hace lo mismo que en
+una ronda real:
+
+    login        formulario de ingreso y envío de las credenciales
+    panel        carga del panel
+    envio        `--envios` registros de ronda con las dos firmas (trazos)
+    historial    las dos primeras páginas del historial
+    exportacion  solicitud de la exportación PDF del historial
+
+Por cada configuración de `--configs` (workers x hilos) se inicia gunicorn con
+`gunicorn.conf.py`, los técnicos hacen la ronda al mismo tiempo y se reportan
+p50/p95/p99 por endpoint. Al final se recomienda la configuración con más
+peticiones por segundo cuyo p95 de envíos no supera `--objetivo-p95`.
+
+Uso (desde hospital-pequeno/):
+
+    python benchmarks/carga_ronda.py --tecnicos 15 --configs 1x1,2x1,2x4,4x4
+
+Sin `DATABASE_URL` se crea una base SQLite temporal. SQLite serializa las
+escrituras, así que para dimensionar producción conviene una PostgreSQL local:
+
+    DATABASE_URL=postgres://localhost/rondas_carga python benchmarks/carga_ronda.py
+
+El servidor hereda el entorno: `SERVIDOR_MODO=asgi` mide los workers de uvicorn
+y `EXPORTACIONES_EN_SEGUNDO_PLANO=False` genera el PDF dentro de la petición,
+el peor caso para los workers. El panel solo acepta registros en horario de
+ronda (ver `horario_valido` en rondas/views.py).
+"""
+
+import argparse
+import base64
+import html
+import http.cookiejar
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_biomedica.settings")
+
+ENDPOINTS = ("login", "panel", "envio", "historial", "exportacion")
+CLAVE_TECNICOS = "carga-ronda-2025"
+RE_CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+RE_SERVICIO = re.compile(
+    r'name="categoria" value="([^"]*)"[^>]*>\s*<input type="hidden" name="subservicio" value="([^"]*)"'
+)
+RE_SIGUIENTE = re.compile(r'href="\?[^"]*despues=([^"&]+)')
+
+
+class Resultados:
+    """Tiempos (ms) y errores por endpoint, compartidos por todos los técnicos."""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.tiempos = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    def registrar(self, endpoint, milisegundos, correcto):
+        with self._bloqueo:
+            self.tiempos[endpoint].append(milisegundos)
+            if not correcto:
+                self.errores[endpoint] += 1
+
+    @property
+    def peticiones(self):
+        return sum(len(tiempos) for tiempos in self.tiempos.values())
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano."""
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # Se mide cada petición por separado; la redirección se pide solo si hace falta
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def firma_aleatoria():
+    """Data URI de una firma vectorial como la que envía el canvas."""
+    from rondas import trazos
+
+    ancho, alto = 500, 200
+    lista = []
+    for _ in range(random.randint(2, 5)):
+        x, y = random.randint(20, 200), random.randint(40, 160)
+        trazo = []
+        for _ in range(random.randint(20, 60)):
+            x = min(max(x + random.randint(-6, 9), 0), ancho)
+            y = min(max(y + random.randint(-8, 8), 0), alto)
+            trazo.append((x, y))
+        lista.append(tuple(trazo))
+    datos = trazos.codificar(trazos.Trazos(ancho, alto, tuple(lista)))
+    return f"data:{trazos.CONTENT_TYPE};base64,{base64.b64encode(datos).decode('ascii')}"
+
+
+class Tecnico:
+    """Cliente HTTP con su propia sesión (cookies) que recorre la ronda."""
+
+    def __init__(self, base, usuario, resultados):
+        self.base = base
+        self.usuario = usuario
+        self.resultados = resultados
+        self.cliente = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _SinRedirecciones,
+        )
+
+    def pedir(self, endpoint, ruta, datos=None, esperado=(200,)):
+        cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+        peticion = urllib.request.Request(self.base + ruta, data=cuerpo, headers={"Referer": self.base + ruta})
+        inicio = time.perf_counter()
+        try:
+            with self.cliente.open(peticion, timeout=120) as respuesta:
+                estado, contenido = respuesta.status, respuesta.read()
+        except urllib.error.HTTPError as exc:
+            estado, contenido = exc.code, exc.read()
+        except (urllib.error.URLError, OSError):
+            estado, contenido = 0, b""
+        self.resultados.registrar(endpoint, (time.perf_counter() - inicio) * 1000, estado in esperado)
+        return estado, contenido.decode("utf-8", "replace")
+
+    def ronda(self, envios):
+        _, pagina = self.pedir("login", "/accounts/login/")
+        csrf = RE_CSRF.search(pagina)
+        estado, _ = self.pedir(
+            "login",
+            "/accounts/login/",
+            {"username": self.usuario, "password": CLAVE_TECNICOS, "csrfmiddlewaretoken": csrf and csrf.group(1)},
+            esperado=(302,),
+        )
+        if estado != 302:
+            return
+
+        _, pagina = self.pedir("panel", "/")
+        csrf = RE_CSRF.search(pagina)
+        servicios = [(html.unescape(c), html.unescape(s)) for c, s in RE_SERVICIO.findall(pagina)]
+        if not csrf or not servicios:
+            # Fuera de horario el panel no muestra formularios
+            return
+        for numero in range(envios):
+            categoria, subservicio = random.choice(servicios)
+            self.pedir(
+                "envio",
+                "/",
+                {
+                    "csrfmiddlewaretoken": csrf.group(1),
+                    "tipo_formulario": "ronda",
+                    "categoria": categoria,
+                    "subservicio": subservicio,
+                    "sin_novedad": "False",
+                    "hallazgo": f"Prueba de carga {numero + 1}",
+                    "placa_equipo": f"EQ-{random.randint(1000, 9999)}",
+                    "tiene_eventos_seguridad": "False",
+                    "nombre_encargado_servicio": "Encargado servicio",
+                    "nombre_encargado_ronda": self.usuario,
+                    "firma_servicio": firma_aleatoria(),
+                    "firma_ronda": firma_aleatoria(),
+                },
+                esperado=(302,),
+            )
+
+        _, pagina = self.pedir("historial", "/historial/")
+        siguiente = RE_SIGUIENTE.search(pagina)
+        if siguiente:
+            self.pedir("historial", f"/historial/?despues={siguiente.group(1)}")
+
+        self.pedir(
+            "exportacion",
+            "/historial/export/pdf/",
+            {"csrfmiddlewaretoken": csrf.group(1), "categoria": "", "subservicio": ""},
+            esperado=(302,),
+        )
+
+
+def preparar_base(tecnicos):
+    """Aplica migraciones, recolecta los estáticos y crea los usuarios de la prueba."""
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import Permission, User
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0, interactive=False)
+    call_command("collectstatic", interactive=False, verbosity=0)
+    permiso = Permission.objects.get(codename="view_roundentry", content_type__app_label="rondas")
+    usuarios = []
+    for numero in range(tecnicos):
+        usuario, creado = User.objects.get_or_create(username=f"tecnico_carga_{numero + 1}")
+        if creado:
+            usuario.set_password(CLAVE_TECNICOS)
+            usuario.save()
+            usuario.user_permissions.add(permiso)
+        usuarios.append(usuario.username)
+    return usuarios
+
+
+def puerto_libre():
+    with socket.socket() as conexion:
+        conexion.bind(("127.0.0.1", 0))
+        return conexion.getsockname()[1]
+
+
+def iniciar_servidor(workers, hilos, registro):
+    puerto = puerto_libre()
+    entorno = {**os.environ, "PORT": str(puerto), "WEB_CONCURRENCY": str(workers), "GUNICORN_THREADS": str(hilos)}
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{puerto}"],
+        cwd=RAIZ,
+        env=entorno,
+        stdout=registro,
+        stderr=subprocess.STDOUT,
+    )
+    base = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al iniciar; revise {registro.name}")
+        try:
+            urllib.request.urlopen(base + "/accounts/login/", timeout=2).read()
+            return proceso, base
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError("gunicorn no respondió en 30 s")
+
+
+def medir(workers, hilos, usuarios, envios, registro):
+    proceso, base = iniciar_servidor(workers, hilos, registro)
+    resultados = Resultados()
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(usuarios)) as grupo:
+            for tarea in [grupo.submit(Tecnico(base, usuario, resultados).ronda, envios) for usuario in usuarios]:
+                tarea.result()
+        duracion = time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+    return resultados, duracion
+
+
+def imprimir(workers, hilos, resultados, duracion):
+    print(f"\n== {workers} workers x {hilos} hilos: {resultados.peticiones} peticiones en {duracion:.1f} s "
+          f"({resultados.peticiones / duracion:.1f} pet/s)")
+    print(f"{'endpoint':<12} {'n':>5} {'errores':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint in ENDPOINTS:
+        tiempos = resultados.tiempos.get(endpoint)
+        if not tiempos:
+            continue
+        print(
+            f"{endpoint:<12} {len(tiempos):>5} {resultados.errores[endpoint]:>8} "
+            f"{percentil(tiempos, 50):>8.0f} {percentil(tiempos, 95):>8.0f} {percentil(tiempos, 99):>8.0f}"
+        )
+
+
+def recomendar(medidas, objetivo_p95):
+    """Configuración con más peticiones por segundo que cumple el objetivo de los envíos."""
+    validas = [
+        (resultados.peticiones / duracion, workers, hilos)
+        for workers, hilos, resultados, duracion in medidas
+        if resultados.tiempos.get("envio")
+        and not any(resultados.errores.values())
+        and percentil(resultados.tiempos["envio"], 95) <= objetivo_p95
+    ]
+    print()
+    if not validas:
+        print(f"Ninguna configuración mantuvo el p95 de envíos bajo {objetivo_p95} ms sin errores; "
+              "pruebe con más workers o menos técnicos.")
+        return
+    tasa, workers, hilos = max(validas)
+    print(f"Recomendado: WEB_CONCURRENCY={workers} GUNICORN_THREADS={hilos} ({tasa:.1f} pet/s)")
+    print("Cada hilo mantiene su propia conexión a la base de datos: workers x hilos no debe "
+          "superar las conexiones disponibles en PostgreSQL.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tecnicos", type=int, default=10, help="técnicos simultáneos")
+    parser.add_argument("--envios", type=int, default=20, help="registros por técnico")
+    parser.add_argument("--configs", default="1x1,2x1,2x4,4x2", help="workers x hilos, separados por comas")
+    parser.add_argument("--objetivo-p95", type=float, default=1000, help="p95 máximo de los envíos, en ms")
+    opciones = parser.parse_args()
+
+    configuraciones = [tuple(int(valor) for valor in config.split("x")) for config in opciones.configs.split(",")]
+    with tempfile.TemporaryDirectory() as temporal:
+        os.environ.setdefault("STATIC_ROOT", str(Path(temporal) / "static"))
+        os.environ.setdefault("CACHE_DIR", str(Path(temporal) / "cache"))
+        if not os.environ.get("DATABASE_URL"):
+            # Las escrituras concurrentes esperan su turno en lugar de fallar con "database is locked"
+            os.environ["DATABASE_URL"] = (
+                f"sqlite:///{Path(temporal) / 'carga.sqlite3'}?timeout=20&transaction_mode=IMMEDIATE"
+            )
+        usuarios = preparar_base(opciones.tecnicos)
+        print(f"Base de datos: {os.environ['DATABASE_URL'].split('://', 1)[0]}, {opciones.tecnicos} técnicos, "
+              f"{opciones.envios} envíos por técnico, modo {os.environ.get('SERVIDOR_MODO', 'wsgi')}")
+
+        medidas = []
+        with open(Path(temporal) / "gunicorn.log", "w") as registro:
+            for workers, hilos in configuraciones:
+                resultados, duracion = medir(workers, hilos, usuarios, opciones.envios, registro)
+                imprimir(workers, hilos, resultados, duracion)
+                medidas.append((workers, hilos, resultados, duracion))
+        recomendar(medidas, opciones.objetivo_p95)
+
+
+if __name__ == "__main__":
+    main()
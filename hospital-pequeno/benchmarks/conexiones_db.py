@@ -0,0 +1,97 @@
+"""
+Costo de conexión a la base de datos por petición en cada modo de `DB_CONEXIONES`.
+
+Simula el ciclo de una petición de Django (cierre de conexiones obsoletas al
+empezar y al terminar, más una consulta mínima) contra la base configurada en
+`DATABASE_URL`/PG* y compara:
+
+    ninguna      conexión nueva en cada petición (CONN_MAX_AGE = 0)
+    persistente  CONN_MAX_AGE + CONN_HEALTH_CHECKS
+    pool         pool nativo de psycopg 3 (solo si está instalado)
+
+Uso (desde hospital-pequeno/):
+
+    DATABASE_URL=postgres://... python benchmarks/conexiones_db.py --peticiones 200
+
+Con SQLite la diferencia es mínima; la medición tiene sentido contra PostgreSQL,
+idealmente el de Railway.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from importlib.util import find_spec
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_biomedica.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db.utils import ConnectionHandler  # noqa: E402
+
+
+def ajustes_modo(modo):
+    """Copia de ``DATABASES['default']`` configurada para ``modo``."""
+    ajustes = {clave: valor for clave, valor in settings.DATABASES["default"].items() if clave != "TEST"}
+    ajustes["OPTIONS"] = {clave: valor for clave, valor in ajustes.get("OPTIONS", {}).items() if clave != "pool"}
+    ajustes["CONN_MAX_AGE"] = 0
+    ajustes["CONN_HEALTH_CHECKS"] = False
+    if modo == "persistente":
+        ajustes["CONN_MAX_AGE"] = settings.DB_CONN_MAX_AGE or 600
+        ajustes["CONN_HEALTH_CHECKS"] = True
+    elif modo == "pool":
+        ajustes["OPTIONS"]["pool"] = {"min_size": 1, "max_size": 2}
+    return ajustes
+
+
+def medir(modo, peticiones):
+    conexion = ConnectionHandler({"default": ajustes_modo(modo)})["default"]
+    tiempos = []
+    try:
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            # Lo mismo que hacen las señales request_started/request_finished
+            conexion.close_if_unusable_or_obsolete()
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conexion.close_if_unusable_or_obsolete()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        conexion.close()
+        if hasattr(conexion, "close_pool"):
+            conexion.close_pool()
+    tiempos.sort()
+    return {
+        "media": statistics.fmean(tiempos),
+        "p50": tiempos[len(tiempos) // 2],
+        "p95": tiempos[int(len(tiempos) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=200)
+    opciones = parser.parse_args()
+
+    motor = settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1]
+    modos = ["ninguna", "persistente"]
+    if motor == "postgresql" and find_spec("psycopg") and find_spec("psycopg_pool"):
+        modos.append("pool")
+    print(f"Base de datos: {motor}, {opciones.peticiones} peticiones por modo\n")
+    print(f"{'modo':<12} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for modo in modos:
+        resultado = medir(modo, opciones.peticiones)
+        print(f"{modo:<12} {resultado['media']:>9.3f} {resultado['p50']:>8.3f} {resultado['p95']:>8.3f}")
+    if "pool" not in modos and motor == "postgresql":
+        print("\npool: instale psycopg[binary,pool] para medir el pool nativo")
+
+
+if __name__ == "__main__":
+    main()
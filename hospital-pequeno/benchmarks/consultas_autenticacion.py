@@ -0,0 +1,129 @@
+"""
+Consultas por petición de la sesión y la autenticación en cada perfil.
+
+Crea una base de pruebas desechable con los usuarios de `crear_usuarios`, fija la
+hora en un día con ronda y cuenta las consultas SQL de cada vista (con las cachés
+ya llenas) en tres perfiles:
+
+    antes    sesiones en la base de datos y ModelBackend
+    cache    `SESIONES=cache` (cached_db) y usuario y permisos en caché
+    cookies  `SESIONES=cookies` (firmadas) y usuario y permisos en caché
+
+Entre paréntesis se muestran las consultas a las tablas de sesiones, usuarios,
+grupos y permisos; el resto son las de la propia vista.
+
+Uso (desde hospital-pequeno/):
+
+    python benchmarks/consultas_autenticacion.py
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_biomedica.settings")
+os.environ.setdefault("STATIC_ROOT", tempfile.mkdtemp(prefix="consultas_autenticacion_"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="consultas_autenticacion_cache_"))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+# Lunes a las 9:00: hay ronda diaria, de salas y de cirugía
+HORA_FIJA = timezone.make_aware(datetime(2025, 1, 6, 9, 0))
+
+PERFILES = {
+    "antes": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+        "AUTENTICACION_EN_CACHE": False,
+    },
+    "cache": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "AUTHENTICATION_BACKENDS": ["rondas.autenticacion.BackendConCache"],
+        "AUTENTICACION_EN_CACHE": True,
+    },
+    "cookies": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.signed_cookies",
+        "AUTHENTICATION_BACKENDS": ["rondas.autenticacion.BackendConCache"],
+        "AUTENTICACION_EN_CACHE": True,
+    },
+}
+
+# (nombre, usuario, método, url)
+VISTAS = [
+    ("panel", "biomedico1", "get", "panel_principal"),
+    ("historial", "biomedico1", "get", "historial_servicios"),
+    ("historial admin", "supervisor", "get", "historial_servicios"),
+    ("indicadores", "supervisor", "get", "indicadores"),
+    ("exportar excel", "supervisor", "post", "exportar_historial_excel"),
+]
+
+TABLAS_AUTENTICACION = re.compile(
+    r'(FROM|INTO|UPDATE) "(django_session|auth_user|auth_user_groups|auth_user_user_permissions'
+    r'|auth_group|auth_group_permissions|auth_permission)"'
+)
+
+
+def contar(cliente, metodo, url):
+    """Consultas de la segunda petición (la primera llena las cachés)."""
+    getattr(cliente, metodo)(url)
+    with CaptureQueriesContext(connection) as consultas:
+        respuesta = getattr(cliente, metodo)(url)
+    assert respuesta.status_code < 400, (url, respuesta.status_code)
+    autenticacion = sum(1 for consulta in consultas.captured_queries if TABLAS_AUTENTICACION.search(consulta["sql"]))
+    return len(consultas), autenticacion
+
+
+def medir(perfil):
+    resultados = {}
+    with override_settings(**PERFILES[perfil], EXPORTACIONES_EN_SEGUNDO_PLANO=True):
+        cache.clear()
+        clientes = {}
+        for nombre, usuario, metodo, url in VISTAS:
+            if usuario not in clientes:
+                # Un cliente por perfil: SessionMiddleware lee SESSION_ENGINE al crearse
+                clientes[usuario] = Client()
+                clientes[usuario].force_login(User.objects.get(username=usuario))
+            resultados[nombre] = contar(clientes[usuario], metodo, reverse(url))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    call_command("collectstatic", interactive=False, verbosity=0)
+    bases = setup_databases(verbosity=0, interactive=False)
+    try:
+        call_command("crear_usuarios", stdout=io.StringIO())
+        with mock.patch("django.utils.timezone.localtime", return_value=HORA_FIJA):
+            resultados = {perfil: medir(perfil) for perfil in PERFILES}
+    finally:
+        teardown_databases(bases, verbosity=0)
+
+    print("Consultas por petición (de sesión y autenticación)\n")
+    print(f"{'vista':<16}" + "".join(f"{perfil:>12}" for perfil in PERFILES))
+    for nombre, *_ in VISTAS:
+        columnas = "".join(f"{'%d (%d)' % resultados[perfil][nombre]:>12}" for perfil in PERFILES)
+        print(f"{nombre:<16}{columnas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Tiempo de render del panel principal.
+
+Crea una base de pruebas desechable, fija la hora en un día con ronda de salas de
+cirugía y mide:
+
+    vista     la vista completa (`panel_principal`), con las cachés ya llenas
+    fria      la primera carga del día: cachés de fragmentos vacías
+    plantilla solo el render de `rondas/panel.html` con el contexto de la vista
+
+Los estáticos se recolectan en un directorio temporal, como en producción.
+
+Uso (desde hospital-pequeno/):
+
+    python benchmarks/render_panel.py --repeticiones 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_biomedica.settings")
+os.environ.setdefault("STATIC_ROOT", tempfile.mkdtemp(prefix="render_panel_"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="render_panel_cache_"))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.messages.storage.fallback import FallbackStorage  # noqa: E402
+from django.contrib.sessions.backends.cache import SessionStore  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_databases, teardown_databases  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+# Lunes a las 9:00: hay ronda diaria, de salas y de cirugía
+HORA_FIJA = timezone.make_aware(datetime(2025, 1, 6, 9, 0))
+
+
+def peticion(usuario):
+    solicitud = RequestFactory().get("/")
+    solicitud.user = usuario
+    solicitud.session = SessionStore()
+    solicitud._messages = FallbackStorage(solicitud)
+    return solicitud
+
+
+def cronometrar(funcion, repeticiones, antes=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "media": statistics.fmean(tiempos),
+        "p50": tiempos[len(tiempos) // 2],
+        "p95": tiempos[max(int(len(tiempos) * 0.95) - 1, 0)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=100)
+    opciones = parser.parse_args()
+
+    from rondas import views
+
+    call_command("collectstatic", interactive=False, verbosity=0)
+    bases = setup_databases(verbosity=0, interactive=False)
+    try:
+        usuario = User.objects.create_user("render_panel")
+        contextos = []
+        render_original = views.render
+
+        def capturar(request, plantilla, contexto=None, *args, **kwargs):
+            contextos.append(contexto)
+            return render_original(request, plantilla, contexto, *args, **kwargs)
+
+        with mock.patch("django.utils.timezone.localtime", return_value=HORA_FIJA):
+            with mock.patch.object(views, "render", capturar):
+                views.panel_principal(peticion(usuario))
+            contexto = contextos[-1]
+            tamano = len(views.panel_principal(peticion(usuario)).content)
+
+            resultados = {
+                "vista": cronometrar(lambda: views.panel_principal(peticion(usuario)), opciones.repeticiones),
+                "fria": cronometrar(
+                    lambda: views.panel_principal(peticion(usuario)),
+                    max(opciones.repeticiones // 10, 5),
+                    antes=cache.clear,
+                ),
+                "plantilla": cronometrar(
+                    lambda: render_to_string("rondas/panel.html", contexto, request=peticion(usuario)),
+                    opciones.repeticiones,
+                ),
+            }
+    finally:
+        teardown_databases(bases, verbosity=0)
+
+    print(f"HTML del panel: {tamano / 1024:.1f} KB\n")
+    print(f"{'medición':<10} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:<10} {resultado['media']:>9.2f} {resultado['p50']:>8.2f} {resultado['p95']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,9 @@ Generated by Django and ajusted for the biomedical management portal.
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -14,6 +16,9 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-!$-ky%qw3yii2&+nq@qvi
 
 DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 
+# `manage.py test` corre sin artefactos de build ni caché compartida (ver STORAGES y CACHES)
+PRUEBAS = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS: list[str] = ['*']  # Permite conexiones desde cualquier IP
 
 INSTALLED_APPS = [
@@ -39,11 +44,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'gestion_biomedica.urls'
 
+# En producción las plantillas compiladas se conservan en memoria (cached.Loader);
+# con DEBUG se leen de disco en cada petición para ver los cambios al instante.
+_CARGADORES_PLANTILLAS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -51,25 +62,51 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': (
+                _CARGADORES_PLANTILLAS
+                if DEBUG
+                else [('django.template.loaders.cached.Loader', _CARGADORES_PLANTILLAS)]
+            ),
         },
     },
 ]
 
 WSGI_APPLICATION = 'gestion_biomedica.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.environ.get('PGDATABASE', 'railway'),
-        'USER': os.environ.get('PGUSER', 'postgres'),
-        'PASSWORD': os.environ.get('PGPASSWORD', ''),
-        'HOST': os.environ.get('PGHOST', 'localhost'),
-        'PORT': os.environ.get('PGPORT', '5432'),
-    }
-}
+# Base de datos: `DATABASE_URL` (Railway la define al agregar PostgreSQL), las
+# variables PG* o, sin ninguna, SQLite para desarrollo local.
+#
+# `DB_CONEXIONES` define cómo se reutilizan las conexiones a PostgreSQL:
+#   persistente (por defecto): cada proceso conserva su conexión `DB_CONN_MAX_AGE`
+#       segundos y la verifica antes de reutilizarla.
+#   pool: pool nativo de psycopg 3 (`psycopg[binary,pool]`, en requirements.txt); si
+#       el paquete no está instalado se usa el modo persistente.
+#   ninguna: una conexión nueva por petición.
+# Ver `benchmarks/conexiones_db.py` para medir el costo de cada modo.
+#
+# Con `SERVIDOR_MODO=asgi` (ver `gunicorn.conf.py`) el modo persistente se trata como
+# `ninguna`: las vistas async consultan desde hilos que Django crea y descarta, y
+# cada uno dejaría abierta su propia conexión hasta que PostgreSQL la corte. Para
+# reutilizar conexiones bajo ASGI hay que usar `pool`.
+DB_CONEXIONES = os.environ.get('DB_CONEXIONES', 'persistente').lower()
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+SERVIDOR_MODO = os.environ.get('SERVIDOR_MODO', 'wsgi').strip().lower()
 
-# Fallback a SQLite para desarrollo local
-if not os.environ.get('PGHOST'):
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {'default': dj_database_url.parse(os.environ['DATABASE_URL'])}
+elif os.environ.get('PGHOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PGDATABASE', 'railway'),
+            'USER': os.environ.get('PGUSER', 'postgres'),
+            'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            'HOST': os.environ.get('PGHOST', 'localhost'),
+            'PORT': os.environ.get('PGPORT', '5432'),
+        }
+    }
+else:
+    # Fallback a SQLite para desarrollo local
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -77,6 +114,115 @@ if not os.environ.get('PGHOST'):
         }
     }
 
+
+def _psycopg_pool_disponible():
+    from importlib.util import find_spec
+
+    return find_spec('psycopg') is not None and find_spec('psycopg_pool') is not None
+
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if DB_CONEXIONES == 'pool' and _psycopg_pool_disponible():
+        # Con pool, Django exige CONN_MAX_AGE = 0: el pool decide cuándo cerrar
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+    elif DB_CONEXIONES != 'ninguna' and SERVIDOR_MODO != 'asgi':
+        DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Caché: `CACHE_BACKEND` elige dónde se guardan los fragmentos del panel, las
+# firmas dibujadas y las entradas de `rondas.cache`:
+#   memoria: dentro de cada proceso; solo sirve con un worker (por defecto con DEBUG).
+#   archivos: directorio `CACHE_DIR` (obligatorio), compartido por los workers de la
+#       misma máquina (por defecto sin DEBUG si `CACHE_DIR` existe). Conviene que
+#       solo lo pueda leer el usuario de la aplicación.
+#   db: tabla `cache_rondas`, que `migrate` crea con `createcachetable`
+#       (por defecto sin DEBUG ni `CACHE_DIR`).
+#   redis: `REDIS_URL` (requiere el paquete `redis`; por defecto si `REDIS_URL`
+#       existe). Sin el paquete se usa el valor por defecto sin `REDIS_URL`.
+# En las pruebas la caché es siempre local al proceso y empieza vacía.
+CACHE_TIEMPO = int(os.environ.get('CACHE_TIEMPO', '300'))
+CACHE_MAXIMO_ENTRADAS = int(os.environ.get('CACHE_MAXIMO_ENTRADAS', '5000'))
+
+
+def _redis_disponible():
+    from importlib.util import find_spec
+
+    return find_spec('redis') is not None
+
+
+_CACHE_LOCAL = 'memoria' if DEBUG else 'archivos' if os.environ.get('CACHE_DIR') else 'db'
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND',
+    'redis' if os.environ.get('REDIS_URL') else _CACHE_LOCAL,
+).lower()
+if CACHE_BACKEND == 'redis' and not (os.environ.get('REDIS_URL') and _redis_disponible()):
+    CACHE_BACKEND = _CACHE_LOCAL
+if CACHE_BACKEND == 'archivos' and not os.environ.get('CACHE_DIR'):
+    raise ImproperlyConfigured('CACHE_BACKEND=archivos requiere CACHE_DIR')
+
+if CACHE_BACKEND == 'redis':
+    _CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif CACHE_BACKEND == 'db':
+    _CACHE = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_rondas',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAXIMO_ENTRADAS},
+    }
+elif CACHE_BACKEND == 'archivos':
+    _CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CACHE_DIR'],
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAXIMO_ENTRADAS},
+    }
+else:
+    _CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAXIMO_ENTRADAS},
+    }
+if PRUEBAS:
+    # Sin tocar la caché compartida de otras instancias en la misma máquina
+    _CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+CACHES = {
+    'default': {
+        **_CACHE,
+        'TIMEOUT': CACHE_TIEMPO,
+        'KEY_PREFIX': os.environ.get('CACHE_PREFIJO', 'gestion_biomedica'),
+    }
+}
+
+# Sesiones: `SESIONES` define dónde se leen en cada petición:
+#   cache (por defecto): `cached_db`, se leen de la caché y se escriben también en
+#       la base de datos. Con `CACHE_BACKEND=memoria` se usa `db`, porque cada
+#       worker tendría su propia copia de la sesión.
+#   cookies: firmadas con SECRET_KEY en la cookie, sin consultas; una sesión no se
+#       puede cerrar desde el servidor antes de que expire.
+#   db: solo la base de datos (comportamiento anterior).
+SESIONES = os.environ.get('SESIONES', 'cache').lower()
+if SESIONES == 'cookies':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+elif SESIONES == 'cache' and CACHE_BACKEND != 'memoria':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# El usuario y sus permisos se guardan en la caché (ver `rondas.autenticacion`);
+# con la caché en memoria se consultan en cada petición, como con ModelBackend.
+# Ver `benchmarks/consultas_autenticacion.py` para comparar las consultas por petición.
+AUTHENTICATION_BACKENDS = ['rondas.autenticacion.BackendConCache']
+AUTENTICACION_EN_CACHE = os.environ.get(
+    'AUTENTICACION_EN_CACHE', 'false' if CACHE_BACKEND == 'memoria' else 'true'
+).lower() == 'true'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,10 +248,53 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+
+
+def _storages_disponible():
+    from importlib.util import find_spec
+
+    return find_spec('storages') is not None and find_spec('boto3') is not None
+
+
+# Archivos generados (exportaciones del historial). El worker de exportaciones corre
+# como un servicio aparte (proceso `worker` del Procfile) y el servicio web entrega
+# lo que escribe, así que ambos deben ver el mismo almacenamiento:
+#   `ARCHIVOS_BUCKET`: bucket S3 o compatible (`ARCHIVOS_ENDPOINT`, `ARCHIVOS_REGION`;
+#       credenciales en `AWS_ACCESS_KEY_ID`/`AWS_SECRET_ACCESS_KEY`). Requiere
+#       `django-storages[s3]`.
+#   sin bucket: disco local (`MEDIA_ROOT`); solo sirve si web y worker comparten el
+#       disco, es decir, corren en la misma máquina.
+if os.environ.get('ARCHIVOS_BUCKET'):
+    if not _storages_disponible():
+        raise ImproperlyConfigured('ARCHIVOS_BUCKET requiere el paquete django-storages[s3]')
+    _ARCHIVOS = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ['ARCHIVOS_BUCKET'],
+            'endpoint_url': os.environ.get('ARCHIVOS_ENDPOINT') or None,
+            'region_name': os.environ.get('ARCHIVOS_REGION') or None,
+            'location': 'media',
+            'file_overwrite': False,
+        },
+    }
+else:
+    _ARCHIVOS = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
 
-# Configuración de Whitenoise para archivos estáticos
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Whitenoise sirve los estáticos con el hash del contenido en el nombre
+# (js/panel.3f2a….js) y caché de un año; requiere `collectstatic`. Con DEBUG y en
+# las pruebas se usan los nombres originales, sin manifiesto.
+STORAGES = {
+    'default': _ARCHIVOS,
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage'
+            if DEBUG or PRUEBAS
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
 
 # Media files (firmas, archivos subidos)
 MEDIA_URL = '/media/'
@@ -117,3 +306,36 @@ LOGIN_REDIRECT_URL = 'panel_principal'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
+
+# Las exportaciones del historial las genera `manage.py run_export_worker`.
+# Con False se generan dentro de la petición (útil en desarrollo sin worker).
+EXPORTACIONES_EN_SEGUNDO_PLANO = os.environ.get('EXPORTACIONES_EN_SEGUNDO_PLANO', 'True').lower() == 'true'
+# Procesos para generar el PDF del historial por bloques (por defecto, uno por núcleo)
+EXPORTACIONES_PROCESOS = int(os.environ.get('EXPORTACIONES_PROCESOS', '0')) or None
+
+# Fracción de peticiones (0 a 1) cuyas etapas se miden para `/metricas/`
+INSTRUMENTACION_MUESTREO = float(os.environ.get('INSTRUMENTACION_MUESTREO', '0.1'))
+# Token con el que Prometheus consulta `/metricas/` (`Authorization: Bearer <token>`);
+# sin él solo responde a usuarios staff
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'rondas': {
+            'handlers': ['console'],
+            'level': os.environ.get('RONDAS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Con False las firmas se normalizan dentro de la petición en lugar de en el worker
+FIRMAS_EN_SEGUNDO_PLANO = os.environ.get('FIRMAS_EN_SEGUNDO_PLANO', str(EXPORTACIONES_EN_SEGUNDO_PLANO)).lower() == 'true'
@@ -0,0 +1,38 @@
+"""
+Configuración de gunicorn para Railway y el ``Procfile``.
+
+``SERVIDOR_MODO`` elige cómo se atienden las peticiones:
+
+    wsgi  workers síncronos (por defecto)
+    asgi  workers de uvicorn con ``gestion_biomedica.asgi``; las vistas de solo
+          lectura (historial, indicadores, firmas) son ``async`` y mientras
+          esperan a la base de datos no ocupan el worker. Las conexiones
+          persistentes se desactivan; conviene ``DB_CONEXIONES=pool``
+
+Workers e hilos se ajustan con ``WEB_CONCURRENCY`` y ``GUNICORN_THREADS``;
+``python benchmarks/carga_ronda.py`` simula una ronda con varios técnicos y
+recomienda los valores para el servidor donde se ejecuta.
+
+Uso: ``gunicorn -c gunicorn.conf.py``
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# La generación de PDF sin worker de exportaciones puede tardar
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+# Reciclar los workers acota la memoria que dejan las exportaciones y las firmas
+max_requests = 1000
+max_requests_jitter = 100
+
+modo = os.environ.get("SERVIDOR_MODO", "wsgi").strip().lower()
+if modo == "asgi":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "gestion_biomedica.asgi:application"
+else:
+    # Con más de un hilo gunicorn usa workers gthread: una petición lenta no
+    # bloquea las demás del mismo worker
+    threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+    wsgi_app = "gestion_biomedica.wsgi:application"
@@ -1,3 +1,27 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Equipment, Room, Service
+
+
+# Catálogo del panel de rondas: los cambios se reflejan sin desplegar (ver rondas/catalogo.py)
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ("name", "category", "day_rules", "order", "active")
+    list_editable = ("order", "active")
+    list_filter = ("category", "active")
+    search_fields = ("name",)
+
+
+@admin.register(Room)
+class RoomAdmin(admin.ModelAdmin):
+    list_display = ("number", "name", "service", "room_type", "order", "active")
+    list_editable = ("order", "active")
+    list_filter = ("service", "room_type", "active")
+
+
+@admin.register(Equipment)
+class EquipmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "room", "service", "status", "order", "active")
+    list_editable = ("order", "active")
+    list_filter = ("service", "room", "active")
+    search_fields = ("name", "plate_number")
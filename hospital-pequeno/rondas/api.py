@@ -0,0 +1,230 @@
+"""
+API JSON de solo lectura (versión 1) para los tableros de calidad.
+
+Reemplaza leer el HTML del historial o descargar el Excel completo en cada
+actualización. Cada recurso se recorre de más antiguo a más reciente con un cursor
+sobre ``(fecha_creacion, id)``, como la línea de tiempo del historial (ver
+``rondas.timeline``), así que cada página cuesta lo mismo sin importar cuántos
+registros existan. Parámetros::
+
+    categoria, subservicio  mismos filtros del historial (solo ``rondas``)
+    desde, hasta            días (AAAA-MM-DD, hora de Bogotá) de ``fecha_creacion``
+    since                   instante ISO 8601; registros creados desde entonces
+    despues                 cursor de la página anterior (``cursor`` de la respuesta)
+    fields                  campos separados por comas; las firmas solo se envían
+                            si se piden y van como la URL de la imagen
+    limite                  registros por página (por defecto 100, máximo 500)
+
+Para traer solo lo nuevo basta guardar el ``cursor`` de la última respuesta y
+enviarlo como ``despues`` en la siguiente; ``cursor`` se devuelve aunque la página
+no esté llena. Los registros borrados no se informan, y las celdas de la grilla
+diaria que se corrigen conservan su ``fecha_creacion``: para ellas conviene volver
+a pedir los días afectados con ``desde``/``hasta``.
+"""
+
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import cache as cache_rondas
+from .consultas import filtrar_registros
+from .models import DailySurgeryRecord, RoundEntry, SurgeryRound
+from .timeline import codificar_cursor, decodificar_cursor
+
+VERSION = 1
+TAMANO_PAGINA = 100
+TAMANO_MAXIMO = 500
+
+# Columnas que requieren otra consulta o conversión; el resto se lee tal cual
+_COLUMNAS = {
+    "usuario": "usuario__username",
+    "firma_servicio": "firma_servicio_id",
+    "firma_ronda": "firma_ronda_id",
+}
+FIRMAS = ("firma_servicio", "firma_ronda")
+ENCARGADOS = ("nombre_encargado_servicio", "nombre_encargado_ronda")
+
+
+class Recurso(NamedTuple):
+    modelo: type
+    permiso: str
+    grupo: str
+    campos: tuple
+    filtros_registro: bool = False
+
+
+RECURSOS = {
+    "rondas": Recurso(
+        RoundEntry,
+        "rondas.view_roundentry",
+        "registros",
+        (
+            "usuario", "categoria", "subservicio", "hallazgo", "placa_equipo", "orden_trabajo",
+            "tiene_eventos_seguridad", "eventos_seguridad", "fuera_de_servicio", "sin_novedad", *ENCARGADOS,
+        ),
+        filtros_registro=True,
+    ),
+    "cirugias": Recurso(
+        SurgeryRound,
+        "rondas.view_surgeryround",
+        "cirugia",
+        ("usuario", "semana_inicio", "datos", "observaciones", *ENCARGADOS),
+    ),
+    # La grilla diaria es parte de la ronda de cirugía y comparte su permiso
+    "cirugia-diaria": Recurso(
+        DailySurgeryRecord,
+        "rondas.view_surgeryround",
+        "cirugia_diaria",
+        (
+            "usuario", "fecha", "dia_semana", "sala", "equipo", "equipo_en_uso", "estado_equipo",
+            "observaciones", *ENCARGADOS,
+        ),
+    ),
+}
+
+
+class ParametrosInvalidos(Exception):
+    """Algún parámetro no es válido; ``errores`` sigue el formato de los formularios."""
+
+    def __init__(self, errores):
+        super().__init__(errores)
+        self.errores = errores
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _leer_campos(recurso, valor):
+    if not valor:
+        return list(recurso.campos)
+    campos = [campo.strip() for campo in valor.split(",") if campo.strip()]
+    validos = (*recurso.campos, *FIRMAS)
+    desconocidos = [campo for campo in campos if campo not in validos and campo not in ("id", "fecha_creacion")]
+    if desconocidos:
+        raise ParametrosInvalidos(
+            {"fields": [f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(validos)}."]}
+        )
+    return [campo for campo in dict.fromkeys(campos) if campo in validos]
+
+
+def _leer_tamano(valor):
+    if not valor:
+        return TAMANO_PAGINA
+    try:
+        tamano = int(valor)
+    except ValueError:
+        tamano = 0
+    if not 1 <= tamano <= TAMANO_MAXIMO:
+        raise ParametrosInvalidos({"limite": [f"Debe ser un número entero entre 1 y {TAMANO_MAXIMO}."]})
+    return tamano
+
+
+def consulta(recurso, parametros):
+    """
+    Queryset filtrado de ``recurso``, los campos pedidos y el tamaño de página.
+    Lanza ``ParametrosInvalidos`` si algún parámetro no es válido.
+    """
+    errores = {}
+    registros = recurso.modelo.objects.all()
+    if recurso.filtros_registro:
+        registros = filtrar_registros(registros, parametros)
+
+    for nombre, operador, desplazamiento in (("desde", "gte", 0), ("hasta", "lt", 1)):
+        valor = parametros.get(nombre)
+        if not valor:
+            continue
+        try:
+            fecha = parse_date(valor)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            errores[nombre] = ["Fecha inválida; use AAAA-MM-DD."]
+            continue
+        registros = registros.filter(
+            **{f"fecha_creacion__{operador}": _inicio_dia(fecha + timedelta(days=desplazamiento))}
+        )
+
+    since = parametros.get("since")
+    if since:
+        try:
+            instante = parse_datetime(since)
+        except ValueError:
+            instante = None
+        if instante is None:
+            errores["since"] = ["Instante inválido; use ISO 8601, por ejemplo 2025-01-06T09:00:00-05:00."]
+        else:
+            if timezone.is_naive(instante):
+                instante = timezone.make_aware(instante)
+            registros = registros.filter(fecha_creacion__gte=instante)
+
+    despues = parametros.get("despues")
+    if despues:
+        posicion = decodificar_cursor(despues)
+        if posicion is None:
+            errores["despues"] = ["Cursor inválido."]
+        else:
+            fecha, _fuente, pk = posicion
+            # El rango sobre la fecha va aparte del OR para que el motor busque en el
+            # índice desde el cursor (ver ``rondas.timeline``)
+            registros = registros.filter(Q(fecha_creacion__gte=fecha), Q(fecha_creacion__gt=fecha) | Q(pk__gt=pk))
+
+    try:
+        campos = _leer_campos(recurso, parametros.get("fields"))
+    except ParametrosInvalidos as error:
+        errores.update(error.errores)
+    try:
+        tamano = _leer_tamano(parametros.get("limite"))
+    except ParametrosInvalidos as error:
+        errores.update(error.errores)
+    if errores:
+        raise ParametrosInvalidos(errores)
+    return registros, campos, tamano
+
+
+def _valor(campo, valor):
+    if campo in FIRMAS:
+        return reverse("firma_imagen", args=[valor]) if valor else None
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat()
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    return valor
+
+
+def _pagina(registros, campos, tamano):
+    columnas = ["pk", "fecha_creacion", *(_COLUMNAS.get(campo, campo) for campo in campos)]
+    filas = list(registros.order_by("fecha_creacion", "pk").values_list(*columnas)[: tamano + 1])
+    hay_mas = len(filas) > tamano
+    resultados = []
+    for pk, fecha, *valores in filas[:tamano]:
+        resultados.append(
+            {
+                "id": pk,
+                "fecha_creacion": _valor("fecha_creacion", fecha),
+                **{campo: _valor(campo, valor) for campo, valor in zip(campos, valores)},
+            }
+        )
+    # Posición del último registro entregado, haya o no más páginas
+    ultimo = filas[len(resultados) - 1] if resultados else None
+    cursor = codificar_cursor(ultimo[1], 0, ultimo[0]) if ultimo else None
+    return {"resultados": resultados, "cursor": cursor, "hay_mas": hay_mas}
+
+
+def pagina(nombre, parametros):
+    """
+    Respuesta de una página de ``nombre`` (clave de ``RECURSOS``). Se guarda en
+    ``rondas.cache`` hasta que cambian los registros del recurso.
+    """
+    recurso = RECURSOS[nombre]
+    registros, campos, tamano = consulta(recurso, parametros)
+    partes = ("api", VERSION, nombre, tamano, *sorted(parametros.items()))
+    datos = cache_rondas.obtener([recurso.grupo], partes, lambda: _pagina(registros, campos, tamano))
+    if datos["cursor"] is None:
+        # Página vacía: se conserva la posición recibida para seguir desde ahí
+        datos = {**datos, "cursor": parametros.get("despues") or None}
+    return {"version": VERSION, "recurso": nombre, "campos": ["id", "fecha_creacion", *campos], **datos}
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RondasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rondas'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .busqueda import reinstalar_si_faltan
+        from .cache import crear_tabla
+
+        # En SQLite las migraciones que reconstruyen una tabla borran sus triggers
+        post_migrate.connect(reinstalar_si_faltan, sender=self)
+        # La caché por defecto sin DEBUG está en la base de datos (ver CACHES)
+        post_migrate.connect(crear_tabla, sender=self)
@@ -0,0 +1,91 @@
+"""
+Backend de autenticación con el usuario y sus permisos en la caché.
+
+``ModelBackend`` consulta el usuario en cada petición y, la primera vez que una
+vista o plantilla revisa un permiso, los permisos del usuario y de sus grupos. Este
+backend guarda ambos en ``rondas.cache``: el usuario en el grupo ``usuario:<id>``
+y sus permisos además en ``permisos``. Del usuario se guardan sus campos sin el
+hash de la contraseña, que queda diferido, y el hash de sesión con el que Django
+verifica la sesión en cada petición. ``rondas.signals`` invalida el primero al
+guardar o borrar el usuario y el segundo cuando cambian grupos o permisos (los que
+crea ``crear_usuarios`` o los que se editan en el admin).
+
+Con ``AUTENTICACION_EN_CACHE = False`` se comporta igual que ``ModelBackend``. Los
+settings lo desactivan con la caché en memoria, porque cada worker tendría su
+propia copia y una invalidación no llegaría a los demás.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import router
+
+from . import cache as cache_rondas
+
+GRUPO_PERMISOS = "permisos"
+
+
+def grupo_usuario(user_id):
+    return f"usuario:{user_id}"
+
+
+def _en_cache():
+    return getattr(settings, "AUTENTICACION_EN_CACHE", False)
+
+
+def _sin_contrasena(usuario):
+    """Campos del usuario sin ``password`` y su hash de sesión, para guardar en la caché."""
+    if usuario is None:
+        return None
+    campos = [campo.attname for campo in usuario._meta.concrete_fields if campo.attname != "password"]
+    return campos, [getattr(usuario, campo) for campo in campos], usuario.get_session_auth_hash()
+
+
+def _desde_cache(guardado):
+    if guardado is None:
+        return None
+    campos, valores, hash_sesion = guardado
+    modelo = get_user_model()
+    # ``password`` queda diferido: se consulta solo si algo lo lee (cambio de contraseña)
+    usuario = modelo.from_db(router.db_for_read(modelo), campos, valores)
+    usuario.get_session_auth_hash = lambda: hash_sesion
+    return usuario
+
+
+class BackendConCache(ModelBackend):
+    def get_user(self, user_id):
+        if not _en_cache():
+            return super().get_user(user_id)
+        # ModelBackend devuelve None para usuarios inactivos; también se guarda
+        guardado = cache_rondas.obtener(
+            [grupo_usuario(user_id)],
+            ("usuario", user_id, "campos"),
+            lambda: _sin_contrasena(super(BackendConCache, self).get_user(user_id)),
+        )
+        return _desde_cache(guardado)
+
+    async def aget_user(self, user_id):
+        # ModelBackend consulta directamente con aget(); las vistas async pasan por la caché
+        if not _en_cache():
+            return await super().aget_user(user_id)
+        return await sync_to_async(self.get_user)(user_id)
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not _en_cache() or not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return super().get_all_permissions(user_obj, obj)
+        # Como ModelBackend, se conservan en el usuario durante la petición
+        if not hasattr(user_obj, "_perm_cache"):
+            user_obj._perm_cache = cache_rondas.obtener(
+                [GRUPO_PERMISOS, grupo_usuario(user_obj.pk)],
+                ("permisos", user_obj.pk),
+                partial(super().get_all_permissions, user_obj),
+            )
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not _en_cache():
+            return await super().aget_all_permissions(user_obj, obj)
+        return await sync_to_async(self.get_all_permissions)(user_obj, obj)
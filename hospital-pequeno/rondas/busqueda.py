@@ -0,0 +1,336 @@
+"""
+Búsqueda de texto en el historial.
+
+Cubre ``RoundEntry.hallazgo``, ``eventos_seguridad`` y ``fuera_de_servicio`` y
+``SurgeryRound.observaciones``. El índice lo mantienen triggers de la base de
+datos, de modo que también cubre ``bulk_create`` y ``QuerySet.update``:
+
+- PostgreSQL: campo ``busqueda`` (``SearchVectorField`` con la configuración
+  ``spanish`` sobre el texto sin tildes, vía ``unaccent`` si la extensión está
+  instalada) e índice GIN. Las consultas usan ``SearchQuery`` en modo
+  ``websearch`` y se ordenan con ``SearchRank``.
+- SQLite: tabla FTS5 ``rondas_busqueda`` (tokenizador ``unicode61`` sin
+  diacríticos) cuyo ``rowid`` es el id del registro, negativo para las rondas de
+  cirugía. Cada palabra se busca como prefijo y se ordena con ``bm25``. La
+  columna ``busqueda`` existe pero queda vacía.
+
+Con otro motor, o con un SQLite sin FTS5, se recurre a ``icontains``.
+
+Los resultados se paginan con un cursor sobre ``(rango, fecha_creacion, fuente,
+id)``, como la línea de tiempo del historial (ver ``rondas.timeline``).
+
+La migración 0018 crea los triggers; ``instalar`` los vuelve a crear de forma
+idempotente y llena el índice. La llaman ``manage.py rebuild_search_index`` y,
+después de cada ``migrate``, ``reinstalar_si_faltan`` cuando una migración los
+eliminó (en SQLite, cualquiera que reconstruya la tabla de registros).
+"""
+
+import base64
+import binascii
+import heapq
+import logging
+import re
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.db.utils import OperationalError
+
+from .timeline import Pagina
+
+logger = logging.getLogger("rondas")
+
+TABLA_FTS = "rondas_busqueda"
+MIGRACION_TRIGGERS = "0018_busqueda_texto"
+LARGO_MAXIMO = 200
+_PALABRA = re.compile(r"\w+")
+
+# Por tabla: campos principales (más peso) y de detalle, y signo del rowid en FTS5
+FUENTES = {
+    "rondas_roundentry": (("hallazgo",), ("eventos_seguridad", "fuera_de_servicio"), 1),
+    "rondas_surgeryround": (("observaciones",), (), -1),
+}
+
+_fts_disponible = None
+_unaccent_disponible = None
+
+
+def _concatenar(campos, fila):
+    if not campos:
+        return "''"
+    return " || ' ' || ".join(f"coalesce({fila}.{campo}, '')" for campo in campos)
+
+
+def _crear_unaccent(conexion):
+    try:
+        with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    except DatabaseError:
+        logger.warning("No se pudo crear la extensión unaccent: la búsqueda distinguirá tildes")
+
+
+def _con_unaccent(conexion=connection):
+    global _unaccent_disponible
+    if _unaccent_disponible is None:
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'unaccent'")
+            _unaccent_disponible = cursor.fetchone() is not None
+    return _unaccent_disponible
+
+
+def _sql_postgresql(unaccent):
+    sin_tildes = (lambda texto: f"unaccent({texto})") if unaccent else (lambda texto: texto)
+    sentencias = []
+    for tabla, (principales, detalle, _) in FUENTES.items():
+        vector = " || ".join(
+            [f"setweight(to_tsvector('spanish', {sin_tildes(_concatenar(principales, 'NEW'))}), 'A')"]
+            + (
+                [f"setweight(to_tsvector('spanish', {sin_tildes(_concatenar(detalle, 'NEW'))}), 'B')"]
+                if detalle
+                else []
+            )
+        )
+        campos = ", ".join(principales + detalle)
+        sentencias += [
+            f"""
+            CREATE OR REPLACE FUNCTION {tabla}_busqueda() RETURNS trigger AS $$
+            BEGIN
+                NEW.busqueda := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f"DROP TRIGGER IF EXISTS {tabla}_busqueda ON {tabla}",
+            f"""
+            CREATE TRIGGER {tabla}_busqueda BEFORE INSERT OR UPDATE OF {campos} ON {tabla}
+            FOR EACH ROW EXECUTE FUNCTION {tabla}_busqueda()
+            """,
+            f"CREATE INDEX IF NOT EXISTS {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)",
+            # Dispara el trigger sobre los registros existentes
+            f"UPDATE {tabla} SET {principales[0]} = {principales[0]}",
+        ]
+    return sentencias
+
+
+def _sql_sqlite():
+    sentencias = [f"DELETE FROM {TABLA_FTS}"]
+    for tabla, (principales, detalle, signo) in FUENTES.items():
+        signo = "" if signo > 0 else "-"
+        columnas = f"{_concatenar(principales, 'new')}, {_concatenar(detalle, 'new')}"
+        campos = ", ".join(principales + detalle)
+        sentencias += [
+            f"DROP TRIGGER IF EXISTS {tabla}_busqueda_ai",
+            f"DROP TRIGGER IF EXISTS {tabla}_busqueda_au",
+            f"DROP TRIGGER IF EXISTS {tabla}_busqueda_ad",
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_ai AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO {TABLA_FTS} (rowid, principal, detalle) VALUES ({signo}new.id, {columnas});
+            END
+            """,
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_au AFTER UPDATE OF {campos} ON {tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid = {signo}old.id;
+                INSERT INTO {TABLA_FTS} (rowid, principal, detalle) VALUES ({signo}new.id, {columnas});
+            END
+            """,
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_ad AFTER DELETE ON {tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid = {signo}old.id;
+            END
+            """,
+            f"""
+            INSERT INTO {TABLA_FTS} (rowid, principal, detalle)
+            SELECT {signo}id, {_concatenar(principales, tabla)}, {_concatenar(detalle, tabla)} FROM {tabla}
+            """,
+        ]
+    return sentencias
+
+
+def instalar(conexion=connection):
+    """Crea (o vuelve a crear) los triggers de búsqueda y llena el índice con los registros actuales."""
+    global _fts_disponible, _unaccent_disponible
+    if conexion.vendor == "postgresql":
+        _crear_unaccent(conexion)
+        _unaccent_disponible = None
+        sentencias = _sql_postgresql(_con_unaccent(conexion))
+    elif conexion.vendor == "sqlite":
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                    "principal, detalle, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        except OperationalError:
+            logger.warning("SQLite sin FTS5: la búsqueda del historial usará icontains")
+            return
+        sentencias = _sql_sqlite()
+    else:
+        return
+    with conexion.cursor() as cursor:
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+    _fts_disponible = None
+
+
+def triggers_instalados(conexion=connection):
+    """``True`` si existen todos los triggers que mantienen el índice de búsqueda."""
+    with conexion.cursor() as cursor:
+        if conexion.vendor == "postgresql":
+            esperados = {f"{tabla}_busqueda" for tabla in FUENTES}
+            cursor.execute("SELECT tgname FROM pg_trigger WHERE tgname = ANY(%s)", [list(esperados)])
+        elif conexion.vendor == "sqlite":
+            esperados = {f"{tabla}_busqueda_{sufijo}" for tabla in FUENTES for sufijo in ("ai", "au", "ad")}
+            cursor.execute(
+                f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join(['%s'] * len(esperados))})",
+                list(esperados),
+            )
+        else:
+            return True
+        return {fila[0] for fila in cursor.fetchall()} == esperados
+
+
+def reinstalar_si_faltan(sender, using="default", **kwargs):
+    """
+    ``post_migrate``: vuelve a crear los triggers si alguna migración los eliminó.
+    Solo actúa si está aplicada la migración que los crea.
+    """
+    conexion = connections[using]
+    if (sender.label, MIGRACION_TRIGGERS) not in MigrationRecorder(conexion).applied_migrations():
+        return
+    if not triggers_instalados(conexion):
+        logger.info("Faltan los triggers de búsqueda del historial; se vuelven a crear")
+        instalar(conexion)
+
+
+def _motor():
+    global _fts_disponible
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if connection.vendor == "sqlite":
+        if _fts_disponible is None:
+            _fts_disponible = TABLA_FTS in connection.introspection.table_names()
+        if _fts_disponible:
+            return "fts5"
+    return None
+
+
+def filtrar(registros, texto):
+    """
+    Filtra ``registros`` (queryset de ``RoundEntry`` o ``SurgeryRound``) a los que
+    contienen ``texto`` y los anota con ``rango``: mayor es más relevante.
+    """
+    tabla = registros.model._meta.db_table
+    principales, detalle, signo = FUENTES[tabla]
+    texto = texto.strip()[:LARGO_MAXIMO]
+    motor = _motor()
+
+    if motor == "postgresql":
+        valor = Func(Value(texto), function="unaccent") if _con_unaccent() else Value(texto)
+        consulta = SearchQuery(valor, config="spanish", search_type="websearch")
+        # ts_rank devuelve real: en double precision el valor del cursor se compara exacto
+        return registros.filter(busqueda=consulta).annotate(
+            rango=Cast(SearchRank(F("busqueda"), consulta), FloatField())
+        )
+
+    if motor == "fts5":
+        palabras = _PALABRA.findall(texto)
+        if not palabras:
+            return registros.none()
+        # Cada palabra entre comillas (sin operadores de FTS5) y como prefijo
+        consulta = " ".join(f'"{palabra}"*' for palabra in palabras)
+        coincidencias = f"SELECT rowid * %s FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s AND rowid * %s > 0"
+        rango = (
+            f"(SELECT -bm25({TABLA_FTS}, 2.0, 1.0) FROM {TABLA_FTS} "
+            f"WHERE {TABLA_FTS} MATCH %s AND rowid = %s * {tabla}.id)"
+        )
+        return registros.filter(pk__in=RawSQL(coincidencias, [signo, consulta, signo])).annotate(
+            rango=RawSQL(rango, [consulta, signo], output_field=FloatField())
+        )
+
+    condicion = Q()
+    for campo in principales + detalle:
+        condicion |= Q(**{f"{campo}__icontains": texto})
+    return registros.filter(condicion).annotate(rango=Value(0.0, output_field=FloatField()))
+
+
+def codificar_cursor(rango, fecha, fuente, pk):
+    """Cursor opaco para la posición ``(rango, fecha_creacion, fuente, id)``."""
+    crudo = f"{rango!r}|{fecha.isoformat()}|{fuente}|{pk}".encode()
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Devuelve ``(rango, fecha, fuente, id)`` o ``None`` si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        rango, fecha, fuente, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split("|")
+        return float(rango), datetime.fromisoformat(fecha), int(fuente), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _despues_de(posicion, fuente):
+    """Filtro de los resultados de ``fuente`` que van después de ``posicion``."""
+    rango, fecha, fuente_cursor, pk = posicion
+    condicion = Q(rango__lt=rango) | Q(rango=rango, fecha_creacion__lt=fecha)
+    if fuente < fuente_cursor:
+        condicion |= Q(rango=rango, fecha_creacion=fecha)
+    elif fuente == fuente_cursor:
+        condicion |= Q(rango=rango, fecha_creacion=fecha, pk__lt=pk)
+    return condicion
+
+
+def _consultas(fuentes, texto, posicion, tamano):
+    for indice, registros in enumerate(fuentes):
+        registros = filtrar(registros, texto)
+        if posicion is not None:
+            registros = registros.filter(_despues_de(posicion, indice))
+        yield registros.order_by("-rango", "-fecha_creacion", "-pk")[: tamano + 1]
+
+
+def _mezclar(resultados, tamano):
+    mezcla = heapq.merge(
+        *(
+            [((registro.rango, registro.fecha_creacion, indice, registro.pk), registro) for registro in registros]
+            for indice, registros in enumerate(resultados)
+        ),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+
+    registros = []
+    siguiente = None
+    for posicion, registro in mezcla:
+        if len(registros) == tamano:
+            siguiente = registros[-1].cursor
+            break
+        registro.cursor = codificar_cursor(*posicion)
+        registros.append(registro)
+    return Pagina(registros, siguiente)
+
+
+def paginar(fuentes, texto, cursor=None, tamano=50):
+    """
+    Una página de los registros de ``fuentes`` (querysets) que contienen ``texto``,
+    del más relevante al menos relevante. Como en ``rondas.timeline.paginar``, cada
+    registro recibe el atributo ``cursor`` y la página el de la siguiente.
+    """
+    consultas = _consultas(fuentes, texto, decodificar_cursor(cursor), tamano)
+    return _mezclar([list(consulta) for consulta in consultas], tamano)
+
+
+async def apaginar(fuentes, texto, cursor=None, tamano=50):
+    """Versión asíncrona de ``paginar`` para vistas ``async``."""
+    # La primera vez se consulta si existe la tabla FTS5 o la extensión unaccent
+    await sync_to_async(_motor)()
+    if connection.vendor == "postgresql":
+        await sync_to_async(_con_unaccent)()
+    consultas = _consultas(fuentes, texto, decodificar_cursor(cursor), tamano)
+    return _mezclar([[registro async for registro in consulta] for consulta in consultas], tamano)
@@ -0,0 +1,107 @@
+"""
+Caché de ``rondas`` con claves versionadas por grupo de datos.
+
+Cada grupo tiene una versión guardada en la misma caché (un token aleatorio) que
+forma parte de las claves de sus entradas. Cuando cambia un modelo del grupo, las
+señales de ``rondas.signals`` llaman a ``invalidar``: la versión cambia, las
+entradas anteriores dejan de leerse y expiran solas. Así la invalidación funciona
+igual con memoria, archivos, base de datos o Redis (ver ``CACHES`` en settings),
+sin borrar claves por patrón.
+
+Uso::
+
+    from rondas import cache as cache_rondas
+
+    resumen = cache_rondas.obtener(["registros"], ("resumen", dia), calcular_resumen)
+
+Las operaciones que no disparan señales (``bulk_create``, ``QuerySet.update``)
+deben llamar a ``invalidar`` con los grupos que modifican.
+"""
+
+import hashlib
+import uuid
+from functools import partial
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+
+# Grupo de cada modelo; ``rondas.signals`` invalida el grupo al guardar o borrar
+GRUPOS = {
+    "rondas.RoundEntry": "registros",
+    "rondas.SurgeryRound": "cirugia",
+    "rondas.DailySurgeryRecord": "cirugia_diaria",
+    "rondas.Service": "catalogo",
+    "rondas.Room": "catalogo",
+    "rondas.Equipment": "catalogo",
+}
+
+_FALTA = object()
+
+
+def _clave_version(grupo):
+    return f"rondas:version:{grupo}"
+
+
+def _nueva_version():
+    return uuid.uuid4().hex[:12]
+
+
+def versiones(grupos):
+    """Versión vigente de cada grupo, en el mismo orden."""
+    claves = [_clave_version(grupo) for grupo in grupos]
+    guardadas = cache.get_many(claves)
+    for clave in claves:
+        if clave not in guardadas:
+            # Una versión que se perdió (expulsada de la caché) se reemplaza por una
+            # nueva, nunca por una anterior; si otro proceso la creó a la vez, gana esa
+            version = _nueva_version()
+            if not cache.add(clave, version, None):
+                version = cache.get(clave, version)
+            guardadas[clave] = version
+    return [guardadas[clave] for clave in claves]
+
+
+def clave(grupos, partes):
+    """Clave de caché para ``partes`` que cambia cuando se invalida alguno de ``grupos``."""
+    resumen = hashlib.sha1("|".join(str(parte) for parte in partes).encode()).hexdigest()[:20]
+    return "rondas:" + ":".join([*grupos, *versiones(grupos), resumen])
+
+
+def obtener(grupos, partes, calcular, tiempo=None):
+    """
+    Valor guardado para ``partes``; si no está, lo calcula con ``calcular()`` y lo
+    guarda ``tiempo`` segundos (por defecto ``CACHE_TIEMPO``).
+    """
+    clave_entrada = clave(grupos, partes)
+    valor = cache.get(clave_entrada, _FALTA)
+    if valor is _FALTA:
+        valor = calcular()
+        if tiempo is None:
+            cache.set(clave_entrada, valor)
+        else:
+            cache.set(clave_entrada, valor, tiempo)
+    return valor
+
+
+def _invalidar(grupos):
+    cache.set_many({_clave_version(grupo): _nueva_version() for grupo in grupos}, None)
+
+
+def invalidar(*grupos):
+    """
+    Cambia la versión de ``grupos`` cuando se confirma la transacción en curso, para
+    que ninguna petición guarde en la versión nueva datos que aún no ve.
+    """
+    transaction.on_commit(partial(_invalidar, grupos))
+
+
+def invalidar_modelo(modelo):
+    grupo = GRUPOS.get(modelo._meta.label)
+    if grupo is not None:
+        invalidar(grupo)
+
+
+def crear_tabla(sender, using="default", verbosity=1, **kwargs):
+    """``post_migrate``: crea la tabla de la caché si ``CACHES`` usa la base de datos."""
+    call_command("createcachetable", database=using, verbosity=verbosity)
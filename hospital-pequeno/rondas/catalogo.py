@@ -0,0 +1,143 @@
+"""
+Catálogo de servicios y salas que muestra el panel de rondas.
+
+El catálogo vive en ``Service``, ``Room`` y ``Equipment`` y se administra desde el
+admin de Django. Cada proceso guarda en memoria una copia ya organizada por día de
+la semana, cargada con una sola consulta con ``prefetch_related``; en cada
+petición solo se lee ``CatalogVersion`` (una fila por clave primaria) y la copia se
+recarga cuando ese número cambió. Las señales de ``rondas.signals`` incrementan la
+versión al guardar o borrar cualquier elemento del catálogo.
+"""
+
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+from .models import CatalogVersion, Equipment, Room, Service
+
+SPANISH_WEEKDAYS = [
+    "Lunes",
+    "Martes",
+    "Miércoles",
+    "Jueves",
+    "Viernes",
+    "Sábado",
+    "Domingo",
+]
+
+# Categoría de ``Service`` -> categoría de ``RoundEntry``
+CATEGORIAS_RONDA = {
+    "PRIORITARIO": "prioritarios",
+    "DIARIA": "ronda_diaria",
+    "SALAS": "servicio_salas",
+    "LAB": "laboratorio_clinico",
+    "SEDES": "sedes_externas",
+}
+
+
+class Catalogo(NamedTuple):
+    version: int
+    # Día de la semana -> categoría -> nombres de los servicios en orden, más
+    # "surgery_available" indicando si ese día hay ronda de salas de cirugía
+    por_dia: dict
+    dias_cirugia: tuple
+    distribucion_cirugia: tuple
+
+
+_catalogo = None
+
+
+def dias_de(servicio):
+    """Días (0=lunes) en que aparece ``servicio`` según ``day_rules``."""
+    dias = (servicio.day_rules or {}).get("dias")
+    return frozenset(range(7)) if dias is None else frozenset(dias)
+
+
+def _cargar(version):
+    equipos = Equipment.objects.filter(active=True).order_by("order", "name")
+    salas = (
+        Room.objects.filter(active=True)
+        .order_by("order", "number")
+        .prefetch_related(Prefetch("equipments", queryset=equipos))
+    )
+    servicios = (
+        Service.objects.filter(active=True)
+        .order_by("order", "name")
+        .prefetch_related(Prefetch("rooms", queryset=salas))
+    )
+
+    por_dia = {dia: {categoria: [] for categoria in CATEGORIAS_RONDA.values()} for dia in range(7)}
+    dias_cirugia = set()
+    distribucion = []
+    for servicio in servicios:
+        dias = dias_de(servicio)
+        if servicio.category == "CIRUGIA":
+            dias_cirugia |= dias
+            distribucion.extend(
+                {"sala": sala.number, "equipos": tuple(equipo.name for equipo in sala.equipments.all())}
+                for sala in servicio.rooms.all()
+            )
+            continue
+        categoria = CATEGORIAS_RONDA.get(servicio.category)
+        if categoria is None:
+            continue
+        for dia in dias:
+            por_dia[dia][categoria].append(servicio.name)
+
+    return Catalogo(
+        version=version,
+        por_dia={
+            dia: {
+                **{categoria: tuple(nombres) for categoria, nombres in categorias.items()},
+                "surgery_available": dia in dias_cirugia,
+            }
+            for dia, categorias in por_dia.items()
+        },
+        dias_cirugia=tuple(sorted(dias_cirugia)),
+        distribucion_cirugia=tuple(distribucion),
+    )
+
+
+def catalogo():
+    """Catálogo vigente; se recarga solo cuando cambió la versión en la base de datos."""
+    global _catalogo
+    version = CatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+    if _catalogo is None or _catalogo.version != version:
+        _catalogo = _cargar(version)
+    return _catalogo
+
+
+def version_catalogo():
+    return catalogo().version
+
+
+def invalidar_catalogo():
+    """Incrementa la versión para que todos los procesos recarguen el catálogo."""
+    with transaction.atomic():
+        if not CatalogVersion.objects.filter(pk=1).update(version=F("version") + 1):
+            CatalogVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+
+
+def surgery_available_today(day):
+    """Verifica si las salas de cirugía están disponibles hoy"""
+    return day in catalogo().dias_cirugia
+
+
+def servicios_por_dia(day):
+    """
+    Servicios de cada categoría disponibles el día ``day`` de la semana.
+
+    El resultado se comparte entre peticiones: las listas son tuplas y no debe
+    modificarse.
+    """
+    return catalogo().por_dia[day]
+
+
+def distribucion_cirugia():
+    """Salas de cirugía activas con sus equipos, en el orden del catálogo."""
+    return catalogo().distribucion_cirugia
+
+
+def dias_cirugia():
+    return catalogo().dias_cirugia
@@ -0,0 +1,219 @@
+"""
+Registro diario de salas de cirugía en un solo envío.
+
+La grilla completa del día (cada sala con sus equipos) llega como un JSON; se
+valida por columnas en lugar de un formulario por celda y se escribe con un
+``bulk_create`` con ``update_conflicts`` dentro de una transacción, de modo que
+volver a enviar el mismo día actualiza los registros existentes.
+
+Formato del envío::
+
+    {
+        "fecha": "2025-01-31",
+        "nombre_encargado_servicio": "...",
+        "nombre_encargado_ronda": "...",
+        "firma_servicio": "data:...",
+        "firma_ronda": "data:...",
+        "celdas": [
+            {"sala": "1", "equipo": "Monitor", "equipo_en_uso": true,
+             "estado_equipo": "operativo_completo", "observaciones": ""},
+            ...
+        ]
+    }
+
+Los errores se devuelven por celda, con el índice de la celda en ``celdas``.
+"""
+
+from collections import Counter
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import cache as cache_rondas
+from . import idempotencia
+from .firmas import guardar_firma, preparar_firma
+from .models import DailySurgeryRecord, DailySurgerySubmission
+
+CELDAS_MAXIMAS = 500
+ESTADOS = frozenset(clave for clave, _ in DailySurgeryRecord.ESTADOS)
+LARGO_MAXIMO = {
+    "nombre_encargado_servicio": DailySurgeryRecord._meta.get_field("nombre_encargado_servicio").max_length,
+    "nombre_encargado_ronda": DailySurgeryRecord._meta.get_field("nombre_encargado_ronda").max_length,
+}
+CAMPOS_ACTUALIZABLES = [
+    "usuario",
+    "dia_semana",
+    "equipo_en_uso",
+    "estado_equipo",
+    "observaciones",
+    "nombre_encargado_servicio",
+    "nombre_encargado_ronda",
+    "firma_servicio",
+    "firma_ronda",
+]
+
+
+class GrillaInvalida(Exception):
+    """Errores de validación: ``generales`` por campo y ``celdas`` por índice."""
+
+    def __init__(self, generales=None, celdas=None):
+        super().__init__("La grilla de cirugía tiene errores.")
+        self.generales = generales or {}
+        self.celdas = celdas or {}
+
+
+def _texto(valor):
+    return valor.strip() if isinstance(valor, str) else ""
+
+
+def _columna(celdas, campo):
+    return [celda.get(campo) if isinstance(celda, dict) else None for celda in celdas]
+
+
+def validar_grilla(datos, distribucion, dias_cirugia):
+    """
+    Valida el envío completo y devuelve un diccionario con la cabecera limpia
+    (``fecha``, nombres y firmas preparadas) y la lista de celdas.
+
+    ``distribucion`` es la de ``Catalogo.distribucion_cirugia`` y ``dias_cirugia``
+    los días de la semana con ronda de cirugía. Lanza ``GrillaInvalida``.
+    """
+    if not isinstance(datos, dict):
+        raise GrillaInvalida({"__all__": ["El envío debe ser un objeto JSON."]})
+    generales = {}
+
+    try:
+        fecha = date.fromisoformat(_texto(datos.get("fecha")))
+    except ValueError:
+        fecha = None
+        generales["fecha"] = ["Fecha inválida; use AAAA-MM-DD."]
+    if fecha is not None:
+        if fecha > timezone.localdate():
+            generales["fecha"] = ["No se pueden registrar días futuros."]
+        elif fecha.weekday() not in dias_cirugia:
+            generales["fecha"] = ["Ese día no hay ronda de salas de cirugía."]
+
+    cabecera = {"fecha": fecha}
+    for campo in ("nombre_encargado_servicio", "nombre_encargado_ronda"):
+        cabecera[campo] = _texto(datos.get(campo))
+        if len(cabecera[campo]) > LARGO_MAXIMO[campo]:
+            generales[campo] = [f"Máximo {LARGO_MAXIMO[campo]} caracteres."]
+    # Las firmas se verifican una vez para toda la grilla
+    for campo in ("firma_servicio", "firma_ronda"):
+        valor = datos.get(campo) or None
+        try:
+            if valor is not None and not isinstance(valor, str):
+                raise ValueError("La firma no tiene el formato esperado.")
+            cabecera[campo] = preparar_firma(valor)
+        except ValueError as exc:
+            generales[campo] = [str(exc)]
+
+    celdas = datos.get("celdas")
+    if not isinstance(celdas, list) or not celdas:
+        generales["celdas"] = ["Envíe al menos una celda."]
+        raise GrillaInvalida(generales)
+    if len(celdas) > CELDAS_MAXIMAS:
+        generales["celdas"] = [f"Máximo {CELDAS_MAXIMAS} celdas por envío."]
+        raise GrillaInvalida(generales)
+
+    # Validación por columnas
+    salas = [_texto(str(valor)) if isinstance(valor, (str, int)) else "" for valor in _columna(celdas, "sala")]
+    equipos = [_texto(valor) for valor in _columna(celdas, "equipo")]
+    en_uso = [valor is True for valor in _columna(celdas, "equipo_en_uso")]
+    estados = [_texto(valor) for valor in _columna(celdas, "estado_equipo")]
+    observaciones = [_texto(valor) for valor in _columna(celdas, "observaciones")]
+
+    permitidos = {(str(sala["sala"]), equipo) for sala in distribucion for equipo in sala["equipos"]}
+    pares = list(zip(salas, equipos))
+    repetidos = {par for par, veces in Counter(pares).items() if veces > 1}
+
+    errores = {}
+
+    def agregar(indices, campo, mensaje):
+        for indice in indices:
+            errores.setdefault(indice, {}).setdefault(campo, []).append(mensaje)
+
+    no_objetos = {i for i, celda in enumerate(celdas) if not isinstance(celda, dict)}
+    agregar(no_objetos, "__all__", "Cada celda debe ser un objeto.")
+    agregar(
+        (i for i, par in enumerate(pares) if par not in permitidos and i not in no_objetos),
+        "equipo",
+        "La sala o el equipo no existen.",
+    )
+    agregar((i for i, par in enumerate(pares) if par in repetidos), "__all__", "Celda repetida en el envío.")
+    agregar((i for i, estado in enumerate(estados) if estado and estado not in ESTADOS), "estado_equipo", "Estado inválido.")
+    agregar(
+        (i for i, (uso, estado) in enumerate(zip(en_uso, estados)) if uso and not estado),
+        "estado_equipo",
+        "Debe seleccionar el estado del equipo cuando está en uso.",
+    )
+
+    if any(en_uso):
+        for campo in ("nombre_encargado_servicio", "nombre_encargado_ronda"):
+            if not cabecera[campo]:
+                generales.setdefault(campo, []).append("Requerido cuando hay equipos en uso.")
+
+    if generales or errores:
+        raise GrillaInvalida(generales, errores)
+
+    cabecera["celdas"] = [
+        {
+            "sala": sala,
+            "equipo": equipo,
+            "equipo_en_uso": uso,
+            "estado_equipo": estado if uso else None,
+            "observaciones": observacion,
+        }
+        for sala, equipo, uso, estado, observacion in zip(salas, equipos, en_uso, estados, observaciones)
+    ]
+    return cabecera
+
+
+def guardar_grilla(grilla, usuario, dia_semana, clave=None):
+    """
+    Escribe las celdas validadas en una sola transacción; las que ya existían para
+    la fecha se actualizan. ``clave`` es la de idempotencia del envío: si otra
+    petición con la misma clave la guardó primero, no se escribe nada. Devuelve la
+    cantidad de celdas escritas.
+    """
+    try:
+        return _guardar_grilla(grilla, usuario, dia_semana, clave)
+    except IntegrityError:
+        guardadas = idempotencia.grilla_guardada(clave)
+        if guardadas is None:
+            raise
+        return guardadas
+
+
+def _guardar_grilla(grilla, usuario, dia_semana, clave):
+    with transaction.atomic():
+        if clave is not None:
+            # La clave va primero: un envío simultáneo con la misma espera aquí a que
+            # esta transacción termine y falla sin escribir celdas
+            DailySurgerySubmission.objects.create(
+                clave=clave, usuario=usuario, fecha=grilla["fecha"], guardadas=len(grilla["celdas"])
+            )
+        firma_servicio = guardar_firma(grilla["firma_servicio"])
+        firma_ronda = guardar_firma(grilla["firma_ronda"])
+        registros = [
+            DailySurgeryRecord(
+                usuario=usuario,
+                fecha=grilla["fecha"],
+                dia_semana=dia_semana,
+                nombre_encargado_servicio=grilla["nombre_encargado_servicio"],
+                nombre_encargado_ronda=grilla["nombre_encargado_ronda"],
+                firma_servicio=firma_servicio,
+                firma_ronda=firma_ronda,
+                **celda,
+            )
+            for celda in grilla["celdas"]
+        ]
+        DailySurgeryRecord.objects.bulk_create(
+            registros,
+            update_conflicts=True,
+            unique_fields=["fecha", "sala", "equipo"],
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+        cache_rondas.invalidar("cirugia_diaria")
+    return len(registros)
@@ -0,0 +1,163 @@
+"""
+Consultas compartidas por el historial, los indicadores y las exportaciones.
+
+Cada forma de consulta que llega a producción se registra en ``FORMAS_CONSULTA``
+con parámetros de ejemplo, para que ``manage.py auditar_indices`` pueda ejecutar
+EXPLAIN sobre ella y avisar cuando la base de datos recorre tablas completas.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import busqueda
+from .estados_cirugia import equipos_mas_fuera_de_servicio
+from .models import (
+    DailySurgeryRecord,
+    RoundEntry,
+    Signature,
+    SurgeryEquipmentStatus,
+    SurgeryRound,
+    WeeklySurgeryRollup,
+)
+
+FORMAS_CONSULTA = {}
+# Formas que recorren un índice en orden sin otro filtro y paran en el LIMIT
+RECORRIDOS_ORDENADOS = set()
+
+
+def forma_consulta(nombre, recorrido_ordenado=False):
+    """
+    Registra una función sin argumentos que devuelve el queryset a auditar.
+
+    ``recorrido_ordenado`` marca las consultas que leen las primeras filas de un
+    índice (``SCAN … USING INDEX`` en SQLite) y se detienen en el LIMIT; el resto de
+    los ``SCAN`` se reportan como recorridos completos.
+    """
+
+    def registrar(funcion):
+        FORMAS_CONSULTA[nombre] = funcion
+        if recorrido_ordenado:
+            RECORRIDOS_ORDENADOS.add(nombre)
+        return funcion
+
+    return registrar
+
+
+def filtrar_registros(registros, parametros):
+    """Aplica los filtros de categoría y servicio que usan el historial y las exportaciones."""
+    categoria = parametros.get("categoria")
+    if categoria:
+        registros = registros.filter(categoria=categoria)
+    subservicio = parametros.get("subservicio")
+    if subservicio:
+        registros = registros.filter(subservicio__icontains=subservicio)
+    return registros
+
+
+@forma_consulta("historial: primera página", recorrido_ordenado=True)
+def _historial_primera_pagina():
+    return RoundEntry.objects.order_by("-fecha_creacion", "-pk")[:51]
+
+
+@forma_consulta("historial: página siguiente")
+def _historial_pagina_siguiente():
+    ahora = timezone.now()
+    return RoundEntry.objects.filter(
+        Q(fecha_creacion__lte=ahora), Q(fecha_creacion__lt=ahora) | Q(pk__lt=1000)
+    ).order_by("-fecha_creacion", "-pk")[:51]
+
+
+@forma_consulta("historial: búsqueda de texto")
+def _historial_busqueda():
+    return busqueda.filtrar(RoundEntry.objects.all(), "monitor desconectado").order_by(
+        "-rango", "-fecha_creacion", "-pk"
+    )[:51]
+
+
+@forma_consulta("historial: filtro por categoría")
+def _historial_por_categoria():
+    return filtrar_registros(RoundEntry.objects.all(), {"categoria": "prioritarios"}).order_by(
+        "-fecha_creacion", "-pk"
+    )[:51]
+
+
+@forma_consulta("historial: búsqueda por servicio")
+def _historial_por_servicio():
+    return filtrar_registros(RoundEntry.objects.all(), {"subservicio": "urgencias"}).order_by(
+        "-fecha_creacion", "-pk"
+    )[:51]
+
+
+@forma_consulta("historial: rondas de cirugía", recorrido_ordenado=True)
+def _historial_cirugias():
+    return SurgeryRound.objects.order_by("-fecha_creacion", "-pk")[:51]
+
+
+def _api_despues_de(modelo):
+    ahora = timezone.now()
+    return modelo.objects.filter(
+        Q(fecha_creacion__gte=ahora), Q(fecha_creacion__gt=ahora) | Q(pk__gt=1000)
+    ).order_by("fecha_creacion", "pk")[:101]
+
+
+@forma_consulta("api: rondas, página siguiente")
+def _api_rondas():
+    return _api_despues_de(RoundEntry)
+
+
+@forma_consulta("api: rondas por categoría desde una fecha")
+def _api_rondas_por_categoria():
+    return RoundEntry.objects.filter(
+        categoria="ronda_diaria", fecha_creacion__gte=timezone.now() - timedelta(days=7)
+    ).order_by("fecha_creacion", "pk")[:101]
+
+
+@forma_consulta("api: grilla diaria de cirugía, página siguiente")
+def _api_cirugia_diaria():
+    return _api_despues_de(DailySurgeryRecord)
+
+
+# Los totales del tablero suman la tabla completa de DailyRollup a propósito: crece
+# con los días y servicios, no con el historial, así que no se registran aquí.
+
+
+@forma_consulta("indicadores: formatos de cirugía por semana", recorrido_ordenado=True)
+def _indicadores_semanal_cirugia():
+    return WeeklySurgeryRollup.objects.values("semana_inicio", "total").order_by("-semana_inicio")[:12]
+
+
+@forma_consulta("indicadores: recálculo de un día")
+def _indicadores_recalculo_dia():
+    ahora = timezone.now()
+    return RoundEntry.objects.filter(
+        categoria="ronda_diaria",
+        subservicio="Urgencias",
+        fecha_creacion__gte=ahora - timedelta(days=1),
+        fecha_creacion__lt=ahora,
+    ).values("id")
+
+
+@forma_consulta("exportación: historial filtrado")
+def _exportacion_filtrada():
+    return filtrar_registros(
+        RoundEntry.objects.all(), {"categoria": "ronda_diaria", "subservicio": "urgencias"}
+    ).order_by("-fecha_creacion", "-pk")
+
+
+@forma_consulta("firmas: pendientes de normalizar", recorrido_ordenado=True)
+def _firmas_pendientes():
+    return Signature.objects.filter(normalizada=False).order_by("created_at").values_list("pk", flat=True)[:50]
+
+
+@forma_consulta("cirugía: equipos fuera de servicio")
+def _cirugia_fuera_de_servicio():
+    return equipos_mas_fuera_de_servicio(timezone.localdate() - timedelta(weeks=12))
+
+
+@forma_consulta("cirugía: historial de un equipo")
+def _cirugia_historial_equipo():
+    return SurgeryEquipmentStatus.objects.filter(sala="3", equipo="Electrobisturí").values_list("estado").annotate(
+        veces=Count("id")
+    ).order_by()
@@ -0,0 +1,105 @@
+"""
+Estados de los equipos de cirugía derivados de ``SurgeryRound.datos``.
+
+El formato semanal guarda la matriz sala × equipo × día como JSON
+(``{"1": {"Monitor": {"Lunes": "operativo_completo"}}}``). Cada estado se copia a
+una fila de ``SurgeryEquipmentStatus`` al guardar el formato, de modo que las
+preguntas sobre el historial de un equipo se responden con consultas indexadas.
+
+Las operaciones que no disparan señales (``bulk_create``, ``QuerySet.update``)
+deben llamar a ``sincronizar_ronda`` o ejecutar ``manage.py rebuild_surgery_status``.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+
+from .catalogo import SPANISH_WEEKDAYS
+
+TAMANO_LOTE = 1000
+ESTADOS = ("operativo_completo", "operativo_parcial", "fuera_de_servicio")
+_INDICE_DIA = {nombre.lower(): indice for indice, nombre in enumerate(SPANISH_WEEKDAYS)}
+
+
+def estados_de(ronda_id, semana_inicio, datos):
+    """
+    Filas ``(campos)`` de cada estado registrado en ``datos``. Los días o estados
+    que no se reconocen y las celdas vacías se ignoran.
+    """
+    if not isinstance(datos, dict):
+        return
+    for sala, equipos in datos.items():
+        if not isinstance(equipos, dict):
+            continue
+        for equipo, dias in equipos.items():
+            if not isinstance(dias, dict):
+                continue
+            for nombre_dia, estado in dias.items():
+                dia = _INDICE_DIA.get(str(nombre_dia).strip().lower())
+                if dia is None or estado not in ESTADOS:
+                    continue
+                yield {
+                    "ronda_id": ronda_id,
+                    "semana_inicio": semana_inicio,
+                    "fecha": semana_inicio + timedelta(days=dia),
+                    "dia": dia,
+                    "sala": str(sala)[:50],
+                    "equipo": str(equipo)[:100],
+                    "estado": estado,
+                }
+
+
+def sincronizar_ronda(ronda):
+    """Reemplaza los estados derivados de un formato semanal."""
+    from .models import SurgeryEquipmentStatus
+
+    with transaction.atomic():
+        SurgeryEquipmentStatus.objects.filter(ronda_id=ronda.pk).delete()
+        SurgeryEquipmentStatus.objects.bulk_create(
+            SurgeryEquipmentStatus(**fila) for fila in estados_de(ronda.pk, ronda.semana_inicio, ronda.datos)
+        )
+
+
+def reconstruir_estados():
+    """Vuelve a generar todos los estados desde los formatos guardados."""
+    from .models import SurgeryEquipmentStatus, SurgeryRound
+
+    rondas = SurgeryRound.objects.values_list("pk", "semana_inicio", "datos").order_by("pk")
+    with transaction.atomic():
+        SurgeryEquipmentStatus.objects.all().delete()
+        lote = []
+        for ronda_id, semana_inicio, datos in rondas.iterator(chunk_size=200):
+            lote.extend(SurgeryEquipmentStatus(**fila) for fila in estados_de(ronda_id, semana_inicio, datos))
+            if len(lote) >= TAMANO_LOTE:
+                SurgeryEquipmentStatus.objects.bulk_create(lote)
+                lote = []
+        SurgeryEquipmentStatus.objects.bulk_create(lote)
+    return SurgeryEquipmentStatus.objects.count()
+
+
+def conteo_por_estado(sala, equipo, desde=None, hasta=None):
+    """``{estado: veces}`` de un equipo en una sala, opcionalmente entre dos fechas."""
+    from .models import SurgeryEquipmentStatus
+
+    estados = SurgeryEquipmentStatus.objects.filter(sala=str(sala), equipo=equipo)
+    if desde:
+        estados = estados.filter(fecha__gte=desde)
+    if hasta:
+        estados = estados.filter(fecha__lte=hasta)
+    return dict(estados.values_list("estado").annotate(veces=Count("id")).order_by())
+
+
+def equipos_mas_fuera_de_servicio(desde, limite=5):
+    """
+    Equipos con más días fuera de servicio desde ``desde``, de mayor a menor.
+    Devuelve el queryset sin evaluar para usarlo también desde vistas ``async``.
+    """
+    from .models import SurgeryEquipmentStatus
+
+    return (
+        SurgeryEquipmentStatus.objects.filter(estado="fuera_de_servicio", fecha__gte=desde)
+        .values("sala", "equipo")
+        .annotate(total=Count("id"))
+        .order_by("-total", "sala", "equipo")[:limite]
+    )
@@ -0,0 +1,212 @@
+"""
+Generación de los archivos de exportación del historial.
+
+Las exportaciones recorren el historial por lotes con una proyección mínima (sin
+las firmas, solo si existen) y escriben el resultado directamente en un archivo,
+de modo que la memoria usada no depende del número de registros.
+
+Las vistas no generan los archivos: crean un ``ExportJob`` que el comando
+``run_export_worker`` toma de la cola y procesa con ``ejecutar_exportacion``.
+"""
+
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+try:
+    from xhtml2pdf import pisa
+except ImportError:
+    pisa = None
+
+from .consultas import filtrar_registros
+from .models import ExportJob, RoundEntry, SurgeryRound
+from .reporte_pdf import escribir_reporte
+
+# Registros leídos por viaje a la base de datos
+TAMANO_LOTE = 2000
+
+COLUMNAS = [
+    "Fecha",
+    "Categoría",
+    "Servicio",
+    "Hallazgo",
+    "Eventos",
+    "Placa",
+    "Orden",
+    "Nombre Encargado Servicio",
+    "Tiene Firma Servicio",
+    "Nombre Encargado Ronda",
+    "Tiene Firma Ronda",
+    "Estado",
+]
+
+
+def _tiene(campo):
+    return ExpressionWrapper(Q(**{f"{campo}__isnull": False}), output_field=BooleanField())
+
+
+def filas_historial(registros):
+    """Itera las filas de exportación del queryset ``registros`` ya filtrado."""
+    categorias = dict(RoundEntry.CATEGORIAS)
+    proyeccion = registros.annotate(
+        tiene_firma_servicio=_tiene("firma_servicio"),
+        tiene_firma_ronda=_tiene("firma_ronda"),
+    ).values_list(
+        "fecha_creacion",
+        "categoria",
+        "subservicio",
+        "hallazgo",
+        "tiene_eventos_seguridad",
+        "eventos_seguridad",
+        "placa_equipo",
+        "orden_trabajo",
+        "nombre_encargado_servicio",
+        "tiene_firma_servicio",
+        "nombre_encargado_ronda",
+        "tiene_firma_ronda",
+        "sin_novedad",
+    )
+    for (
+        fecha,
+        categoria,
+        subservicio,
+        hallazgo,
+        tiene_eventos,
+        eventos,
+        placa,
+        orden,
+        encargado_servicio,
+        firma_servicio,
+        encargado_ronda,
+        firma_ronda,
+        sin_novedad,
+    ) in proyeccion.iterator(chunk_size=TAMANO_LOTE):
+        if tiene_eventos and eventos:
+            eventos_texto = "Sí: " + eventos
+        else:
+            eventos_texto = "Sí" if tiene_eventos else "No"
+        yield [
+            timezone.localtime(fecha).strftime("%d/%m/%Y %H:%M"),
+            categorias.get(categoria, categoria),
+            subservicio,
+            hallazgo,
+            eventos_texto,
+            placa,
+            orden,
+            encargado_servicio,
+            "Sí" if firma_servicio else "No",
+            encargado_ronda,
+            "Sí" if firma_ronda else "No",
+            "Sin novedad" if sin_novedad else "Con novedad",
+        ]
+
+
+def escribir_excel(registros, destino, progreso=None):
+    """
+    Escribe el historial en ``destino`` (ruta o archivo binario) con openpyxl en modo
+    solo escritura. ``progreso(hechos, total)`` se llama después de cada lote.
+    """
+    total = registros.count() if progreso else 0
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet("Historial")
+    hoja.append(COLUMNAS)
+    for hechos, fila in enumerate(filas_historial(registros), start=1):
+        hoja.append(fila)
+        if progreso and hechos % TAMANO_LOTE == 0:
+            progreso(hechos, total)
+    libro.save(destino)
+
+
+def lineas_texto(registros):
+    """Historial como texto separado por tabulaciones, para cuando faltan openpyxl o xhtml2pdf."""
+    yield "\t".join(COLUMNAS) + "\n"
+    for fila in filas_historial(registros):
+        yield "\t".join(str(valor) for valor in fila) + "\n"
+
+
+def escribir_texto(registros, destino):
+    for linea in lineas_texto(registros):
+        destino.write(linea.encode("utf-8"))
+
+
+def generar_exportacion(formato, parametros, destino, progreso=None):
+    """
+    Escribe la exportación ``formato`` del historial filtrado por ``parametros`` en
+    ``destino`` y devuelve la extensión del archivo generado.
+    """
+    registros = filtrar_registros(RoundEntry.objects.all(), parametros)
+    if formato == "excel" and openpyxl is not None:
+        escribir_excel(registros, destino, progreso)
+        return "xlsx"
+    if formato == "pdf" and pisa is not None:
+        escribir_reporte(registros, SurgeryRound.objects.all(), destino, progreso=progreso)
+        return "pdf"
+    # Sin openpyxl o xhtml2pdf se entrega un TXT con los datos
+    escribir_texto(registros, destino)
+    return "txt"
+
+
+def ejecutar_exportacion(trabajo):
+    """Genera el archivo de ``trabajo`` y lo deja completado o con el error ocurrido."""
+
+    def progreso(hechos, total):
+        porcentaje = min(99, hechos * 100 // max(total, 1))
+        ExportJob.objects.filter(pk=trabajo.pk).update(progreso=porcentaje)
+
+    try:
+        with tempfile.TemporaryFile() as archivo:
+            extension = generar_exportacion(trabajo.formato, trabajo.parametros, archivo, progreso)
+            archivo.seek(0)
+            trabajo.archivo.save(f"historial_{trabajo.pk}.{extension}", File(archivo), save=False)
+        trabajo.estado = ExportJob.COMPLETADO
+        trabajo.progreso = 100
+    except Exception as e:
+        trabajo.estado = ExportJob.ERROR
+        trabajo.error = str(e)
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save()
+    return trabajo
+
+
+def tomar_trabajo():
+    """
+    Reclama el trabajo pendiente más antiguo. El cambio de estado es condicional,
+    así que varios workers pueden compartir la cola sin procesar dos veces lo mismo.
+    """
+    pendientes = (
+        ExportJob.objects.filter(estado=ExportJob.PENDIENTE)
+        .order_by("fecha_creacion")
+        .values_list("pk", flat=True)[:5]
+    )
+    for pk in pendientes:
+        reclamado = ExportJob.objects.filter(pk=pk, estado=ExportJob.PENDIENTE).update(
+            estado=ExportJob.EN_PROCESO, fecha_inicio=timezone.now()
+        )
+        if reclamado:
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def reencolar_trabajos_abandonados(minutos=30):
+    """Devuelve a la cola los trabajos de un worker que se detuvo a mitad de camino."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return ExportJob.objects.filter(estado=ExportJob.EN_PROCESO, fecha_inicio__lt=limite).update(
+        estado=ExportJob.PENDIENTE, progreso=0
+    )
+
+
+def eliminar_exportaciones_antiguas(dias=7):
+    """Borra los trabajos terminados (y sus archivos) con más de ``dias`` días."""
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = ExportJob.objects.filter(fecha_creacion__lt=limite, estado__in=[ExportJob.COMPLETADO, ExportJob.ERROR])
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
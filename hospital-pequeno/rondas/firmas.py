@@ -0,0 +1,278 @@
+"""
+Almacenamiento de firmas digitales direccionado por contenido.
+
+Las firmas llegan desde el canvas como trazos vectoriales (ver ``rondas.trazos``)
+o, desde clientes anteriores, como ``data:image/...;base64,...``. En lugar de
+guardar esa cadena en cada registro, se guardan una sola vez en ``Signature`` con
+el SHA-256 de los bytes recibidos como clave; los registros solo conservan la
+clave.
+
+Durante la petición solo se decodifica y verifica la firma. Las imágenes se
+normalizan después (fondo blanco, recorte al área con trazo, tamaño máximo y PNG
+de 16 tonos de gris) en ``manage.py run_export_worker`` con
+``normalizar_pendientes``, o en la propia petición cuando
+``FIRMAS_EN_SEGUNDO_PLANO`` es ``False``. Las firmas vectoriales se guardan tal
+cual y se dibujan con ``imagen_png`` cuando se necesita la imagen.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import trazos
+from .instrumentacion import etapa
+
+logger = logging.getLogger("rondas")
+
+# Tamaño máximo de la imagen recibida, antes de normalizar
+TAMANO_MAXIMO_RECIBIDO = 2 * 1024 * 1024
+# Lado máximo en píxeles, el mismo de los trazos: un PNG pequeño puede declarar
+# dimensiones enormes y ocupar gigabytes al decodificarse en el worker
+LADO_MAXIMO_RECIBIDO = trazos.LADO_MAXIMO
+TIPOS_ACEPTADOS = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Firma normalizada: tamaño máximo, margen alrededor del trazo y umbral de tinta
+TAMANO_NORMALIZADO = (600, 200)
+MARGEN_TRAZO = 8
+UMBRAL_TINTA = 230
+TONOS_GRIS = 16
+LOTE_NORMALIZACION = 50
+# Las imágenes dibujadas desde trazos se guardan en la caché de Django
+TIEMPO_CACHE_IMAGEN = 7 * 24 * 60 * 60
+
+
+class FirmaPreparada(NamedTuple):
+    """Firma recibida y verificada, lista para persistirse."""
+
+    sha256: str
+    content_type: str
+    data: bytes
+    width: int
+    height: int
+
+
+def decodificar_data_uri(valor, tipo="data:image"):
+    """Extrae los bytes de un data URI de imagen. Devuelve ``None`` si no aplica."""
+    if not valor or not valor.startswith(tipo):
+        return None
+    try:
+        _, base64_data = valor.split(";base64,", 1)
+        return base64.b64decode(base64_data, validate=True)
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _compactar(imagen, tamano):
+    """Recorta al trazo con un margen, reduce a ``tamano`` y codifica como PNG de 4 bits."""
+    # Caja del trazo: píxeles más oscuros que el umbral
+    caja = ImageOps.invert(imagen).point(lambda valor: 255 if valor > 255 - UMBRAL_TINTA else 0).getbbox()
+    if caja:
+        izquierda, arriba, derecha, abajo = caja
+        imagen = imagen.crop((
+            max(izquierda - MARGEN_TRAZO, 0),
+            max(arriba - MARGEN_TRAZO, 0),
+            min(derecha + MARGEN_TRAZO, imagen.width),
+            min(abajo + MARGEN_TRAZO, imagen.height),
+        ))
+    imagen.thumbnail(tamano, Image.Resampling.LANCZOS)
+
+    salida = io.BytesIO()
+    imagen.quantize(TONOS_GRIS).save(salida, format="PNG", optimize=True, bits=4)
+    return salida.getvalue(), imagen.size
+
+
+def _en_grises(datos):
+    """Abre la imagen, aplana la transparencia sobre fondo blanco y la pasa a escala de grises."""
+    imagen = Image.open(io.BytesIO(datos))
+    if imagen.mode == "P":
+        imagen = imagen.convert("RGBA")
+    if imagen.mode in ("RGBA", "LA"):
+        fondo = Image.new("RGB", imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1])
+        imagen = fondo
+    return imagen.convert("L")
+
+
+def normalizar_firma(datos):
+    """
+    Aplana la transparencia sobre fondo blanco, recorta la imagen al trazo con un
+    margen, la reduce a ``TAMANO_NORMALIZADO`` y la re-codifica como PNG de 4 bits
+    en escala de grises. Devuelve los bytes y el tamaño final.
+    """
+    return _compactar(_en_grises(datos), TAMANO_NORMALIZADO)
+
+
+def _preparar_trazos(valor):
+    datos = decodificar_data_uri(valor, f"data:{trazos.CONTENT_TYPE};")
+    if datos is None:
+        raise ValueError("La firma no tiene el formato esperado.")
+    if len(datos) > TAMANO_MAXIMO_RECIBIDO:
+        raise ValueError("La firma es demasiado grande.")
+    firma = trazos.decodificar(datos)
+    return FirmaPreparada(
+        sha256=hashlib.sha256(datos).hexdigest(),
+        content_type=trazos.CONTENT_TYPE,
+        data=datos,
+        width=firma.ancho,
+        height=firma.alto,
+    )
+
+
+def preparar_firma(valor):
+    """
+    Convierte el data URI recibido del formulario en una ``FirmaPreparada`` sin
+    procesar la imagen: de los trazos se valida el formato y de las imágenes solo
+    se leen la cabecera y el tamaño.
+
+    Devuelve ``None`` si el valor está vacío y lanza ``ValueError`` si no es una
+    firma válida.
+    """
+    if not valor:
+        return None
+    with etapa("firmas"):
+        if valor.startswith(f"data:{trazos.CONTENT_TYPE};"):
+            return _preparar_trazos(valor)
+        datos = decodificar_data_uri(valor)
+        if datos is None:
+            raise ValueError("La firma no tiene el formato esperado.")
+        if len(datos) > TAMANO_MAXIMO_RECIBIDO:
+            raise ValueError("La firma es demasiado grande.")
+        try:
+            # open() solo lee la cabecera; el tamaño se revisa antes de verificar los datos
+            imagen = Image.open(io.BytesIO(datos))
+            ancho, alto = imagen.size
+            if ancho > LADO_MAXIMO_RECIBIDO or alto > LADO_MAXIMO_RECIBIDO:
+                raise ValueError("La firma es demasiado grande.")
+            content_type = TIPOS_ACEPTADOS.get(imagen.format)
+            imagen.verify()
+        except Image.DecompressionBombError as exc:
+            raise ValueError("La firma es demasiado grande.") from exc
+        except (UnidentifiedImageError, OSError, SyntaxError) as exc:
+            raise ValueError("La firma no es una imagen válida.") from exc
+        if content_type is None:
+            raise ValueError("La firma no es una imagen válida.")
+    return FirmaPreparada(
+        sha256=hashlib.sha256(datos).hexdigest(),
+        content_type=content_type,
+        data=datos,
+        width=ancho,
+        height=alto,
+    )
+
+
+def guardar_firma(preparada):
+    """Persiste la firma si aún no existe y devuelve la instancia de ``Signature``."""
+    from .models import Signature
+
+    if preparada is None:
+        return None
+    en_segundo_plano = getattr(settings, "FIRMAS_EN_SEGUNDO_PLANO", True)
+
+    defaults = {
+        "content_type": preparada.content_type,
+        "data": preparada.data,
+        "width": preparada.width,
+        "height": preparada.height,
+        "size": len(preparada.data),
+    }
+    vectorial = preparada.content_type == trazos.CONTENT_TYPE
+    if vectorial:
+        # Los trazos no se normalizan: la imagen se dibuja cuando se pide
+        defaults["normalizada"] = True
+    with etapa("firmas"):
+        firma, creada = Signature.objects.only("sha256").get_or_create(
+            sha256=preparada.sha256,
+            defaults=defaults,
+        )
+        if creada and not (vectorial or en_segundo_plano):
+            normalizar_guardada(firma.sha256)
+    return firma
+
+
+def normalizar_guardada(sha256):
+    """
+    Reemplaza la imagen recibida de una firma por su versión normalizada y genera
+    la miniatura. Las imágenes que no se pueden procesar se conservan tal cual.
+    """
+    from .models import Signature
+
+    datos = Signature.objects.filter(pk=sha256, normalizada=False).values_list("data", flat=True).first()
+    if datos is None:
+        return False
+    pendiente = Signature.objects.filter(pk=sha256, normalizada=False)
+    try:
+        normalizada, (ancho, alto) = normalizar_firma(bytes(datos))
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("No se pudo normalizar la firma %s; se conserva la original", sha256, exc_info=True)
+        return bool(pendiente.update(normalizada=True))
+    return bool(pendiente.update(
+        content_type="image/png",
+        data=normalizada,
+        width=ancho,
+        height=alto,
+        size=len(normalizada),
+        thumbnail=generar_miniatura(normalizada),
+        normalizada=True,
+    ))
+
+
+def normalizar_pendientes(limite=LOTE_NORMALIZACION):
+    """Normaliza hasta ``limite`` firmas pendientes, las más antiguas primero."""
+    from .models import Signature
+
+    pendientes = list(
+        Signature.objects.filter(normalizada=False).order_by("created_at").values_list("pk", flat=True)[:limite]
+    )
+    return sum(normalizar_guardada(sha256) for sha256 in pendientes)
+
+
+def data_uri(content_type, datos):
+    """Reconstruye el data URI de una firma almacenada."""
+    return f"data:{content_type};base64,{base64.b64encode(bytes(datos)).decode('ascii')}"
+
+
+def imagen_png(sha256, content_type, datos):
+    """
+    Bytes PNG de una firma. Las firmas vectoriales se dibujan y el resultado queda
+    en la caché; las imágenes se devuelven tal como están guardadas.
+    """
+    if content_type != trazos.CONTENT_TYPE:
+        return bytes(datos)
+    clave = f"firma:png:{sha256}"
+    png = cache.get(clave)
+    if png is None:
+        png, _ = _compactar(trazos.rasterizar(datos), TAMANO_NORMALIZADO)
+        cache.set(clave, png, TIEMPO_CACHE_IMAGEN)
+    return png
+
+
+MINIATURA_MAXIMA = (200, 70)
+
+
+def generar_miniatura(datos, content_type="image/png"):
+    """
+    Renderiza una versión reducida (PNG de 16 tonos) para listados como el historial.
+
+    Si la firma original ya es más liviana que la miniatura, se reutiliza tal cual;
+    para las vectoriales la original es su PNG de tamaño completo.
+    """
+    if content_type == trazos.CONTENT_TYPE:
+        imagen = trazos.rasterizar(datos)
+        completa = _compactar(imagen.copy(), TAMANO_NORMALIZADO)[0]
+        miniatura = _compactar(imagen, MINIATURA_MAXIMA)[0]
+        return miniatura if len(miniatura) < len(completa) else completa
+    datos = bytes(datos)
+    # Las firmas pendientes de normalizar pueden traer transparencia
+    imagen = _en_grises(datos)
+    imagen.thumbnail(MINIATURA_MAXIMA, Image.Resampling.LANCZOS)
+    salida = io.BytesIO()
+    imagen.quantize(16).save(salida, format="PNG", optimize=True, bits=4)
+    miniatura = salida.getvalue()
+    return miniatura if len(miniatura) < len(datos) else datos
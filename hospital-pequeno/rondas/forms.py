@@ -1,11 +1,28 @@
 ﻿import json
 from django import forms
 
+from .firmas import guardar_firma, preparar_firma
+from .idempotencia import guardar as guardar_idempotente
 from .models import RoundEntry, SurgeryRound
 
 
+class FirmaField(forms.CharField):
+    """Campo oculto que recibe el data URI del canvas y lo normaliza para el almacén de firmas."""
+
+    widget = forms.HiddenInput
+
+    def clean(self, value):
+        value = super().clean(value)
+        try:
+            return preparar_firma(value)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc)) from exc
+
+
 class RoundEntryForm(forms.ModelForm):
     sin_novedad = forms.BooleanField(required=False, widget=forms.HiddenInput())
+    firma_servicio = FirmaField(label="Firma del encargado del servicio", required=False)
+    firma_ronda = FirmaField(label="Firma del encargado de la ronda", required=False)
 
     class Meta:
         model = RoundEntry
@@ -19,9 +36,7 @@ class RoundEntryForm(forms.ModelForm):
             "eventos_seguridad",
             "fuera_de_servicio",
             "nombre_encargado_servicio",
-            "firma_servicio",
             "nombre_encargado_ronda",
-            "firma_ronda",
             "sin_novedad",
         ]
         widgets = {
@@ -34,9 +49,7 @@ class RoundEntryForm(forms.ModelForm):
             "eventos_seguridad": forms.Textarea(attrs={"rows": 2, "class": "form-control", "disabled": True}),
             "fuera_de_servicio": forms.TextInput(attrs={"class": "form-control"}),
             "nombre_encargado_servicio": forms.TextInput(attrs={"class": "form-control"}),
-            "firma_servicio": forms.TextInput(attrs={"type": "hidden"}),  
             "nombre_encargado_ronda": forms.TextInput(attrs={"class": "form-control"}),
-            "firma_ronda": forms.TextInput(attrs={"type": "hidden"}),     
         }
 
     def clean(self):
@@ -56,17 +69,28 @@ class RoundEntryForm(forms.ModelForm):
         
         return cleaned_data
 
-    def save(self, commit=True):
+    def save(self, commit=True, firmas=None):
+        """``firmas`` (sha256 → ``Signature``) reutiliza las firmas ya guardadas en un mismo lote."""
         instancia = super().save(commit=False)
         if instancia.sin_novedad:
             instancia.hallazgo = instancia.hallazgo or "Sin novedad"
             instancia.placa_equipo = instancia.placa_equipo or "Sin novedad"
             instancia.orden_trabajo = instancia.orden_trabajo or ""
             instancia.eventos_seguridad = instancia.eventos_seguridad or "Sin novedad"
+        instancia.firma_servicio = self._guardar_firma("firma_servicio", firmas)
+        instancia.firma_ronda = self._guardar_firma("firma_ronda", firmas)
         if commit:
             instancia.save()
         return instancia
 
+    def _guardar_firma(self, campo, firmas):
+        preparada = self.cleaned_data.get(campo)
+        if preparada is None or firmas is None:
+            return guardar_firma(preparada)
+        if preparada.sha256 not in firmas:
+            firmas[preparada.sha256] = guardar_firma(preparada)
+        return firmas[preparada.sha256]
+
 
 class SurgeryRoundForm(forms.Form):
     semana_inicio = forms.DateField(
@@ -88,14 +112,8 @@ class SurgeryRoundForm(forms.Form):
         max_length=100,
         widget=forms.TextInput(attrs={"class": "form-control"}),
     )
-    firma_servicio = forms.CharField(
-        label="Firma encargado del servicio",
-        widget=forms.HiddenInput(),
-    )
-    firma_ronda = forms.CharField(
-        label="Firma encargado de la ronda",
-        widget=forms.HiddenInput(),
-    )
+    firma_servicio = FirmaField(label="Firma encargado del servicio")
+    firma_ronda = FirmaField(label="Firma encargado de la ronda")
     payload = forms.CharField(widget=forms.HiddenInput())
 
     def clean_semana_inicio(self):
@@ -115,38 +133,19 @@ class SurgeryRoundForm(forms.Form):
             raise forms.ValidationError("El formato recibido es inválido.")
         return data
 
-    def guardar(self, usuario):
-        from .utils import base64_to_image_file
-        
-        # Procesar firmas desde base64
-        firma_servicio_file = None
-        firma_ronda_file = None
-        
-        firma_servicio_b64 = self.cleaned_data["firma_servicio"]
-        if firma_servicio_b64:
-            firma_servicio_file = base64_to_image_file(firma_servicio_b64, "firma_servicio")
-        
-        firma_ronda_b64 = self.cleaned_data["firma_ronda"]
-        if firma_ronda_b64:
-            firma_ronda_file = base64_to_image_file(firma_ronda_b64, "firma_ronda")
-        
-        registro = SurgeryRound.objects.create(
+    def guardar(self, usuario, clave=None):
+        """Crea el formato; con ``clave`` un reintento concurrente devuelve el ya guardado."""
+        return guardar_idempotente(SurgeryRound(
             usuario=usuario,
             semana_inicio=self.cleaned_data["semana_inicio"],
             observaciones=self.cleaned_data.get("observaciones", ""),
             nombre_encargado_servicio=self.cleaned_data["nombre_encargado_servicio"],
             nombre_encargado_ronda=self.cleaned_data["nombre_encargado_ronda"],
+            firma_servicio=guardar_firma(self.cleaned_data["firma_servicio"]),
+            firma_ronda=guardar_firma(self.cleaned_data["firma_ronda"]),
             datos=self.cleaned_data["payload"],
-        )
-        
-        # Asignar archivos de firma si se procesaron correctamente
-        if firma_servicio_file:
-            registro.firma_servicio = firma_servicio_file
-        if firma_ronda_file:
-            registro.firma_ronda = firma_ronda_file
-        
-        registro.save()
-        return registro
+            clave_idempotencia=clave,
+        ))
 
 
 class DailySurgeryRoundForm(forms.Form):
@@ -203,16 +202,8 @@ class DailySurgeryRoundForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={"class": "form-control"}),
     )
-    firma_servicio = forms.CharField(
-        label="Firma encargado del servicio",
-        required=False,
-        widget=forms.HiddenInput(),
-    )
-    firma_ronda = forms.CharField(
-        label="Firma encargado de la ronda",
-        required=False,
-        widget=forms.HiddenInput(),
-    )
+    firma_servicio = FirmaField(label="Firma encargado del servicio", required=False)
+    firma_ronda = FirmaField(label="Firma encargado de la ronda", required=False)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -0,0 +1,136 @@
+"""
+Fragmentos HTML del panel de rondas guardados en caché.
+
+Cada servicio del panel tiene una tarjeta con un ``RoundEntryForm`` vacío. Esas
+tarjetas son iguales para todos los usuarios salvo por el token CSRF y la hora,
+así que se renderizan una vez con marcadores y se guardan en la caché de Django;
+en cada petición solo se reemplazan los marcadores. El acordeón completo de un
+día se guarda igual, de modo que un panel sin datos enviados es una lectura de la
+caché y dos reemplazos. El formulario enviado con errores se renderiza aparte,
+con sus datos.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.text import slugify
+
+from .forms import RoundEntryForm
+
+PLANTILLA = "rondas/_formulario_ronda.html"
+PLANTILLA_ACORDEON = "rondas/_acordeon_rondas.html"
+MARCADOR_CSRF = "__token_csrf__"
+MARCADOR_HORA = "__hora_registro__"
+TIEMPO_CACHE = 24 * 60 * 60
+
+_version_plantilla = None
+
+
+def dom_id(categoria, servicio):
+    """Identificador único en la página para la tarjeta, el canvas y los campos."""
+    return slugify(f"{categoria}-{servicio}")
+
+
+def formulario_ronda(categoria, servicio, datos=None):
+    """``RoundEntryForm`` de un servicio con ids propios para no chocar con los demás."""
+    return RoundEntryForm(
+        datos,
+        initial={"categoria": categoria, "subservicio": servicio},
+        auto_id=f"id_{dom_id(categoria, servicio)}_%s",
+    )
+
+
+def _version_plantillas():
+    # Cambiar las plantillas invalida los fragmentos guardados
+    global _version_plantilla
+    if _version_plantilla is None:
+        fuente = "".join(get_template(nombre).template.source for nombre in (PLANTILLA, PLANTILLA_ACORDEON))
+        _version_plantilla = hashlib.sha1(fuente.encode()).hexdigest()[:12]
+    return _version_plantilla
+
+
+def _clave(version, categoria, servicio):
+    servicio_hash = hashlib.sha1(f"{categoria}|{servicio}".encode()).hexdigest()[:16]
+    return f"panel:formulario:{version}:{_version_plantillas()}:{servicio_hash}"
+
+
+def _renderizar(categoria, servicio):
+    return render_to_string(PLANTILLA, {
+        "form": formulario_ronda(categoria, servicio),
+        "nombre": servicio,
+        "dom_id": dom_id(categoria, servicio),
+        "hora_registro": MARCADOR_HORA,
+        "csrf_token": MARCADOR_CSRF,
+    })
+
+
+def _tarjetas(servicios, version):
+    """``{(categoria, servicio): html}`` de las tarjetas vacías, con marcadores."""
+    claves = {_clave(version, categoria, servicio): (categoria, servicio) for categoria, servicio in servicios}
+    guardadas = cache.get_many(claves)
+    nuevas = {
+        clave: _renderizar(*servicio)
+        for clave, servicio in claves.items()
+        if clave not in guardadas
+    }
+    if nuevas:
+        cache.set_many(nuevas, TIEMPO_CACHE)
+        guardadas.update(nuevas)
+    return {servicio: guardadas[clave] for clave, servicio in claves.items()}
+
+
+def _completar(html, request, hora_registro):
+    return mark_safe(html.replace(MARCADOR_CSRF, get_token(request)).replace(MARCADOR_HORA, hora_registro))
+
+
+def _renderizar_acordeon(secciones, version, enviado=None, request=None, hora_registro=MARCADOR_HORA):
+    tarjetas = _tarjetas(
+        [
+            (clave, servicio)
+            for clave, _, lista in secciones
+            for servicio in lista
+            if not (enviado and enviado[:2] == (clave, servicio))
+        ],
+        version,
+    )
+    categorias = []
+    for clave, titulo, lista in secciones:
+        if not lista:
+            continue
+        subservicios = []
+        for servicio in lista:
+            sub = {"nombre": servicio, "dom_id": dom_id(clave, servicio)}
+            if enviado and enviado[:2] == (clave, servicio):
+                sub["form"] = enviado[2]
+            else:
+                sub["html"] = mark_safe(tarjetas[(clave, servicio)])
+            subservicios.append(sub)
+        categorias.append({"clave": clave, "titulo": titulo, "subservicios": subservicios})
+    return render_to_string(
+        PLANTILLA_ACORDEON,
+        {"categories": categorias, "hora_registro": hora_registro},
+        request=request,
+    )
+
+
+def acordeon(request, secciones, hora_registro, version, dia, enviado=None):
+    """
+    HTML del acordeón de servicios del panel.
+
+    ``secciones`` son tuplas ``(clave, titulo, servicios)`` del día ``dia`` según la
+    versión ``version`` del catálogo. ``enviado`` es ``(clave, servicio, form)``
+    cuando hay un formulario con errores; ese acordeón se renderiza completo, sin
+    guardarlo en la caché.
+    """
+    if enviado is not None:
+        return _completar(_renderizar_acordeon(secciones, version, enviado, request, hora_registro), request, hora_registro)
+
+    clave = f"panel:acordeon:{version}:{_version_plantillas()}:{dia}"
+    html = cache.get(clave)
+    if html is None:
+        html = _renderizar_acordeon(secciones, version)
+        cache.set(clave, html, TIEMPO_CACHE)
+    return _completar(html, request, hora_registro)
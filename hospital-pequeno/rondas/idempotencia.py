@@ -0,0 +1,62 @@
+"""
+Claves de idempotencia de los envíos.
+
+El navegador genera un UUID por envío (campo ``clave_idempotencia`` de los
+formularios del panel, cabecera ``Idempotency-Key`` en los envíos JSON, o un campo
+por registro en la sincronización sin conexión). Si la clave ya está guardada, el
+envío es un reintento: se responde con el resultado guardado sin volver a validar
+ni procesar firmas, de modo que reintentar después de un tiempo de espera agotado
+no duplica registros.
+
+Los registros guardan su propia clave. Las celdas de la grilla diaria de cirugía
+se sobrescriben al corregir el día, así que su clave va en
+``DailySurgerySubmission``, una fila por envío que no se modifica.
+"""
+
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from .models import DailySurgerySubmission
+
+CAMPO = "clave_idempotencia"
+ENCABEZADO = "HTTP_IDEMPOTENCY_KEY"
+
+
+def leer_clave(valor):
+    """La clave como ``UUID``, o ``None`` si falta o no es un UUID."""
+    if not valor:
+        return None
+    try:
+        return uuid.UUID(str(valor))
+    except ValueError:
+        return None
+
+
+def guardado(modelo, clave):
+    """Id del registro de ``modelo`` guardado con ``clave``, o ``None``."""
+    if clave is None:
+        return None
+    return modelo.objects.filter(clave_idempotencia=clave).values_list("pk", flat=True).first()
+
+
+def grilla_guardada(clave):
+    """Celdas que guardó el envío de la grilla de cirugía con ``clave``, o ``None``."""
+    if clave is None:
+        return None
+    return DailySurgerySubmission.objects.filter(clave=clave).values_list("guardadas", flat=True).first()
+
+
+def guardar(instancia):
+    """
+    Guarda ``instancia`` (con su ``clave_idempotencia``) y la devuelve. Si otra
+    petición con la misma clave la guardó primero, devuelve esa.
+    """
+    try:
+        with transaction.atomic():
+            instancia.save()
+    except IntegrityError:
+        if instancia.clave_idempotencia is None:
+            raise
+        return type(instancia).objects.get(clave_idempotencia=instancia.clave_idempotencia)
+    return instancia
@@ -0,0 +1,87 @@
+"""
+Indicadores precalculados del tablero.
+
+``DailyRollup`` guarda los conteos de ``RoundEntry`` por día (hora local),
+categoría y servicio, y ``WeeklySurgeryRollup`` los formatos de cirugía por
+semana. Cuando cambia un registro se recalcula solo su grupo, de modo que la
+vista de indicadores lee unas pocas filas sin importar el tamaño del historial.
+
+Las operaciones que no disparan señales (``bulk_create``, ``QuerySet.update``)
+deben llamar a ``recalcular_dia``/``recalcular_semana`` o ejecutar
+``manage.py rebuild_rollups``.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+TAMANO_LOTE = 1000
+
+
+def _conteos():
+    return {
+        "total": Count("id"),
+        "con_novedad": Count("id", filter=Q(sin_novedad=False)),
+        "eventos": Count("id", filter=Q(tiene_eventos_seguridad=True)),
+        # El campo es texto libre: cualquier valor indica un equipo fuera de servicio
+        "fuera_de_servicio": Count("id", filter=~Q(fuera_de_servicio="")),
+    }
+
+
+def dia_local(momento):
+    return timezone.localtime(momento).date()
+
+
+def recalcular_dia(fecha, categoria, subservicio):
+    """Vuelve a contar los registros de un día, categoría y servicio."""
+    from .models import DailyRollup, RoundEntry
+
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    conteos = RoundEntry.objects.filter(
+        categoria=categoria,
+        subservicio=subservicio,
+        fecha_creacion__gte=inicio,
+        fecha_creacion__lt=inicio + timedelta(days=1),
+    ).aggregate(**_conteos())
+    grupo = {"fecha": fecha, "categoria": categoria, "subservicio": subservicio}
+    if conteos["total"]:
+        DailyRollup.objects.update_or_create(**grupo, defaults=conteos)
+    else:
+        DailyRollup.objects.filter(**grupo).delete()
+
+
+def recalcular_semana(semana_inicio):
+    from .models import SurgeryRound, WeeklySurgeryRollup
+
+    total = SurgeryRound.objects.filter(semana_inicio=semana_inicio).count()
+    if total:
+        WeeklySurgeryRollup.objects.update_or_create(semana_inicio=semana_inicio, defaults={"total": total})
+    else:
+        WeeklySurgeryRollup.objects.filter(semana_inicio=semana_inicio).delete()
+
+
+def reconstruir_indicadores():
+    """Reemplaza todos los indicadores con los conteos calculados desde cero."""
+    from .models import DailyRollup, RoundEntry, SurgeryRound, WeeklySurgeryRollup
+
+    diarios = (
+        RoundEntry.objects.annotate(fecha=TruncDate("fecha_creacion", tzinfo=timezone.get_current_timezone()))
+        .values("fecha", "categoria", "subservicio")
+        .annotate(**_conteos())
+        .order_by()
+    )
+    semanales = SurgeryRound.objects.values("semana_inicio").annotate(total=Count("id")).order_by()
+
+    with transaction.atomic():
+        DailyRollup.objects.all().delete()
+        WeeklySurgeryRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create(
+            (DailyRollup(**fila) for fila in diarios.iterator(chunk_size=TAMANO_LOTE)), batch_size=TAMANO_LOTE
+        )
+        WeeklySurgeryRollup.objects.bulk_create(
+            (WeeklySurgeryRollup(**fila) for fila in semanales), batch_size=TAMANO_LOTE
+        )
+    return DailyRollup.objects.count(), WeeklySurgeryRollup.objects.count()
@@ -0,0 +1,191 @@
+"""
+Instrumentación de las vistas de rondas.
+
+Las vistas decoradas con ``@instrumentada`` miden cuánto tarda cada etapa de la
+petición (validación del formulario, procesamiento de firmas, guardado, render de
+la plantilla) y acumulan los tiempos en histogramas en memoria. Solo se mide una
+fracción de las peticiones, definida por ``INSTRUMENTACION_MUESTREO`` (0 a 1).
+
+Los histogramas son por proceso: con varios workers de gunicorn cada uno acumula
+los suyos y ``/metricas/`` responde con los del worker que atiende la petición.
+``metricas`` los publica en el formato de texto de Prometheus con la etiqueta
+``proceso`` (el PID), para que las series de cada worker no se mezclen; el total se
+obtiene sumando por ``proceso`` (ver el README).
+
+El registro de eventos usa el logger ``rondas``; los datos enviados se resumen con
+``resumen_datos`` para no escribir las firmas completas en los logs.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger("rondas")
+
+# Límites superiores de los buckets, en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LARGO_MAXIMO_VALOR = 80
+
+_medicion_actual = ContextVar("medicion_actual", default=None)
+
+
+class Histograma:
+    """Histograma acumulado con buckets fijos, al estilo de Prometheus."""
+
+    def __init__(self):
+        self.conteos = [0] * len(BUCKETS)
+        self.cantidad = 0
+        self.suma = 0.0
+
+    def observar(self, segundos):
+        for indice, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                self.conteos[indice] += 1
+                break
+        self.cantidad += 1
+        self.suma += segundos
+
+
+_histogramas = {}
+_candado = threading.Lock()
+
+
+def observar(vista, etapa, segundos):
+    with _candado:
+        histograma = _histogramas.get((vista, etapa))
+        if histograma is None:
+            histograma = _histogramas[(vista, etapa)] = Histograma()
+        histograma.observar(segundos)
+
+
+def reiniciar():
+    with _candado:
+        _histogramas.clear()
+
+
+def tasa_muestreo():
+    return float(getattr(settings, "INSTRUMENTACION_MUESTREO", 1.0))
+
+
+class Medicion:
+    """Tiempos de una petición; cada etapa puede sumarse varias veces."""
+
+    def __init__(self, vista):
+        self.vista = vista
+        self.tiempos = {}
+
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    def registrar(self):
+        for nombre, segundos in self.tiempos.items():
+            observar(self.vista, nombre, segundos)
+
+
+def etapa(nombre):
+    """Mide un bloque dentro de la petición en curso; no hace nada si no se muestrea."""
+    medicion = _medicion_actual.get()
+    return medicion.etapa(nombre) if medicion else nullcontext()
+
+
+def _muestrear():
+    tasa = tasa_muestreo()
+    return tasa > 0 and (tasa >= 1 or random.random() < tasa)
+
+
+@contextmanager
+def _medir(vista, request):
+    medicion = Medicion(vista)
+    token = _medicion_actual.set(medicion)
+    try:
+        with medicion.etapa("total"):
+            yield
+    finally:
+        _medicion_actual.reset(token)
+        medicion.registrar()
+        logger.debug(
+            "%s %s: %s",
+            vista,
+            request.method,
+            ", ".join(f"{nombre}={segundos * 1000:.1f}ms" for nombre, segundos in medicion.tiempos.items()),
+        )
+
+
+def instrumentada(vista):
+    """Decorador que mide el tiempo total de la vista y el de sus etapas (síncrona o async)."""
+
+    def decorador(funcion):
+        if iscoroutinefunction(funcion):
+
+            @wraps(funcion)
+            async def envoltura_async(request, *args, **kwargs):
+                if not _muestrear():
+                    return await funcion(request, *args, **kwargs)
+                with _medir(vista, request):
+                    return await funcion(request, *args, **kwargs)
+
+            return envoltura_async
+
+        @wraps(funcion)
+        def envoltura(request, *args, **kwargs):
+            if not _muestrear():
+                return funcion(request, *args, **kwargs)
+            with _medir(vista, request):
+                return funcion(request, *args, **kwargs)
+
+        return envoltura
+
+    return decorador
+
+
+def resumen_datos(datos):
+    """
+    Resume un ``QueryDict`` para los logs: los valores largos (como las firmas en
+    base64) se reemplazan por su tamaño y los primeros caracteres.
+    """
+    resumen = {}
+    for clave in datos:
+        if clave == "csrfmiddlewaretoken":
+            continue
+        valor = datos.get(clave, "")
+        if len(valor) > LARGO_MAXIMO_VALOR:
+            valor = f"{valor[:24]}… ({len(valor)} caracteres)"
+        resumen[clave] = valor
+    return resumen
+
+
+def exposicion():
+    """Histogramas del proceso en el formato de texto de Prometheus."""
+    proceso = os.getpid()
+    lineas = [
+        "# HELP rondas_vista_segundos Duración de las etapas de las vistas de rondas.",
+        "# TYPE rondas_vista_segundos histogram",
+    ]
+    with _candado:
+        copia = {
+            clave: (list(histograma.conteos), histograma.cantidad, histograma.suma)
+            for clave, histograma in _histogramas.items()
+        }
+    for (vista, nombre), (conteos, cantidad, suma) in sorted(copia.items()):
+        etiquetas = f'vista="{vista}",etapa="{nombre}",proceso="{proceso}"'
+        acumulado = 0
+        for limite, conteo in zip(BUCKETS, conteos):
+            acumulado += conteo
+            lineas.append(f'rondas_vista_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f'rondas_vista_segundos_bucket{{{etiquetas},le="+Inf"}} {cantidad}')
+        lineas.append(f"rondas_vista_segundos_sum{{{etiquetas}}} {suma:.6f}")
+        lineas.append(f"rondas_vista_segundos_count{{{etiquetas}}} {cantidad}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from rondas.consultas import FORMAS_CONSULTA, RECORRIDOS_ORDENADOS
+
+
+def recorridos_secuenciales(plan, vendor):
+    """
+    Líneas del plan que indican un recorrido completo de tabla. En SQLite cualquier
+    ``SCAN`` lo es, también ``SCAN … USING INDEX`` (recorre el índice entero); solo
+    ``SEARCH`` busca por el índice.
+    """
+    lineas = []
+    for linea in plan.splitlines():
+        texto = linea.strip()
+        if vendor == "postgresql" and "Seq Scan" in texto:
+            lineas.append(texto)
+        elif (
+            vendor == "sqlite"
+            and " SCAN " in f" {texto} "
+            # Las tablas FTS5 se consultan con MATCH sobre su propio índice
+            and "VIRTUAL TABLE INDEX" not in texto
+            and "CONSTANT ROW" not in texto
+        ):
+            lineas.append(texto)
+    return lineas
+
+
+def recorrido_limitado(nombre, queryset, secuenciales):
+    """
+    La consulta se registró como recorrido ordenado, tiene LIMIT y solo recorre
+    índices: lee a lo sumo el LIMIT de filas.
+    """
+    return (
+        nombre in RECORRIDOS_ORDENADOS
+        and queryset.query.high_mark is not None
+        and all("USING INDEX" in linea or "USING COVERING INDEX" in linea for linea in secuenciales)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN sobre las consultas registradas y reporta recorridos secuenciales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help='Mostrar el plan completo de cada consulta',
+        )
+        parser.add_argument(
+            '--forzar-indices',
+            action='store_true',
+            help=(
+                'En PostgreSQL desactiva enable_seqscan para ver si existe un índice utilizable '
+                '(con tablas pequeñas el planificador prefiere recorrerlas completas)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        self.stdout.write(f'🔎 Auditando {len(FORMAS_CONSULTA)} consultas en {vendor}...')
+
+        alertas = 0
+        with transaction.atomic():
+            if options['forzar_indices'] and vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for nombre, construir in FORMAS_CONSULTA.items():
+                queryset = construir()
+                plan = queryset.explain()
+                secuenciales = recorridos_secuenciales(plan, vendor)
+                if secuenciales and recorrido_limitado(nombre, queryset, secuenciales):
+                    self.stdout.write(self.style.SUCCESS(f'✅ {nombre} (índice en orden hasta el LIMIT)'))
+                elif secuenciales:
+                    alertas += 1
+                    self.stdout.write(self.style.WARNING(f'⚠️  {nombre}: recorrido secuencial'))
+                    for linea in secuenciales:
+                        self.stdout.write(f'      {linea}')
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'✅ {nombre}'))
+                if options['plan']:
+                    for linea in plan.splitlines():
+                        self.stdout.write(f'      │ {linea}')
+
+        if alertas:
+            self.stdout.write(self.style.WARNING(f'\n{alertas} consulta(s) recorren tablas completas'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nTodas las consultas usan índices'))
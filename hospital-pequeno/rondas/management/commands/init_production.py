@@ -12,6 +12,8 @@ class Command(BaseCommand):
         # Aplicar migraciones
         self.stdout.write('📋 Aplicando migraciones...')
         call_command('migrate', '--noinput')
+        # Solo crea algo con CACHE_BACKEND=db
+        call_command('createcachetable')
         
         # Crear superusuario si no existe
         if not User.objects.filter(username='Husi2025').exists():
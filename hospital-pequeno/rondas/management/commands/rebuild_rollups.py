@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from rondas.indicadores import reconstruir_indicadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los indicadores precalculados del tablero'
+
+    def handle(self, *args, **options):
+        diarios, semanales = reconstruir_indicadores()
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Indicadores reconstruidos: {diarios} diarios, {semanales} semanales de cirugía')
+        )
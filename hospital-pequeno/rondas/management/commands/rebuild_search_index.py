@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rondas.busqueda import instalar
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a crear los triggers de búsqueda del historial y regenera el índice'
+
+    def handle(self, *args, **options):
+        instalar()
+        self.stdout.write(self.style.SUCCESS('✅ Índice de búsqueda del historial reconstruido'))
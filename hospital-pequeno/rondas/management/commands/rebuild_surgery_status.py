@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rondas.estados_cirugia import reconstruir_estados
+
+
+class Command(BaseCommand):
+    help = 'Regenera desde los formatos semanales los estados de los equipos de cirugía'
+
+    def handle(self, *args, **options):
+        total = reconstruir_estados()
+        self.stdout.write(self.style.SUCCESS(f'✅ Estados de equipos de cirugía reconstruidos: {total}'))
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rondas.exportaciones import (
+    ejecutar_exportacion,
+    eliminar_exportaciones_antiguas,
+    reencolar_trabajos_abandonados,
+    tomar_trabajo,
+)
+from rondas.firmas import normalizar_pendientes
+from rondas.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa la cola de exportaciones del historial (PDF/Excel) guardada en la base de datos '
+        'y normaliza las firmas recibidas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar los trabajos pendientes y terminar',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--dias-retencion',
+            type=int,
+            default=7,
+            help='Días que se conservan las exportaciones terminadas (por defecto 7)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🚀 Worker de exportaciones iniciado')
+        reencolados = reencolar_trabajos_abandonados()
+        if reencolados:
+            self.stdout.write(self.style.WARNING(f'{reencolados} trabajo(s) abandonado(s) devuelto(s) a la cola'))
+        eliminar_exportaciones_antiguas(options['dias_retencion'])
+
+        try:
+            while True:
+                close_old_connections()
+                # Las firmas van primero: cada lote tarda poco y reduce lo que guarda la base
+                normalizadas = normalizar_pendientes()
+                if normalizadas:
+                    self.stdout.write(f'✍️ {normalizadas} firma(s) normalizada(s)')
+
+                trabajo = tomar_trabajo()
+                if trabajo is None:
+                    if normalizadas:
+                        continue
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'📄 Procesando {trabajo}...')
+                trabajo = ejecutar_exportacion(trabajo)
+                if trabajo.estado == ExportJob.COMPLETADO:
+                    self.stdout.write(self.style.SUCCESS(f'✅ {trabajo.archivo.name}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'❌ {trabajo}: {trabajo.error}'))
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido')
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0005_alter_roundentry_categoria_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySurgeryRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha', models.DateField(verbose_name='Fecha del registro')),
+                ('dia_semana', models.CharField(max_length=20, verbose_name='Día de la semana')),
+                ('sala', models.CharField(max_length=10, verbose_name='Sala')),
+                ('equipo', models.CharField(max_length=100, verbose_name='Equipo')),
+                ('equipo_en_uso', models.BooleanField(default=True, verbose_name='Equipo en uso')),
+                ('estado_equipo', models.CharField(blank=True, choices=[('operativo_completo', 'Operativo completo'), ('operativo_parcial', 'Operativo parcial'), ('fuera_de_servicio', 'Fuera de servicio')], max_length=20, null=True, verbose_name='Estado del equipo')),
+                ('observaciones', models.TextField(blank=True, verbose_name='Observaciones')),
+                ('nombre_encargado_servicio', models.CharField(blank=True, max_length=100, verbose_name='Encargado del servicio')),
+                ('nombre_encargado_ronda', models.CharField(blank=True, max_length=100, verbose_name='Encargado de la ronda')),
+                ('firma_servicio', models.TextField(blank=True, verbose_name='Firma del encargado del servicio')),
+                ('firma_ronda', models.TextField(blank=True, verbose_name='Firma del encargado de la ronda')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro Diario de Cirugía',
+                'verbose_name_plural': 'Registros Diarios de Cirugía',
+                'ordering': ['-fecha_creacion'],
+                'unique_together': {('fecha', 'sala', 'equipo')},
+            },
+        ),
+    ]
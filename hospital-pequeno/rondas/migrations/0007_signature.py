@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _referencia(verbose_name):
+    return models.ForeignKey(
+        blank=True,
+        null=True,
+        on_delete=django.db.models.deletion.PROTECT,
+        related_name="+",
+        to="rondas.signature",
+        verbose_name=verbose_name,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0006_dailysurgeryrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Signature',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content_type', models.CharField(default='image/png', max_length=50)),
+                ('data', models.BinaryField()),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Firma',
+                'verbose_name_plural': 'Firmas',
+            },
+        ),
+        migrations.AddField(
+            model_name='roundentry',
+            name='firma_servicio_ref',
+            field=_referencia('Firma del encargado del servicio'),
+        ),
+        migrations.AddField(
+            model_name='roundentry',
+            name='firma_ronda_ref',
+            field=_referencia('Firma del encargado de la ronda'),
+        ),
+        migrations.AddField(
+            model_name='surgeryround',
+            name='firma_servicio_ref',
+            field=_referencia('Firma del encargado del servicio'),
+        ),
+        migrations.AddField(
+            model_name='surgeryround',
+            name='firma_ronda_ref',
+            field=_referencia('Firma del encargado de la ronda'),
+        ),
+        migrations.AddField(
+            model_name='dailysurgeryrecord',
+            name='firma_servicio_ref',
+            field=_referencia('Firma del encargado del servicio'),
+        ),
+        migrations.AddField(
+            model_name='dailysurgeryrecord',
+            name='firma_ronda_ref',
+            field=_referencia('Firma del encargado de la ronda'),
+        ),
+    ]
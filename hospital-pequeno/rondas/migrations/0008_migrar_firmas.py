@@ -0,0 +1,122 @@
+# Mueve las firmas base64 de cada registro al almacén direccionado por contenido.
+#
+# Las funciones de firmas se copian aquí tal como eran al escribir la migración:
+# ``rondas.firmas`` cambió después (normalización en segundo plano, trazos) y
+# volver a aplicar esta migración debe producir siempre el mismo resultado.
+
+import base64
+import binascii
+import hashlib
+import io
+
+from django.db import migrations
+from PIL import Image, UnidentifiedImageError
+
+MODELOS = ["RoundEntry", "SurgeryRound", "DailySurgeryRecord"]
+CAMPOS = ["firma_servicio", "firma_ronda"]
+
+
+def decodificar_data_uri(valor):
+    if not valor or not valor.startswith("data:image"):
+        return None
+    try:
+        _, base64_data = valor.split(";base64,", 1)
+        return base64.b64decode(base64_data, validate=True)
+    except (ValueError, binascii.Error):
+        return None
+
+
+def normalizar_firma(datos):
+    """Fondo blanco y PNG en escala de grises, como se guardaban las firmas entonces."""
+    imagen = Image.open(io.BytesIO(datos))
+    if imagen.mode == "P":
+        imagen = imagen.convert("RGBA")
+    if imagen.mode in ("RGBA", "LA"):
+        fondo = Image.new("RGB", imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1])
+        imagen = fondo
+    imagen = imagen.convert("L")
+
+    salida = io.BytesIO()
+    imagen.save(salida, format="PNG", optimize=True)
+    return salida.getvalue(), imagen.size
+
+
+def guardar_firma(Signature, valor):
+    """``Signature`` con la firma del data URI, o ``None`` si no es una imagen válida."""
+    datos = decodificar_data_uri(valor)
+    if datos is None:
+        return None
+    try:
+        normalizada, (ancho, alto) = normalizar_firma(datos)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+    firma, _ = Signature.objects.only("sha256").get_or_create(
+        sha256=hashlib.sha256(normalizada).hexdigest(),
+        defaults={
+            "content_type": "image/png",
+            "data": normalizada,
+            "width": ancho,
+            "height": alto,
+            "size": len(normalizada),
+        },
+    )
+    return firma
+
+
+def data_uri(content_type, datos):
+    return f"data:{content_type};base64,{base64.b64encode(bytes(datos)).decode('ascii')}"
+
+
+def firmas_a_referencias(apps, schema_editor):
+    Signature = apps.get_model("rondas", "Signature")
+    # SHA-256 del data URI -> id de la firma; no guarda las cadenas completas
+    conocidas = {}
+
+    for nombre_modelo in MODELOS:
+        modelo = apps.get_model("rondas", nombre_modelo)
+        registros = modelo.objects.only("pk", *CAMPOS).order_by("pk").iterator(chunk_size=200)
+        for registro in registros:
+            cambios = {}
+            for campo in CAMPOS:
+                valor = getattr(registro, campo)
+                if not valor:
+                    continue
+                clave = hashlib.sha256(valor.encode()).hexdigest()
+                if clave not in conocidas:
+                    # Valores que no son data URI (p. ej. nombres de archivo que nunca
+                    # se guardaron) no pueden recuperarse y quedan sin firma.
+                    firma = guardar_firma(Signature, valor)
+                    conocidas[clave] = firma.pk if firma is not None else None
+                if conocidas[clave] is not None:
+                    cambios[f"{campo}_ref_id"] = conocidas[clave]
+            if cambios:
+                modelo.objects.filter(pk=registro.pk).update(**cambios)
+
+
+def referencias_a_firmas(apps, schema_editor):
+    Signature = apps.get_model("rondas", "Signature")
+
+    for nombre_modelo in MODELOS:
+        modelo = apps.get_model("rondas", nombre_modelo)
+        registros = modelo.objects.only("pk", *[f"{campo}_ref" for campo in CAMPOS]).iterator(chunk_size=200)
+        for registro in registros:
+            cambios = {}
+            for campo in CAMPOS:
+                clave = getattr(registro, f"{campo}_ref_id")
+                if clave:
+                    firma = Signature.objects.get(pk=clave)
+                    cambios[campo] = data_uri(firma.content_type, firma.data)
+            if cambios:
+                modelo.objects.filter(pk=registro.pk).update(**cambios)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0007_signature'),
+    ]
+
+    operations = [
+        migrations.RunPython(firmas_a_referencias, referencias_a_firmas),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0008_migrar_firmas'),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name='roundentry', name='firma_servicio'),
+        migrations.RemoveField(model_name='roundentry', name='firma_ronda'),
+        migrations.RemoveField(model_name='surgeryround', name='firma_servicio'),
+        migrations.RemoveField(model_name='surgeryround', name='firma_ronda'),
+        migrations.RemoveField(model_name='dailysurgeryrecord', name='firma_servicio'),
+        migrations.RemoveField(model_name='dailysurgeryrecord', name='firma_ronda'),
+        migrations.RenameField(model_name='roundentry', old_name='firma_servicio_ref', new_name='firma_servicio'),
+        migrations.RenameField(model_name='roundentry', old_name='firma_ronda_ref', new_name='firma_ronda'),
+        migrations.RenameField(model_name='surgeryround', old_name='firma_servicio_ref', new_name='firma_servicio'),
+        migrations.RenameField(model_name='surgeryround', old_name='firma_ronda_ref', new_name='firma_ronda'),
+        migrations.RenameField(model_name='dailysurgeryrecord', old_name='firma_servicio_ref', new_name='firma_servicio'),
+        migrations.RenameField(model_name='dailysurgeryrecord', old_name='firma_ronda_ref', new_name='firma_ronda'),
+    ]
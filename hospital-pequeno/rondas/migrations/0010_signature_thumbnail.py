@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0009_firmas_como_referencias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signature',
+            name='thumbnail',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:04
+
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+TRIGRAMA_SUBSERVICIO = "rondas_roundentry_subservicio_trgm"
+
+logger = logging.getLogger(__name__)
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    """
+    Índice GIN de trigramas para ``subservicio__icontains`` (solo PostgreSQL).
+
+    Django traduce ``icontains`` a ``UPPER(subservicio::text) LIKE UPPER(...)``,
+    por lo que el índice se crea sobre esa misma expresión.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRIGRAMA_SUBSERVICIO} ON rondas_roundentry "
+                "USING gin ((UPPER(subservicio::text)) gin_trgm_ops)"
+            )
+    except DatabaseError as exc:
+        # Sin permisos para crear la extensión la búsqueda sigue funcionando, solo más lenta.
+        logger.warning("No se pudo crear el índice de trigramas para subservicio: %s", exc)
+
+
+def eliminar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {TRIGRAMA_SUBSERVICIO}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0010_signature_thumbnail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roundentry',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='roundentry_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roundentry',
+            index=models.Index(fields=['categoria', '-fecha_creacion', '-id'], name='roundentry_cat_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roundentry',
+            index=models.Index(fields=['categoria', 'sin_novedad'], name='roundentry_cat_novedad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roundentry',
+            index=models.Index(condition=models.Q(('tiene_eventos_seguridad', True)), fields=['categoria', 'subservicio'], name='roundentry_eventos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surgeryround',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='surgeryround_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surgeryround',
+            index=models.Index(fields=['semana_inicio'], name='surgeryround_semana_idx'),
+        ),
+        migrations.RunPython(crear_indice_trigramas, eliminar_indice_trigramas),
+    ]
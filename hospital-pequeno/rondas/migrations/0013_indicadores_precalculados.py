@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Copia de ``rondas.indicadores.reconstruir_indicadores`` al escribir la migración,
+# para que volver a aplicarla no dependa de cómo cambie ese módulo.
+TAMANO_LOTE = 1000
+
+
+def calcular_indicadores(apps, schema_editor):
+    RoundEntry = apps.get_model("rondas", "RoundEntry")
+    SurgeryRound = apps.get_model("rondas", "SurgeryRound")
+    DailyRollup = apps.get_model("rondas", "DailyRollup")
+    WeeklySurgeryRollup = apps.get_model("rondas", "WeeklySurgeryRollup")
+
+    diarios = (
+        RoundEntry.objects.annotate(fecha=TruncDate("fecha_creacion", tzinfo=timezone.get_current_timezone()))
+        .values("fecha", "categoria", "subservicio")
+        .annotate(
+            total=Count("id"),
+            con_novedad=Count("id", filter=Q(sin_novedad=False)),
+            eventos=Count("id", filter=Q(tiene_eventos_seguridad=True)),
+            fuera_de_servicio=Count("id", filter=~Q(fuera_de_servicio="")),
+        )
+        .order_by()
+    )
+    semanales = SurgeryRound.objects.values("semana_inicio").annotate(total=Count("id")).order_by()
+
+    DailyRollup.objects.bulk_create(
+        (DailyRollup(**fila) for fila in diarios.iterator(chunk_size=TAMANO_LOTE)), batch_size=TAMANO_LOTE
+    )
+    WeeklySurgeryRollup.objects.bulk_create(
+        (WeeklySurgeryRollup(**fila) for fila in semanales), batch_size=TAMANO_LOTE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0012_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklySurgeryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semana_inicio', models.DateField(unique=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Indicador semanal de cirugía',
+                'verbose_name_plural': 'Indicadores semanales de cirugía',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('categoria', models.CharField(choices=[('prioritarios', 'Prioritarios'), ('ronda_diaria', 'Ronda diaria'), ('servicio_salas', 'Servicio de salas'), ('laboratorio_clinico', 'Laboratorio clínico'), ('sedes_externas', 'Sedes externas')], max_length=32)),
+                ('subservicio', models.CharField(max_length=100)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('con_novedad', models.PositiveIntegerField(default=0)),
+                ('eventos', models.PositiveIntegerField(default=0)),
+                ('fuera_de_servicio', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Indicador diario',
+                'verbose_name_plural': 'Indicadores diarios',
+                'unique_together': {('fecha', 'categoria', 'subservicio')},
+            },
+        ),
+        migrations.RunPython(calcular_indicadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0013_indicadores_precalculados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Versión del catálogo',
+                'verbose_name_plural': 'Versión del catálogo',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='equipment',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Equipo', 'verbose_name_plural': 'Equipos'},
+        ),
+        migrations.AlterModelOptions(
+            name='room',
+            options={'ordering': ['order', 'number'], 'verbose_name': 'Sala', 'verbose_name_plural': 'Salas'},
+        ),
+        migrations.AlterModelOptions(
+            name='service',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Servicio', 'verbose_name_plural': 'Servicios'},
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Orden'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Orden'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Orden'),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='category',
+            field=models.CharField(choices=[('PRIORITARIO', 'Prioritario'), ('DIARIA', 'Ronda diaria'), ('SALAS', 'Servicio de salas'), ('LAB', 'Laboratorio clínico'), ('SEDES', 'Sedes externas'), ('CIRUGIA', 'Salas de cirugía')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='day_rules',
+            field=models.JSONField(blank=True, default=dict, help_text='Días en que aparece en el panel, p. ej. {"dias": [0, 2, 4]} (0=lunes). Vacío: todos los días.'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Carga en Service/Room/Equipment el catálogo que antes estaba fijo en views.py.
+
+from django.db import migrations
+
+PRIORITARIOS = [
+    "UNIDAD DE RECIÉN NACIDOS (CUIDADOS INTERMEDIOS)",
+    "UNIDAD DE RECIÉN NACIDOS (CUIDADOS INTENSIVOS)",
+    "UNIDAD DE CUIDADOS INTENSIVOS",
+    "UNIDAD DE CUIDADO INTENSIVO PEDIÁTRICO",
+]
+SEDES_EXTERNAS = [
+    "Cuidados Paliativos",
+    "Calle 41",
+    "Intelectus",
+]
+RONDA_DIARIA = {
+    0: ["Urgencias", "Salud Mental", "Trasplante de Médula"],
+    1: ["Oftalmología", "Neurociencias", "Patología", "Radiología", "Hospitalización Aislamiento", "Sexto Centro", "Medicina Nuclear"],
+    2: ["Urgencias", "Oncología", "Hemato-Oncología", "Gastroenterología"],
+    3: ["Neumología", "Nefrología", "Cardiología", "Medicina Interna", "Neurología", "Otorrino"],
+    4: ["Urgencias", "Consulta Externa", "Pediatría", "9 Piso"],
+}
+SERVICIO_SALAS = {
+    0: ["Hospitalización Cirugía", "Lactario", "Central de Esterilización", "SIPE"],
+    2: ["Central de Esterilización", "Neurociencias", "SIPE"],
+    4: ["Central de Esterilización", "SIPE"],
+}
+LABORATORIO_CLINICO = {
+    0: [
+        "LC - ALMACÉN", "LC - MICROBIOLOGÍA", "LC - BIOLOGÍA MOLECULAR", "LC - CITOMETRÍA DE FLUJO",
+        "LC - INMUNOLOGÍA", "LC - HEMATOLOGÍA", "LC - QUÍMICA", "LC - TAMIZAJE",
+        "LC - REFERENCIA Y CONTRAREFERENCIA", "LC - SERVICIO TRANSFUSIONAL", "LC - TOMA DE MUESTRAS", "LC - ERRORES INNATOS",
+    ],
+}
+SURGERY_ROOMS = [str(numero) for numero in range(1, 15)]
+SURGERY_EQUIPMENT = [
+    "Máquina",
+    "Presión bala de oxígeno (O₂)",
+    "Monitor",
+    "Mesa",
+    "Lámpara",
+    "Electrobisturí",
+    "Microscopio",
+    "Otros",
+]
+SURGERY_AVAILABLE_DAYS = [0, 1, 2, 3, 4, 5]
+
+
+def _orden_y_dias(por_dia):
+    """
+    Une las listas de cada día en un solo orden que respeta el de todas ellas y
+    devuelve ``[(nombre, dias)]``.
+    """
+    orden = []
+    dias = {}
+    for dia, nombres in sorted(por_dia.items()):
+        for posicion, nombre in enumerate(nombres):
+            dias.setdefault(nombre, []).append(dia)
+            if nombre in orden:
+                continue
+            # Se ubica antes del siguiente servicio de la lista que ya tenga lugar
+            siguientes = [otro for otro in nombres[posicion + 1:] if otro in orden]
+            if siguientes:
+                orden.insert(orden.index(siguientes[0]), nombre)
+            else:
+                orden.append(nombre)
+    return [(nombre, dias[nombre]) for nombre in orden]
+
+
+def cargar_catalogo(apps, schema_editor):
+    Service = apps.get_model("rondas", "Service")
+    Room = apps.get_model("rondas", "Room")
+    Equipment = apps.get_model("rondas", "Equipment")
+    CatalogVersion = apps.get_model("rondas", "CatalogVersion")
+
+    CatalogVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+    if Service.objects.exists():
+        return
+
+    servicios = [("PRIORITARIO", nombre, {}) for nombre in PRIORITARIOS]
+    for categoria, por_dia in (("DIARIA", RONDA_DIARIA), ("SALAS", SERVICIO_SALAS), ("LAB", LABORATORIO_CLINICO)):
+        servicios += [(categoria, nombre, {"dias": dias}) for nombre, dias in _orden_y_dias(por_dia)]
+    servicios += [("SEDES", nombre, {}) for nombre in SEDES_EXTERNAS]
+    Service.objects.bulk_create(
+        Service(name=nombre, category=categoria, day_rules=reglas, order=orden)
+        for orden, (categoria, nombre, reglas) in enumerate(servicios)
+    )
+
+    cirugia = Service.objects.create(
+        name="Salas de cirugía",
+        category="CIRUGIA",
+        day_rules={"dias": SURGERY_AVAILABLE_DAYS},
+        order=len(servicios),
+    )
+    for orden_sala, numero in enumerate(SURGERY_ROOMS):
+        sala = Room.objects.create(
+            number=numero, name=f"Sala {numero}", room_type="sala_cirugia", service=cirugia, order=orden_sala
+        )
+        Equipment.objects.bulk_create(
+            Equipment(name=equipo, room=sala, service=cirugia, order=orden)
+            for orden, equipo in enumerate(SURGERY_EQUIPMENT)
+            # El microscopio solo está en la sala 1
+            if not (equipo == "Microscopio" and numero != "1")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rondas", "0014_catalogo_en_base_de_datos"),
+    ]
+
+    operations = [
+        migrations.RunPython(cargar_catalogo, migrations.RunPython.noop),
+    ]
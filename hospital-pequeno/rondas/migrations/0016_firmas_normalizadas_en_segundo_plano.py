@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0015_cargar_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signature',
+            name='normalizada',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='signature',
+            index=models.Index(condition=models.Q(('normalizada', False)), fields=['created_at'], name='firma_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:26
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de ``rondas.estados_cirugia`` al escribir la migración, para que volver a
+# aplicarla no dependa de cómo cambie ese módulo.
+DIAS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+ESTADOS = ("operativo_completo", "operativo_parcial", "fuera_de_servicio")
+TAMANO_LOTE = 1000
+
+
+def estados_de(ronda_id, semana_inicio, datos):
+    if not isinstance(datos, dict):
+        return
+    for sala, equipos in datos.items():
+        if not isinstance(equipos, dict):
+            continue
+        for equipo, dias in equipos.items():
+            if not isinstance(dias, dict):
+                continue
+            for nombre_dia, estado in dias.items():
+                nombre_dia = str(nombre_dia).strip().lower()
+                if nombre_dia not in DIAS or estado not in ESTADOS:
+                    continue
+                dia = DIAS.index(nombre_dia)
+                yield {
+                    "ronda_id": ronda_id,
+                    "semana_inicio": semana_inicio,
+                    "fecha": semana_inicio + timedelta(days=dia),
+                    "dia": dia,
+                    "sala": str(sala)[:50],
+                    "equipo": str(equipo)[:100],
+                    "estado": estado,
+                }
+
+
+def cargar_estados(apps, schema_editor):
+    SurgeryRound = apps.get_model("rondas", "SurgeryRound")
+    SurgeryEquipmentStatus = apps.get_model("rondas", "SurgeryEquipmentStatus")
+
+    lote = []
+    rondas = SurgeryRound.objects.values_list("pk", "semana_inicio", "datos").order_by("pk")
+    for ronda_id, semana_inicio, datos in rondas.iterator(chunk_size=200):
+        lote.extend(SurgeryEquipmentStatus(**fila) for fila in estados_de(ronda_id, semana_inicio, datos))
+        if len(lote) >= TAMANO_LOTE:
+            SurgeryEquipmentStatus.objects.bulk_create(lote)
+            lote = []
+    SurgeryEquipmentStatus.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0016_firmas_normalizadas_en_segundo_plano'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurgeryEquipmentStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semana_inicio', models.DateField()),
+                ('fecha', models.DateField()),
+                ('dia', models.PositiveSmallIntegerField(help_text='Día de la semana (0 = lunes).')),
+                ('sala', models.CharField(max_length=50)),
+                ('equipo', models.CharField(max_length=100)),
+                ('estado', models.CharField(choices=[('operativo_completo', 'Operativo completo'), ('operativo_parcial', 'Operativo parcial'), ('fuera_de_servicio', 'Fuera de servicio')], max_length=20)),
+                ('ronda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estados_equipos', to='rondas.surgeryround')),
+            ],
+            options={
+                'verbose_name': 'Estado de equipo de cirugía',
+                'verbose_name_plural': 'Estados de equipos de cirugía',
+                'indexes': [models.Index(fields=['sala', 'equipo', 'fecha'], name='estadocirugia_equipo_idx'), models.Index(fields=['estado', 'fecha'], name='estadocirugia_estado_idx')],
+            },
+        ),
+        migrations.RunPython(cargar_estados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,142 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Copia de ``rondas.busqueda`` tal como estaba al crear esta migración: los cambios
+# posteriores de ese módulo no deben alterar lo que hace una migración ya aplicada.
+TABLA_FTS = "rondas_busqueda"
+FUENTES = {
+    "rondas_roundentry": (("hallazgo",), ("eventos_seguridad", "fuera_de_servicio"), 1),
+    "rondas_surgeryround": (("observaciones",), (), -1),
+}
+
+
+def _concatenar(campos, fila):
+    if not campos:
+        return "''"
+    return " || ' ' || ".join(f"coalesce({fila}.{campo}, '')" for campo in campos)
+
+
+def _crear_unaccent(schema_editor):
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        return True
+    except DatabaseError as exc:
+        # Sin permisos para crear la extensión la búsqueda funciona, pero distingue tildes.
+        logger.warning("No se pudo crear la extensión unaccent: %s", exc)
+        return False
+
+
+def _sql_postgresql(unaccent):
+    sin_tildes = (lambda texto: f"unaccent({texto})") if unaccent else (lambda texto: texto)
+    sentencias = []
+    for tabla, (principales, detalle, _) in FUENTES.items():
+        vector = " || ".join(
+            [f"setweight(to_tsvector('spanish', {sin_tildes(_concatenar(principales, 'NEW'))}), 'A')"]
+            + (
+                [f"setweight(to_tsvector('spanish', {sin_tildes(_concatenar(detalle, 'NEW'))}), 'B')"]
+                if detalle
+                else []
+            )
+        )
+        campos = ", ".join(principales + detalle)
+        sentencias += [
+            f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS busqueda tsvector",
+            f"""
+            CREATE OR REPLACE FUNCTION {tabla}_busqueda() RETURNS trigger AS $$
+            BEGIN
+                NEW.busqueda := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f"DROP TRIGGER IF EXISTS {tabla}_busqueda ON {tabla}",
+            f"""
+            CREATE TRIGGER {tabla}_busqueda BEFORE INSERT OR UPDATE OF {campos} ON {tabla}
+            FOR EACH ROW EXECUTE FUNCTION {tabla}_busqueda()
+            """,
+            f"CREATE INDEX IF NOT EXISTS {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)",
+            # Dispara el trigger sobre los registros existentes
+            f"UPDATE {tabla} SET {principales[0]} = {principales[0]}",
+        ]
+    return sentencias
+
+
+def _sql_sqlite():
+    sentencias = [f"DELETE FROM {TABLA_FTS}"]
+    for tabla, (principales, detalle, signo) in FUENTES.items():
+        signo = "" if signo > 0 else "-"
+        columnas = f"{_concatenar(principales, 'new')}, {_concatenar(detalle, 'new')}"
+        campos = ", ".join(principales + detalle)
+        sentencias += [
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_ai AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO {TABLA_FTS} (rowid, principal, detalle) VALUES ({signo}new.id, {columnas});
+            END
+            """,
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_au AFTER UPDATE OF {campos} ON {tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid = {signo}old.id;
+                INSERT INTO {TABLA_FTS} (rowid, principal, detalle) VALUES ({signo}new.id, {columnas});
+            END
+            """,
+            f"""
+            CREATE TRIGGER {tabla}_busqueda_ad AFTER DELETE ON {tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid = {signo}old.id;
+            END
+            """,
+            f"""
+            INSERT INTO {TABLA_FTS} (rowid, principal, detalle)
+            SELECT {signo}id, {_concatenar(principales, tabla)}, {_concatenar(detalle, tabla)} FROM {tabla}
+            """,
+        ]
+    return sentencias
+
+
+def instalar_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        sentencias = _sql_postgresql(_crear_unaccent(schema_editor))
+    elif vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                "principal, detalle, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # Sin FTS5 el historial busca con icontains
+            return
+        sentencias = _sql_sqlite()
+    else:
+        return
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def desinstalar_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for tabla in FUENTES:
+        if vendor == "postgresql":
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {tabla}_busqueda ON {tabla}")
+            schema_editor.execute(f"DROP FUNCTION IF EXISTS {tabla}_busqueda()")
+            schema_editor.execute(f"ALTER TABLE {tabla} DROP COLUMN IF EXISTS busqueda")
+        elif vendor == "sqlite":
+            for sufijo in ("ai", "au", "ad"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {tabla}_busqueda_{sufijo}")
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0017_estados_equipos_cirugia'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar_busqueda, desinstalar_busqueda),
+    ]
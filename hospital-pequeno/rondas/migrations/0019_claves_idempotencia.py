@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0018_busqueda_texto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailysurgeryrecord',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='roundentry',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='surgeryround',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='dailysurgeryrecord',
+            index=models.Index(fields=['clave_idempotencia'], name='cirugiadiaria_clave_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0019_claves_idempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysurgeryrecord',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='cirugiadiaria_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0020_indice_api_cirugia_diaria'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='roundentry',
+            name='roundentry_cat_novedad_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='roundentry',
+            name='roundentry_eventos_idx',
+        ),
+    ]
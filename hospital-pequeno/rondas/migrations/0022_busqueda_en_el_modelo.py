@@ -0,0 +1,55 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def _campo():
+    campo = django.contrib.postgres.search.SearchVectorField(null=True, editable=False)
+    campo.set_attributes_from_name("busqueda")
+    return campo
+
+
+def agregar_columnas(apps, schema_editor):
+    # En PostgreSQL la columna la creó 0018 junto con sus triggers. En SQLite la
+    # columna es nullable y sin valor por defecto: se agrega sin reconstruir la
+    # tabla, así que los triggers de FTS5 se conservan.
+    for nombre in ("RoundEntry", "SurgeryRound"):
+        modelo = apps.get_model("rondas", nombre)
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(f"ALTER TABLE {modelo._meta.db_table} ADD COLUMN IF NOT EXISTS busqueda tsvector")
+        else:
+            schema_editor.add_field(modelo, _campo())
+
+
+def quitar_columnas(apps, schema_editor):
+    # En PostgreSQL la quita 0018 al revertirse, con los triggers que la llenan
+    if schema_editor.connection.vendor == "postgresql":
+        return
+    for nombre in ("RoundEntry", "SurgeryRound"):
+        schema_editor.remove_field(apps.get_model("rondas", nombre), _campo())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0021_quitar_indices_indicadores'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(agregar_columnas, quitar_columnas),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='roundentry',
+                    name='busqueda',
+                    field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+                ),
+                migrations.AddField(
+                    model_name='surgeryround',
+                    name='busqueda',
+                    field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+                ),
+            ],
+        ),
+    ]
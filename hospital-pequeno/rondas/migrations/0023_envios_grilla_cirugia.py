@@ -0,0 +1,67 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def copiar_claves(apps, schema_editor):
+    """
+    Una fila por clave de las celdas actuales. Las celdas que ya se corrigieron con
+    otra clave no se pueden recuperar: esos envíos quedan con menos celdas.
+    """
+    DailySurgeryRecord = apps.get_model('rondas', 'DailySurgeryRecord')
+    DailySurgerySubmission = apps.get_model('rondas', 'DailySurgerySubmission')
+    envios = (
+        DailySurgeryRecord.objects.filter(clave_idempotencia__isnull=False)
+        .values('clave_idempotencia')
+        .annotate(usuario=Min('usuario'), fecha=Min('fecha'), guardadas=Count('pk'))
+    )
+    DailySurgerySubmission.objects.bulk_create(
+        DailySurgerySubmission(
+            clave=envio['clave_idempotencia'],
+            usuario_id=envio['usuario'],
+            fecha=envio['fecha'],
+            guardadas=envio['guardadas'],
+        )
+        for envio in envios
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rondas', '0022_busqueda_en_el_modelo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySurgerySubmission',
+            fields=[
+                ('clave', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('fecha', models.DateField(verbose_name='Fecha de la grilla')),
+                ('guardadas', models.PositiveIntegerField(verbose_name='Celdas guardadas')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Envío de la grilla de cirugía',
+                'verbose_name_plural': 'Envíos de la grilla de cirugía',
+            },
+        ),
+        migrations.AddField(
+            model_name='dailysurgerysubmission',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copiar_claves, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='dailysurgeryrecord',
+            name='cirugiadiaria_clave_idx',
+        ),
+        migrations.RemoveField(
+            model_name='dailysurgeryrecord',
+            name='clave_idempotencia',
+        ),
+    ]
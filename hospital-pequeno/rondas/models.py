@@ -1,5 +1,42 @@
 ﻿from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
+
+
+class Signature(models.Model):
+    """Imagen de firma almacenada una sola vez y referenciada por su SHA-256."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    content_type = models.CharField(max_length=50, default="image/png")
+    data = models.BinaryField()
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+    thumbnail = models.BinaryField(blank=True, null=True)
+    # False mientras ``data`` es la imagen tal como llegó del canvas
+    normalizada = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Firma"
+        verbose_name_plural = "Firmas"
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(normalizada=False),
+                name="firma_pendiente_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - representación legible
+        return self.sha256[:12]
+
+    @property
+    def data_uri(self) -> str:
+        from .firmas import data_uri
+
+        return data_uri(self.content_type, self.data)
 
 
 class RoundEntry(models.Model):
@@ -27,16 +64,43 @@ class RoundEntry(models.Model):
     eventos_seguridad = models.TextField(blank=True, verbose_name="Descripción de eventos de seguridad")
     fuera_de_servicio = models.CharField(max_length=200, blank=True)
     nombre_encargado_servicio = models.CharField(max_length=100, default='Sin especificar')
-    firma_servicio = models.TextField(blank=True, null=True, verbose_name="Firma del encargado del servicio")
+    firma_servicio = models.ForeignKey(
+        Signature,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Firma del encargado del servicio",
+    )
     nombre_encargado_ronda = models.CharField(max_length=100, default='Sin especificar')
-    firma_ronda = models.TextField(blank=True, null=True, verbose_name="Firma del encargado de la ronda")
+    firma_ronda = models.ForeignKey(
+        Signature,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Firma del encargado de la ronda",
+    )
     sin_novedad = models.BooleanField(default=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Generada por el cliente en cada envío: un reintento con la misma clave no
+    # crea otro registro (ver ``rondas.idempotencia``)
+    clave_idempotencia = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+    # La llenan los triggers de la base de datos; en SQLite queda vacía y se busca
+    # en la tabla FTS5 (ver ``rondas.busqueda``)
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-fecha_creacion"]
         verbose_name = "Registro de ronda"
         verbose_name_plural = "Registros de rondas"
+        indexes = [
+            # Línea de tiempo del historial y exportaciones sin filtro
+            models.Index(fields=["-fecha_creacion", "-id"], name="roundentry_fecha_idx"),
+            # Historial y exportaciones filtrados por categoría
+            # También el recálculo de indicadores de un día (categoría, servicio y fecha)
+            models.Index(fields=["categoria", "-fecha_creacion", "-id"], name="roundentry_cat_fecha_idx"),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - representación legible
         return f"{self.get_categoria_display()} - {self.subservicio}"
@@ -57,18 +121,38 @@ class SurgeryRound(models.Model):
     observaciones = models.TextField(blank=True, verbose_name="Observaciones generales")
     nombre_encargado_servicio = models.CharField(max_length=100, default='Sin especificar')
     nombre_encargado_ronda = models.CharField(max_length=100, default='Sin especificar')
-    firma_servicio = models.TextField(
-        blank=True, null=True, verbose_name="Firma del encargado del servicio"
+    firma_servicio = models.ForeignKey(
+        Signature,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Firma del encargado del servicio",
     )
-    firma_ronda = models.TextField(
-        blank=True, null=True, verbose_name="Firma del encargado de la ronda"
+    firma_ronda = models.ForeignKey(
+        Signature,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Firma del encargado de la ronda",
     )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Generada por el cliente en cada envío: un reintento con la misma clave no
+    # crea otro registro (ver ``rondas.idempotencia``)
+    clave_idempotencia = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+    # La llenan los triggers de la base de datos; en SQLite queda vacía y se busca
+    # en la tabla FTS5 (ver ``rondas.busqueda``)
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-fecha_creacion"]
         verbose_name = "Ronda de cirugía"
         verbose_name_plural = "Rondas de cirugía"
+        indexes = [
+            models.Index(fields=["-fecha_creacion", "-id"], name="surgeryround_fecha_idx"),
+            models.Index(fields=["semana_inicio"], name="surgeryround_semana_idx"),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - representación legible
         return f"Semana {self.semana_inicio}"
@@ -82,14 +166,21 @@ class Service(models.Model):
         ("SALAS", "Servicio de salas"),
         ("LAB", "Laboratorio clínico"),
         ("SEDES", "Sedes externas"),
+        ("CIRUGIA", "Salas de cirugía"),
     ]
     
     name = models.CharField(max_length=200)
     category = models.CharField(max_length=20, choices=CATEGORIAS)
-    day_rules = models.JSONField(default=dict, blank=True)
+    day_rules = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Días en que aparece en el panel, p. ej. {"dias": [0, 2, 4]} (0=lunes). Vacío: todos los días.',
+    )
+    order = models.PositiveIntegerField(default=0, verbose_name="Orden")
     active = models.BooleanField(default=True)
     
     class Meta:
+        ordering = ["order", "name"]
         verbose_name = "Servicio"
         verbose_name_plural = "Servicios"
     
@@ -111,9 +202,11 @@ class Room(models.Model):
     name = models.CharField(max_length=200, blank=True)
     room_type = models.CharField(max_length=20, choices=TIPOS, default="otro")
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="rooms")
+    order = models.PositiveIntegerField(default=0, verbose_name="Orden")
     active = models.BooleanField(default=True)
     
     class Meta:
+        ordering = ["order", "number"]
         verbose_name = "Sala"
         verbose_name_plural = "Salas"
     
@@ -135,9 +228,11 @@ class Equipment(models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="equipments")
     status = models.CharField(max_length=20, choices=ESTADOS, default="operativo_completo")
     tags = models.JSONField(default=list, blank=True)
+    order = models.PositiveIntegerField(default=0, verbose_name="Orden")
     active = models.BooleanField(default=True)
     
     class Meta:
+        ordering = ["order", "name"]
         verbose_name = "Equipo"
         verbose_name_plural = "Equipos"
     
@@ -145,6 +240,24 @@ class Equipment(models.Model):
         return f"{self.name} - {self.plate_number or 'Sin placa'}"
 
 
+class CatalogVersion(models.Model):
+    """
+    Contador que cambia con cada modificación de ``Service``, ``Room`` o ``Equipment``.
+
+    Cada proceso compara su copia del catálogo con este número (ver ``rondas.catalogo``).
+    """
+
+    version = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Versión del catálogo"
+        verbose_name_plural = "Versión del catálogo"
+
+    def __str__(self) -> str:  # pragma: no cover - representación legible
+        return f"Catálogo v{self.version}"
+
+
 class DailySurgeryRecord(models.Model):
     """Registro diario de equipos de cirugía"""
     ESTADOS = [
@@ -164,14 +277,171 @@ class DailySurgeryRecord(models.Model):
     observaciones = models.TextField(blank=True, verbose_name="Observaciones")
     nombre_encargado_servicio = models.CharField(max_length=100, blank=True, verbose_name="Encargado del servicio")
     nombre_encargado_ronda = models.CharField(max_length=100, blank=True, verbose_name="Encargado de la ronda")
-    firma_servicio = models.TextField(blank=True, verbose_name="Firma del encargado del servicio")
-    firma_ronda = models.TextField(blank=True, verbose_name="Firma del encargado de la ronda")
+    firma_servicio = models.ForeignKey(
+        Signature, on_delete=models.PROTECT, blank=True, null=True, related_name="+", verbose_name="Firma del encargado del servicio"
+    )
+    firma_ronda = models.ForeignKey(
+        Signature, on_delete=models.PROTECT, blank=True, null=True, related_name="+", verbose_name="Firma del encargado de la ronda"
+    )
     
     class Meta:
         verbose_name = "Registro Diario de Cirugía"
         verbose_name_plural = "Registros Diarios de Cirugía"
         unique_together = [["fecha", "sala", "equipo"]]  # Un registro por día, sala y equipo
         ordering = ["-fecha_creacion"]
+        indexes = [
+            # Recorrido de la API por (fecha_creacion, id)
+            models.Index(fields=["fecha_creacion", "id"], name="cirugiadiaria_fecha_idx"),
+        ]
     
     def __str__(self):
         return f"{self.fecha} - Sala {self.sala} - {self.equipo}"
+
+
+class DailySurgerySubmission(models.Model):
+    """
+    Envío de la grilla diaria de cirugía, identificado por su clave de idempotencia.
+
+    Las celdas de ``DailySurgeryRecord`` se sobrescriben cuando se corrige el día,
+    así que la clave de cada envío se guarda aquí una sola vez, con la cantidad de
+    celdas que escribió (ver ``rondas.idempotencia``).
+    """
+
+    clave = models.UUIDField(primary_key=True, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    fecha = models.DateField(verbose_name="Fecha de la grilla")
+    guardadas = models.PositiveIntegerField(verbose_name="Celdas guardadas")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Envío de la grilla de cirugía"
+        verbose_name_plural = "Envíos de la grilla de cirugía"
+
+    def __str__(self):
+        return f"{self.fecha} - {self.clave}"
+
+
+class SurgeryEquipmentStatus(models.Model):
+    """
+    Estado de un equipo de cirugía en un día, derivado de ``SurgeryRound.datos``.
+
+    Permite consultar el historial de un equipo con índices en lugar de leer el
+    JSON de cada formato. Se mantiene con las señales de ``rondas.signals`` y se
+    puede reconstruir con ``manage.py rebuild_surgery_status``.
+    """
+
+    ronda = models.ForeignKey(SurgeryRound, on_delete=models.CASCADE, related_name="estados_equipos")
+    semana_inicio = models.DateField()
+    fecha = models.DateField()
+    dia = models.PositiveSmallIntegerField(help_text="Día de la semana (0 = lunes).")
+    sala = models.CharField(max_length=50)
+    equipo = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20, choices=DailySurgeryRecord.ESTADOS)
+
+    class Meta:
+        verbose_name = "Estado de equipo de cirugía"
+        verbose_name_plural = "Estados de equipos de cirugía"
+        indexes = [
+            models.Index(fields=["sala", "equipo", "fecha"], name="estadocirugia_equipo_idx"),
+            models.Index(fields=["estado", "fecha"], name="estadocirugia_estado_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - Sala {self.sala} - {self.equipo}: {self.estado}"
+
+
+class DailyRollup(models.Model):
+    """
+    Conteos precalculados de ``RoundEntry`` por día, categoría y servicio.
+
+    Se mantienen con las señales de ``rondas.signals`` y se pueden reconstruir con
+    ``manage.py rebuild_rollups``.
+    """
+
+    fecha = models.DateField()
+    categoria = models.CharField(max_length=32, choices=RoundEntry.CATEGORIAS)
+    subservicio = models.CharField(max_length=100)
+    total = models.PositiveIntegerField(default=0)
+    con_novedad = models.PositiveIntegerField(default=0)
+    eventos = models.PositiveIntegerField(default=0)
+    fuera_de_servicio = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Indicador diario"
+        verbose_name_plural = "Indicadores diarios"
+        unique_together = [["fecha", "categoria", "subservicio"]]
+
+    def __str__(self) -> str:  # pragma: no cover - representación legible
+        return f"{self.fecha} - {self.categoria} - {self.subservicio}: {self.total}"
+
+
+class WeeklySurgeryRollup(models.Model):
+    """Cantidad de formatos de ronda de cirugía registrados por semana."""
+
+    semana_inicio = models.DateField(unique=True)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Indicador semanal de cirugía"
+        verbose_name_plural = "Indicadores semanales de cirugía"
+
+    def __str__(self) -> str:  # pragma: no cover - representación legible
+        return f"Semana {self.semana_inicio}: {self.total}"
+
+
+class ExportJob(models.Model):
+    """Exportación del historial procesada en segundo plano por ``run_export_worker``."""
+
+    EXCEL = "excel"
+    PDF = "pdf"
+    FORMATOS = [
+        (EXCEL, "Excel"),
+        (PDF, "PDF"),
+    ]
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    COMPLETADO = "completado"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (COMPLETADO, "Completado"),
+        (ERROR, "Error"),
+    ]
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="exportaciones",
+    )
+    formato = models.CharField(max_length=10, choices=FORMATOS)
+    parametros = models.JSONField(default=dict, blank=True, help_text="Filtros del historial")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0)
+    archivo = models.FileField(upload_to="exportaciones/", blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-fecha_creacion"]
+        verbose_name = "Exportación"
+        verbose_name_plural = "Exportaciones"
+        indexes = [
+            # Cola del worker: pendientes en orden de llegada
+            models.Index(fields=["estado", "fecha_creacion"], name="exportjob_cola_idx"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - representación legible
+        return f"{self.get_formato_display()} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in (self.COMPLETADO, self.ERROR)
+
+    @property
+    def nombre_archivo(self) -> str:
+        """Nombre con el que se descarga el archivo generado."""
+        extension = self.archivo.name.rsplit(".", 1)[-1] if self.archivo else "txt"
+        return f"historial_{timezone.localtime(self.fecha_creacion):%Y%m%d_%H%M}.{extension}"
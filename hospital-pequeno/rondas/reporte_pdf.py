@@ -0,0 +1,233 @@
+"""
+Reporte PDF del historial generado por bloques en paralelo.
+
+xhtml2pdf procesa un solo documento en un solo hilo y su costo crece más que
+linealmente con el tamaño del HTML. El reporte se divide en bloques de tamaño
+fijo; cada bloque se convierte a PDF en un proceso del pool y los resultados se
+concatenan en orden con pypdf. El proceso principal lee cada bloque de la base de
+datos cuando hay lugar en el pool (``BLOQUES_EN_VUELO_POR_PROCESO``), así su
+memoria no crece con el tamaño del reporte.
+
+Los procesos hijos no consultan la base de datos: reciben diccionarios con los
+campos ya leídos y, en lugar de data URIs, la ruta de una miniatura PNG de cada
+firma que el proceso principal escribe una sola vez en un directorio temporal.
+Los modelos se importan dentro de las funciones: un hijo importa este módulo para
+recibir sus tareas antes de que ``_iniciar_proceso`` configure Django.
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+try:
+    from xhtml2pdf import pisa
+except ImportError:
+    pisa = None
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+from .firmas import generar_miniatura
+
+# Registros por bloque; cada bloque es un documento independiente
+REGISTROS_POR_BLOQUE = 200
+CIRUGIAS_POR_BLOQUE = 10
+# Bloques enviados al pool y aún no escritos, por proceso
+BLOQUES_EN_VUELO_POR_PROCESO = 2
+
+CAMPOS_REGISTRO = (
+    "fecha_creacion",
+    "categoria",
+    "subservicio",
+    "hallazgo",
+    "placa_equipo",
+    "eventos_seguridad",
+    "fuera_de_servicio",
+    "sin_novedad",
+    "nombre_encargado_servicio",
+    "nombre_encargado_ronda",
+    "firma_servicio_id",
+    "firma_ronda_id",
+)
+CAMPOS_CIRUGIA = (
+    "semana_inicio",
+    "fecha_creacion",
+    "nombre_encargado_servicio",
+    "nombre_encargado_ronda",
+    "observaciones",
+    "datos",
+    "firma_servicio_id",
+    "firma_ronda_id",
+)
+
+
+def procesos_disponibles():
+    """Procesos del pool: ``EXPORTACIONES_PROCESOS`` o uno por núcleo."""
+    return getattr(settings, "EXPORTACIONES_PROCESOS", None) or os.cpu_count() or 1
+
+
+class FirmasEnDisco:
+    """Escribe cada firma una sola vez como miniatura PNG y devuelve su ruta."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.rutas = {}
+
+    def resolver(self, filas):
+        """Reemplaza en ``filas`` los ``firma_*_id`` por la ruta de la imagen."""
+        faltantes = {
+            fila[campo]
+            for fila in filas
+            for campo in ("firma_servicio_id", "firma_ronda_id")
+            if fila[campo] and fila[campo] not in self.rutas
+        }
+        if faltantes:
+            from .models import Signature
+
+            firmas = Signature.objects.filter(sha256__in=faltantes).values_list(
+                "sha256", "content_type", "data", "thumbnail"
+            )
+            for sha256, content_type, datos, miniatura in firmas.iterator():
+                ruta = os.path.join(self.directorio, f"{sha256}.png")
+                with open(ruta, "wb") as archivo:
+                    archivo.write(bytes(miniatura) if miniatura else generar_miniatura(datos, content_type))
+                self.rutas[sha256] = ruta
+        for fila in filas:
+            fila["firma_servicio"] = self.rutas.get(fila.pop("firma_servicio_id"))
+            fila["firma_ronda"] = self.rutas.get(fila.pop("firma_ronda_id"))
+        return filas
+
+
+def _lotes(filas, tamano):
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano)):
+        yield lote
+
+
+def total_bloques(total_registros, total_cirugias):
+    """Bloques que produce ``bloques_reporte``: al menos uno de registros."""
+    return max(-(-total_registros // REGISTROS_POR_BLOQUE), 1) + -(-total_cirugias // CIRUGIAS_POR_BLOQUE)
+
+
+def _contextos(registros, registros_cirugia, firmas):
+    from .models import RoundEntry
+
+    categorias = dict(RoundEntry.CATEGORIAS)
+    vacio = True
+    filas = registros.order_by("-fecha_creacion", "-pk").values(*CAMPOS_REGISTRO)
+    for lote in _lotes(filas.iterator(chunk_size=REGISTROS_POR_BLOQUE), REGISTROS_POR_BLOQUE):
+        for fila in lote:
+            fila["categoria"] = categorias.get(fila["categoria"], fila["categoria"])
+        vacio = False
+        yield {"registros": firmas.resolver(lote)}
+    if vacio:
+        yield {"registros": []}
+
+    filas = registros_cirugia.order_by("-fecha_creacion", "-pk").values(*CAMPOS_CIRUGIA)
+    for indice, lote in enumerate(_lotes(filas.iterator(chunk_size=CIRUGIAS_POR_BLOQUE), CIRUGIAS_POR_BLOQUE)):
+        yield {"registros_cirugia": firmas.resolver(lote), "portada_cirugia": indice == 0}
+
+
+def bloques_reporte(registros, registros_cirugia, firmas, totales=None):
+    """
+    Genera los contextos de plantilla de cada bloque del reporte, en orden y a
+    medida que se piden: solo se lee de la base de datos el bloque siguiente.
+
+    ``registros`` y ``registros_cirugia`` son querysets; se leen por lotes con una
+    proyección de los campos que usa la plantilla. ``totales`` evita volver a
+    contarlos si ya se conocen.
+    """
+    total_registros, total_cirugias = totales or (registros.count(), registros_cirugia.count())
+    contextos = _contextos(registros, registros_cirugia, firmas)
+    # Se adelanta un bloque para marcar el último con el cierre del reporte
+    actual = next(contextos)
+    actual["portada"] = True
+    for siguiente in contextos:
+        yield actual
+        actual = siguiente
+    actual.update(cierre=True, total_registros=total_registros, total_cirugias=total_cirugias)
+    yield actual
+
+
+def _iniciar_proceso():
+    import django
+
+    django.setup()
+
+
+def renderizar_bloque(contexto, directorio):
+    """
+    Convierte un bloque del reporte en los bytes de un PDF. ``directorio`` es donde
+    están las firmas: xhtml2pdf solo lee archivos locales junto al documento.
+    """
+    html = render_to_string("rondas/historial_pdf.html", contexto)
+    salida = io.BytesIO()
+    pisa.CreatePDF(html, dest=salida, path=os.path.join(directorio, "historial.html"))
+    return salida.getvalue()
+
+
+def _en_orden(pool, funcion, elementos, en_vuelo):
+    """Como ``pool.map``, pero pide a ``elementos`` solo ``en_vuelo`` tareas por delante."""
+    pendientes = deque()
+    for elemento in elementos:
+        pendientes.append(pool.submit(funcion, elemento))
+        if len(pendientes) >= en_vuelo:
+            yield pendientes.popleft().result()
+    while pendientes:
+        yield pendientes.popleft().result()
+
+
+def escribir_reporte(registros, registros_cirugia, destino, procesos=None, progreso=None):
+    """
+    Escribe en ``destino`` el reporte PDF completo. ``progreso(hechos, total)`` se
+    llama a medida que se agregan los bloques.
+    """
+    procesos = procesos or procesos_disponibles()
+    totales = (registros.count(), registros_cirugia.count())
+    total = total_bloques(*totales)
+    with tempfile.TemporaryDirectory(prefix="firmas_pdf_") as directorio:
+        contextos = bloques_reporte(registros, registros_cirugia, FirmasEnDisco(directorio), totales)
+
+        if PdfWriter is None:
+            # Sin pypdf no es posible unir bloques: se genera un solo documento
+            contextos = list(contextos)
+            unico = dict(contextos[-1], portada=True, portada_cirugia=True)
+            unico["registros"] = [fila for contexto in contextos for fila in contexto.get("registros", [])]
+            unico["registros_cirugia"] = [
+                fila for contexto in contextos for fila in contexto.get("registros_cirugia", [])
+            ]
+            destino.write(renderizar_bloque(unico, directorio))
+            return
+
+        escritor = PdfWriter()
+        renderizar = partial(renderizar_bloque, directorio=directorio)
+        if procesos == 1 or total == 1:
+            documentos = map(renderizar, contextos)
+            pool = None
+        else:
+            # "spawn": los hijos no heredan conexiones a la base de datos ni archivos abiertos
+            pool = ProcessPoolExecutor(
+                max_workers=min(procesos, total),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_proceso,
+            )
+            # Pocos bloques por proceso en memoria, sin importar el tamaño del reporte
+            documentos = _en_orden(pool, renderizar, contextos, BLOQUES_EN_VUELO_POR_PROCESO * min(procesos, total))
+        try:
+            for hechos, documento in enumerate(documentos, start=1):
+                escritor.append(io.BytesIO(documento))
+                if progreso:
+                    progreso(hechos, total)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        escritor.write(destino)
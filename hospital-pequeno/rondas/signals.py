@@ -0,0 +1,122 @@
+"""
+Señales que mantienen al día los indicadores precalculados (ver ``rondas.indicadores``),
+los estados de los equipos de cirugía (ver ``rondas.estados_cirugia``), la versión
+del catálogo de servicios (ver ``rondas.catalogo``), las versiones de la caché
+(ver ``rondas.cache``) y los usuarios y permisos en caché (ver ``rondas.autenticacion``).
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache as cache_rondas
+from .autenticacion import GRUPO_PERMISOS, grupo_usuario
+from .catalogo import invalidar_catalogo
+from .estados_cirugia import sincronizar_ronda
+from .indicadores import dia_local, recalcular_dia, recalcular_semana
+from .models import DailySurgeryRecord, Equipment, Room, RoundEntry, Service, SurgeryRound
+
+
+def _grupo(registro):
+    return dia_local(registro.fecha_creacion), registro.categoria, registro.subservicio
+
+
+@receiver(pre_save, sender=RoundEntry)
+def recordar_grupo_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el grupo previo de un registro editado por si cambió de día, categoría o servicio."""
+    instance._grupo_anterior = None
+    if instance.pk and not raw:
+        anterior = sender.objects.filter(pk=instance.pk).only("fecha_creacion", "categoria", "subservicio").first()
+        if anterior is not None:
+            instance._grupo_anterior = _grupo(anterior)
+
+
+@receiver(post_save, sender=RoundEntry)
+def actualizar_indicadores_registro(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    grupos = {_grupo(instance), getattr(instance, "_grupo_anterior", None)} - {None}
+    for grupo in grupos:
+        recalcular_dia(*grupo)
+
+
+@receiver(post_delete, sender=RoundEntry)
+def descontar_registro(sender, instance, **kwargs):
+    recalcular_dia(*_grupo(instance))
+
+
+@receiver(pre_save, sender=SurgeryRound)
+def recordar_semana_anterior(sender, instance, raw=False, **kwargs):
+    instance._semana_anterior = None
+    if instance.pk and not raw:
+        instance._semana_anterior = (
+            sender.objects.filter(pk=instance.pk).values_list("semana_inicio", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=SurgeryRound)
+def actualizar_indicadores_cirugia(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for semana in {instance.semana_inicio, getattr(instance, "_semana_anterior", None)} - {None}:
+        recalcular_semana(semana)
+    sincronizar_ronda(instance)
+
+
+@receiver(post_delete, sender=SurgeryRound)
+def descontar_cirugia(sender, instance, **kwargs):
+    recalcular_semana(instance.semana_inicio)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Equipment)
+def catalogo_modificado(sender, raw=False, **kwargs):
+    if not raw:
+        invalidar_catalogo()
+
+
+@receiver(post_save, sender=RoundEntry)
+@receiver(post_save, sender=SurgeryRound)
+@receiver(post_save, sender=DailySurgeryRecord)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=RoundEntry)
+@receiver(post_delete, sender=SurgeryRound)
+@receiver(post_delete, sender=DailySurgeryRecord)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Equipment)
+def invalidar_cache(sender, raw=False, **kwargs):
+    if not raw:
+        cache_rondas.invalidar_modelo(sender)
+
+
+Usuario = get_user_model()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache_rondas.invalidar(grupo_usuario(instance.pk))
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permisos_modificados(sender, action, **kwargs):
+    # Un cambio en un grupo afecta a todos sus usuarios: se invalidan los permisos de todos
+    if action in ("post_add", "post_remove", "post_clear"):
+        cache_rondas.invalidar(GRUPO_PERMISOS)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def permiso_eliminado(sender, **kwargs):
+    cache_rondas.invalidar(GRUPO_PERMISOS)
@@ -0,0 +1,108 @@
+"""
+Sincronización en lote de los registros de ronda capturados sin conexión.
+
+En sótanos y sedes externas el panel guarda cada formulario en el navegador
+(IndexedDB, ver ``static/js/cola-rondas.js``) y luego los envía juntos en un JSON::
+
+    {
+        "registros": [
+            {"usuario": "tecnico1", "categoria": "sedes_externas", "subservicio": "...",
+             "hallazgo": "...", "firma_servicio": "vector:...", ...},
+            ...
+        ]
+    }
+
+Cada registro trae los mismos campos que el formulario del panel y se valida con
+``RoundEntryForm``. Los válidos se guardan con un solo ``bulk_create`` dentro de
+una transacción; los inválidos se devuelven con sus errores, por índice, para que
+el técnico los corrija sin bloquear el resto de la cola. Un registro cuya
+``clave_idempotencia`` ya está guardada se da por guardado sin validarlo de nuevo.
+"""
+
+from django.db import transaction
+
+from . import cache as cache_rondas
+from . import idempotencia
+from .forms import RoundEntryForm
+from .indicadores import dia_local, recalcular_dia
+from .models import RoundEntry
+
+REGISTROS_MAXIMOS = 100
+
+
+class LoteInvalido(Exception):
+    """El envío no tiene la forma esperada; no se guarda ningún registro."""
+
+
+def validar_lote(datos, usuario):
+    """
+    Valida cada registro del envío. Devuelve ``(formularios, errores, guardados)``:
+    los formularios válidos por índice, ``{índice: {campo: [mensajes]}}`` y
+    ``{índice: id}`` de los que ya estaban guardados con su clave.
+    """
+    registros = datos.get("registros") if isinstance(datos, dict) else None
+    if not isinstance(registros, list) or not registros:
+        raise LoteInvalido("Envíe al menos un registro.")
+    if len(registros) > REGISTROS_MAXIMOS:
+        raise LoteInvalido(f"Máximo {REGISTROS_MAXIMOS} registros por envío.")
+
+    claves = {
+        indice: idempotencia.leer_clave(registro.get(idempotencia.CAMPO))
+        for indice, registro in enumerate(registros)
+        if isinstance(registro, dict)
+    }
+    existentes = dict(
+        RoundEntry.objects.filter(clave_idempotencia__in=[clave for clave in claves.values() if clave])
+        .values_list("clave_idempotencia", "pk")
+    )
+
+    formularios = {}
+    errores = {}
+    guardados = {}
+    vistas = set()
+    for indice, registro in enumerate(registros):
+        if not isinstance(registro, dict):
+            errores[indice] = {"__all__": ["Cada registro debe ser un objeto."]}
+            continue
+        clave = claves[indice]
+        if clave in existentes:
+            guardados[indice] = existentes[clave]
+            continue
+        if clave is not None and clave in vistas:
+            errores[indice] = {"__all__": ["Clave repetida en el envío."]}
+            continue
+        vistas.add(clave)
+        # Una cola que quedó en un equipo compartido no se atribuye a otra sesión
+        if registro.get("usuario") != usuario.get_username():
+            errores[indice] = {"__all__": [f"Registrado por {registro.get('usuario')}; inicie sesión con ese usuario."]}
+            continue
+        formulario = RoundEntryForm(registro)
+        if formulario.is_valid():
+            formulario.instance.clave_idempotencia = clave
+            formularios[indice] = formulario
+        else:
+            errores[indice] = {campo: list(mensajes) for campo, mensajes in formulario.errors.items()}
+    return formularios, errores, guardados
+
+
+def guardar_lote(formularios, usuario):
+    """
+    Guarda los formularios validados en una transacción y devuelve
+    ``{índice: id}``. Como ``bulk_create`` no dispara señales, recalcula aquí los
+    indicadores de cada día, categoría y servicio afectados e invalida la caché.
+    """
+    if not formularios:
+        return {}
+    firmas = {}
+    with transaction.atomic():
+        registros = {}
+        for indice, formulario in formularios.items():
+            registro = formulario.save(commit=False, firmas=firmas)
+            registro.usuario = usuario
+            registros[indice] = registro
+        RoundEntry.objects.bulk_create(registros.values())
+        grupos = {(dia_local(r.fecha_creacion), r.categoria, r.subservicio) for r in registros.values()}
+        for grupo in grupos:
+            recalcular_dia(*grupo)
+        cache_rondas.invalidar("registros")
+    return {indice: registro.pk for indice, registro in registros.items()}
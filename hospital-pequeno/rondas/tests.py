@@ -1,3 +1,777 @@
-from django.test import TestCase
+import base64
+import shutil
+import tempfile
+import uuid
+import zlib
+from datetime import date, datetime
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    busqueda,
+    catalogo,
+    estados_cirugia,
+    exportaciones,
+    firmas,
+    idempotencia,
+    indicadores,
+    instrumentacion,
+    reporte_pdf,
+    sincronizacion,
+    timeline,
+    trazos,
+)
+from . import cache as cache_rondas
+from .autenticacion import BackendConCache, grupo_usuario
+from .cirugia_diaria import guardar_grilla
+from .forms import FirmaField
+from .management.commands.auditar_indices import recorridos_secuenciales
+from .models import (
+    DailyRollup,
+    DailySurgeryRecord,
+    Equipment,
+    ExportJob,
+    Room,
+    RoundEntry,
+    Service,
+    Signature,
+    SurgeryEquipmentStatus,
+    SurgeryRound,
+    WeeklySurgeryRollup,
+)
+
+
+class AuditarIndicesTests(TestCase):
+    def test_scan_con_indice_es_recorrido_completo(self):
+        linea = "5 0 0 SCAN rondas_roundentry USING INDEX roundentry_fecha_idx"
+        self.assertEqual(recorridos_secuenciales(linea, "sqlite"), [linea])
+
+    def test_search_usa_el_indice(self):
+        linea = "4 0 0 SEARCH rondas_roundentry USING INDEX roundentry_cat_fecha_idx (categoria=?)"
+        self.assertEqual(recorridos_secuenciales(linea, "sqlite"), [])
+
+    def test_consulta_sin_indice(self):
+        plan = RoundEntry.objects.filter(hallazgo="Monitor sin batería").explain()
+        self.assertTrue(recorridos_secuenciales(plan, connection.vendor))
+
+    @skipUnless(connection.vendor == "sqlite", "en PostgreSQL icontains usa el índice de trigramas")
+    def test_comando_reporta_busqueda_por_servicio(self):
+        salida = StringIO()
+        call_command("auditar_indices", stdout=salida)
+        self.assertIn("⚠️  historial: búsqueda por servicio: recorrido secuencial", salida.getvalue())
+        self.assertNotIn("Todas las consultas usan índices", salida.getvalue())
+
+
+@override_settings(INSTRUMENTACION_MUESTREO=1.0, METRICAS_TOKEN="secreto")
+class MetricasTests(TestCase):
+    def setUp(self):
+        # La caché de pruebas es local al proceso, pero TestCase nunca confirma la
+        # transacción y las invalidaciones de rondas.cache (on_commit) no se ejecutan
+        cache.clear()
+        instrumentacion.reiniciar()
+
+    def test_sin_sesion_ni_token(self):
+        self.assertEqual(self.client.get(reverse("metricas")).status_code, 404)
+        respuesta = self.client.get(reverse("metricas"), headers={"Authorization": "Bearer otro"})
+        self.assertEqual(respuesta.status_code, 404)
+
+    @override_settings(METRICAS_TOKEN="")
+    def test_token_vacio_no_abre_la_ruta(self):
+        respuesta = self.client.get(reverse("metricas"), headers={"Authorization": "Bearer "})
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_token_y_vistas_async(self):
+        usuario = User.objects.create_user("supervisor", password="x")
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse("historial_servicios")).status_code, 200)
+        self.client.logout()
+
+        respuesta = self.client.get(reverse("metricas"), headers={"Authorization": "Bearer secreto"})
+        self.assertEqual(respuesta.status_code, 200)
+        texto = respuesta.content.decode()
+        self.assertIn('vista="historial_servicios",etapa="total"', texto)
+        self.assertIn('vista="historial_servicios",etapa="render"', texto)
+
+
+@override_settings(AUTENTICACION_EN_CACHE=True)
+class AutenticacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user("tecnico", password="clave-de-prueba-1")
+
+    def test_usuario_en_cache_sin_contrasena(self):
+        backend = BackendConCache()
+        backend.get_user(self.usuario.pk)
+        campos, valores, _ = cache.get(
+            cache_rondas.clave([grupo_usuario(self.usuario.pk)], ("usuario", self.usuario.pk, "campos"))
+        )
+        self.assertNotIn("password", campos)
+        self.assertNotIn(self.usuario.password, valores)
+        with self.assertNumQueries(0):
+            usuario = backend.get_user(self.usuario.pk)
+            self.assertEqual(usuario.username, "tecnico")
+            self.assertEqual(usuario.get_session_auth_hash(), self.usuario.get_session_auth_hash())
+
+    def test_la_sesion_sigue_valida(self):
+        self.client.force_login(self.usuario)
+        for _ in range(2):
+            respuesta = self.client.get(reverse("panel_principal"))
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.wsgi_request.user, self.usuario)
+
+
+class FirmaFieldTests(TestCase):
+    def _png(self, ancho, alto):
+        salida = BytesIO()
+        Image.new("L", (1, 1), 255).save(salida, format="PNG")
+        datos = bytearray(salida.getvalue())
+        # Cabecera IHDR con otras dimensiones (y su CRC): el archivo sigue pesando unos bytes
+        datos[16:24] = ancho.to_bytes(4, "big") + alto.to_bytes(4, "big")
+        datos[29:33] = zlib.crc32(bytes(datos[12:29])).to_bytes(4, "big")
+        return "data:image/png;base64," + base64.b64encode(bytes(datos)).decode()
+
+    def test_acepta_png(self):
+        preparada = FirmaField(required=False).clean(self._png(1, 1))
+        self.assertEqual((preparada.width, preparada.height), (1, 1))
+
+    def test_rechaza_lado_mayor_al_maximo(self):
+        with self.assertRaisesMessage(ValidationError, "La firma es demasiado grande."):
+            FirmaField(required=False).clean(self._png(5000, 10))
+
+    def test_rechaza_bomba_de_descompresion(self):
+        # Más del doble de MAX_IMAGE_PIXELS: Image.open() lanza DecompressionBombError
+        with self.assertRaisesMessage(ValidationError, "La firma es demasiado grande."):
+            FirmaField(required=False).clean(self._png(15000, 15000))
+
+
+class MiniaturaTests(TestCase):
+    def test_png_transparente_queda_sobre_fondo_blanco(self):
+        # Canvas sin normalizar: tinta negra sobre píxeles transparentes (0, 0, 0, 0)
+        imagen = Image.new("RGBA", (300, 100), (0, 0, 0, 0))
+        for x in range(40, 260):
+            imagen.putpixel((x, 50), (0, 0, 0, 255))
+        salida = BytesIO()
+        imagen.save(salida, format="PNG")
+        miniatura = Image.open(BytesIO(firmas.generar_miniatura(salida.getvalue()))).convert("L")
+        histograma = miniatura.histogram()
+        self.assertGreater(sum(histograma[200:]) / sum(histograma), 0.9)
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user("biomedico", password="x")
+        for indice in range(5):
+            RoundEntry.objects.create(
+                usuario=usuario,
+                categoria="ronda_diaria",
+                subservicio=f"Servicio {indice}",
+                hallazgo="Monitor desconectado" + " del monitor" * indice,
+            )
+        RoundEntry.objects.create(usuario=usuario, categoria="ronda_diaria", subservicio="UCI", hallazgo="Sin cambios")
+        SurgeryRound.objects.create(usuario=usuario, semana_inicio="2025-01-06", datos={}, observaciones="Monitor de sala 2")
+        # Mismo rango y mismo instante: desempata el id
+        for indice in range(3):
+            RoundEntry.objects.create(
+                usuario=usuario, categoria="ronda_diaria", subservicio=f"Sala {indice}", hallazgo="Monitor apagado"
+            )
+        RoundEntry.objects.filter(hallazgo="Monitor apagado").update(fecha_creacion=timezone.now())
+
+    def _fuentes(self):
+        return [RoundEntry.objects.all(), SurgeryRound.objects.all()]
+
+    def test_paginas_sin_repetidos_ni_faltantes(self):
+        completa = busqueda.paginar(self._fuentes(), "monitor", tamano=10)
+        self.assertEqual(len(completa.registros), 9)
+        self.assertIsNone(completa.siguiente)
+
+        vistos, cursor = [], None
+        while True:
+            pagina = busqueda.paginar(self._fuentes(), "monitor", cursor=cursor, tamano=2)
+            vistos += pagina.registros
+            cursor = pagina.siguiente
+            if cursor is None:
+                break
+        self.assertEqual(
+            [(type(registro), registro.pk) for registro in vistos],
+            [(type(registro), registro.pk) for registro in completa.registros],
+        )
+
+    def test_cursor_invalido_empieza_desde_el_principio(self):
+        pagina = busqueda.paginar(self._fuentes(), "monitor", cursor="no-es-un-cursor", tamano=10)
+        self.assertEqual(len(pagina.registros), 9)
+
+    @skipUnless(connection.vendor == "sqlite", "en PostgreSQL las migraciones no borran los triggers")
+    def test_post_migrate_reinstala_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER rondas_roundentry_busqueda_ai")
+        self.assertFalse(busqueda.triggers_instalados())
+
+        busqueda.reinstalar_si_faltan(apps.get_app_config("rondas"), using=connection.alias)
+        self.assertTrue(busqueda.triggers_instalados())
+        RoundEntry.objects.create(
+            usuario=User.objects.get(), categoria="ronda_diaria", subservicio="UCI", hallazgo="Ventilador en alarma"
+        )
+        self.assertEqual(len(busqueda.paginar(self._fuentes(), "ventilador").registros), 1)
+
+
+class GrillaIdempotenteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser("supervisor", password="x")
+
+    def setUp(self):
+        cache.clear()
+
+    def _grilla(self, observacion):
+        return {
+            "fecha": date(2025, 1, 6),
+            "nombre_encargado_servicio": "Ana",
+            "nombre_encargado_ronda": "Luis",
+            "firma_servicio": None,
+            "firma_ronda": None,
+            "celdas": [
+                {"sala": sala, "equipo": "Monitor", "equipo_en_uso": True,
+                 "estado_equipo": "operativo_completo", "observaciones": observacion}
+                for sala in ("1", "2")
+            ],
+        }
+
+    def test_reintento_despues_de_una_correccion(self):
+        primera, correccion = uuid.uuid4(), uuid.uuid4()
+        self.assertEqual(guardar_grilla(self._grilla(""), self.usuario, "Lunes", primera), 2)
+        self.assertEqual(guardar_grilla(self._grilla("Corregido"), self.usuario, "Lunes", correccion), 2)
+
+        # La corrección sobrescribió las celdas, pero el primer envío sigue registrado
+        self.assertEqual(idempotencia.grilla_guardada(primera), 2)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(
+            reverse("cirugia_diaria"), "no es JSON", content_type="application/json",
+            headers={"Idempotency-Key": str(primera)},
+        )
+        self.assertEqual(respuesta.json(), {"success": True, "guardadas": 2})
+
+        # Un reintento que llega a guardar (peticiones simultáneas) no pisa la corrección
+        self.assertEqual(guardar_grilla(self._grilla(""), self.usuario, "Lunes", primera), 2)
+        self.assertEqual(
+            set(DailySurgeryRecord.objects.values_list("observaciones", flat=True)), {"Corregido"}
+        )
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser("supervisor", password="x")
+        for indice in range(5):
+            RoundEntry.objects.create(
+                usuario=cls.usuario, categoria="ronda_diaria", subservicio=f"Servicio {indice}", hallazgo="Revisado"
+            )
+        # Los tres primeros en el mismo instante: el cursor desempata por id
+        primeros = RoundEntry.objects.order_by("pk").values_list("pk", flat=True)[:3]
+        RoundEntry.objects.filter(pk__in=list(primeros)).update(fecha_creacion=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _url(self):
+        return reverse("api_registros", args=["rondas"])
+
+    def test_limite_invalido(self):
+        for limite in ("abc", "0", "-3", "501"):
+            respuesta = self.client.get(self._url(), {"limite": limite})
+            self.assertEqual(respuesta.status_code, 400, limite)
+            self.assertIn("limite", respuesta.json()["errores"])
+
+    def test_paginas_con_cursor(self):
+        ids, despues = [], None
+        while True:
+            parametros = {"limite": 2, "fields": "subservicio"}
+            if despues:
+                parametros["despues"] = despues
+            datos = self.client.get(self._url(), parametros).json()
+            ids += [registro["id"] for registro in datos["resultados"]]
+            despues = datos["cursor"]
+            if not datos["hay_mas"]:
+                break
+        esperados = list(RoundEntry.objects.order_by("fecha_creacion", "pk").values_list("pk", flat=True))
+        self.assertEqual(ids, esperados)
+
+
+@override_settings(FIRMAS_EN_SEGUNDO_PLANO=False)
+class FirmaImagenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _firma(self):
+        imagen = Image.new("RGBA", (300, 100), (0, 0, 0, 0))
+        for x in range(40, 260):
+            imagen.putpixel((x, 50), (0, 0, 0, 255))
+        salida = BytesIO()
+        imagen.save(salida, format="PNG")
+        return "data:image/png;base64," + base64.b64encode(salida.getvalue()).decode()
+
+    def test_misma_firma_se_guarda_una_vez(self):
+        primera = firmas.guardar_firma(firmas.preparar_firma(self._firma()))
+        segunda = firmas.guardar_firma(firmas.preparar_firma(self._firma()))
+        self.assertEqual(primera.pk, segunda.pk)
+        self.assertEqual(Signature.objects.count(), 1)
+        self.assertTrue(Signature.objects.get().normalizada)
+
+    def test_etag_y_no_modificado(self):
+        firma = firmas.guardar_firma(firmas.preparar_firma(self._firma()))
+        self.client.force_login(User.objects.create_user("biomedico"))
+        for nombre in ("firma_imagen", "firma_miniatura"):
+            url = reverse(nombre, args=[firma.pk])
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta["Content-Type"], "image/png")
+            self.assertIn("immutable", respuesta["Cache-Control"])
+
+            repetida = self.client.get(url, headers={"If-None-Match": respuesta["ETag"]})
+            self.assertEqual(repetida.status_code, 304)
+            self.assertEqual(repetida.content, b"")
+
+    def test_firma_inexistente(self):
+        self.client.force_login(User.objects.create_user("biomedico"))
+        self.assertEqual(self.client.get(reverse("firma_imagen", args=["0" * 64])).status_code, 404)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user("biomedico")
+        for indice in range(5):
+            RoundEntry.objects.create(usuario=usuario, categoria="ronda_diaria", subservicio=f"Servicio {indice}")
+        for _ in range(3):
+            SurgeryRound.objects.create(usuario=usuario, semana_inicio="2025-01-06", datos={})
+        # Registros y rondas de cirugía en el mismo instante: desempatan la fuente y el id
+        instante = timezone.now()
+        RoundEntry.objects.filter(pk__in=list(RoundEntry.objects.values_list("pk", flat=True)[:3])).update(
+            fecha_creacion=instante
+        )
+        SurgeryRound.objects.filter(pk__in=list(SurgeryRound.objects.values_list("pk", flat=True)[:2])).update(
+            fecha_creacion=instante
+        )
+
+    def _fuentes(self):
+        return [RoundEntry.objects.all(), SurgeryRound.objects.all()]
+
+    def _claves(self, registros):
+        return [(type(registro).__name__, registro.pk) for registro in registros]
+
+    def test_cursor_con_empates_en_fecha(self):
+        completa = timeline.paginar(self._fuentes(), tamano=20)
+        self.assertEqual(len(completa.registros), 8)
+        self.assertIsNone(completa.siguiente)
+        posiciones = [timeline.decodificar_cursor(registro.cursor) for registro in completa.registros]
+        self.assertEqual(posiciones, sorted(posiciones, reverse=True))
+
+        vistos, cursor = [], None
+        while True:
+            pagina = timeline.paginar(self._fuentes(), cursor=cursor, tamano=3)
+            self.assertLessEqual(len(pagina.registros), 3)
+            vistos += pagina.registros
+            cursor = pagina.siguiente
+            if cursor is None:
+                break
+        self.assertEqual(self._claves(vistos), self._claves(completa.registros))
+
+    def test_cursor_ida_y_vuelta(self):
+        fecha = timezone.now()
+        self.assertEqual(timeline.decodificar_cursor(timeline.codificar_cursor(fecha, 1, 42)), (fecha, 1, 42))
+        self.assertIsNone(timeline.decodificar_cursor("no-es-un-cursor"))
+
+
+@skipUnless(exportaciones.openpyxl, "requiere openpyxl")
+class ExcelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user("biomedico")
+        for indice in range(5):
+            RoundEntry.objects.create(
+                usuario=usuario,
+                categoria="ronda_diaria",
+                subservicio=f"Servicio {indice}",
+                hallazgo=f"Hallazgo {indice}",
+                tiene_eventos_seguridad=indice == 0,
+                eventos_seguridad="Caída" if indice == 0 else "",
+            )
+
+    def test_todas_las_filas_por_lotes(self):
+        avances = []
+        salida = BytesIO()
+        with mock.patch.object(exportaciones, "TAMANO_LOTE", 2):
+            exportaciones.escribir_excel(
+                RoundEntry.objects.order_by("pk"), salida, lambda hechos, total: avances.append((hechos, total))
+            )
+        self.assertEqual(avances, [(2, 5), (4, 5)])
+
+        filas = list(exportaciones.openpyxl.load_workbook(salida, read_only=True)["Historial"].values)
+        self.assertEqual(list(filas[0]), exportaciones.COLUMNAS)
+        self.assertEqual([fila[2] for fila in filas[1:]], [f"Servicio {indice}" for indice in range(5)])
+        self.assertEqual(filas[1][4], "Sí: Caída")
+        self.assertEqual(filas[2][4], "No")
+
+
+@override_settings(EXPORTACIONES_EN_SEGUNDO_PLANO=True)
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser("supervisor")
+        RoundEntry.objects.create(usuario=cls.usuario, categoria="ronda_diaria", subservicio="UCI", hallazgo="Revisado")
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp(prefix="exportaciones_")
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_un_trabajo_se_reclama_una_sola_vez(self):
+        trabajo = ExportJob.objects.create(usuario=self.usuario, formato=ExportJob.EXCEL)
+        self.assertEqual(exportaciones.tomar_trabajo().pk, trabajo.pk)
+        self.assertIsNone(exportaciones.tomar_trabajo())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, ExportJob.EN_PROCESO)
+        self.assertIsNotNone(trabajo.fecha_inicio)
+
+    def test_worker_genera_y_solo_el_dueno_descarga(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(reverse("exportar_historial_excel"))
+        trabajo = ExportJob.objects.get()
+        self.assertRedirects(respuesta, reverse("exportacion_detalle", args=[trabajo.pk]), fetch_redirect_response=False)
+        self.assertEqual(trabajo.estado, ExportJob.PENDIENTE)
+        descarga = reverse("exportacion_descargar", args=[trabajo.pk])
+        self.assertEqual(self.client.get(descarga).status_code, 404)
+
+        call_command("run_export_worker", "--una-vez", stdout=StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.progreso), (ExportJob.COMPLETADO, 100))
+        respuesta = self.client.get(descarga)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(trabajo.nombre_archivo, respuesta["Content-Disposition"])
+        self.assertTrue(b"".join(respuesta.streaming_content))
+
+        self.client.force_login(User.objects.create_user("otro"))
+        self.assertEqual(self.client.get(descarga).status_code, 404)
+
+
+class ReportePdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user("biomedico")
+        for indice in range(5):
+            RoundEntry.objects.create(usuario=usuario, categoria="ronda_diaria", subservicio=f"Servicio {indice}")
+        for _ in range(3):
+            SurgeryRound.objects.create(usuario=usuario, semana_inicio="2025-01-06", datos={})
+
+    def test_bloques_en_orden_con_portada_y_cierre(self):
+        with mock.patch.multiple(reporte_pdf, REGISTROS_POR_BLOQUE=2, CIRUGIAS_POR_BLOQUE=2), \
+                tempfile.TemporaryDirectory() as directorio:
+            bloques = list(reporte_pdf.bloques_reporte(
+                RoundEntry.objects.all(), SurgeryRound.objects.all(), reporte_pdf.FirmasEnDisco(directorio)
+            ))
+            self.assertEqual(len(bloques), reporte_pdf.total_bloques(5, 3))
+
+        self.assertEqual([len(bloque.get("registros", [])) for bloque in bloques], [2, 2, 1, 0, 0])
+        self.assertEqual([len(bloque.get("registros_cirugia", [])) for bloque in bloques], [0, 0, 0, 2, 1])
+        self.assertTrue(bloques[0]["portada"])
+        self.assertTrue(bloques[3]["portada_cirugia"])
+        self.assertEqual((bloques[-1]["total_registros"], bloques[-1]["total_cirugias"]), (5, 3))
+        self.assertFalse(any(bloque.get("cierre") for bloque in bloques[:-1]))
+        subservicios = [fila["subservicio"] for bloque in bloques for fila in bloque.get("registros", [])]
+        self.assertEqual(subservicios, [f"Servicio {indice}" for indice in reversed(range(5))])
+
+    @skipUnless(reporte_pdf.pisa and reporte_pdf.PdfWriter, "requiere xhtml2pdf y pypdf")
+    def test_une_los_bloques_en_un_pdf(self):
+        from pypdf import PdfReader
+
+        avances = []
+        salida = BytesIO()
+        with mock.patch.object(reporte_pdf, "REGISTROS_POR_BLOQUE", 2):
+            reporte_pdf.escribir_reporte(
+                RoundEntry.objects.all(), SurgeryRound.objects.none(), salida, procesos=2,
+                progreso=lambda hechos, total: avances.append((hechos, total)),
+            )
+        self.assertEqual(avances, [(1, 3), (2, 3), (3, 3)])
+        self.assertGreaterEqual(len(PdfReader(BytesIO(salida.getvalue())).pages), 3)
+
+
+class IndicadoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("biomedico")
+
+    def _registro(self, subservicio="UCI", **campos):
+        campos.setdefault("sin_novedad", True)
+        return RoundEntry.objects.create(
+            usuario=self.usuario, categoria="ronda_diaria", subservicio=subservicio, **campos
+        )
+
+    def _conteos(self, subservicio="UCI"):
+        return DailyRollup.objects.filter(subservicio=subservicio).values_list(
+            "total", "con_novedad", "eventos", "fuera_de_servicio"
+        ).first()
+
+    def test_las_senales_mantienen_el_dia(self):
+        self._registro()
+        self._registro(sin_novedad=False, tiene_eventos_seguridad=True)
+        fuera = self._registro(fuera_de_servicio="Monitor 3")
+        self.assertEqual(self._conteos(), (3, 1, 1, 1))
+
+        fuera.subservicio = "Urgencias"
+        fuera.save()
+        self.assertEqual(self._conteos(), (2, 1, 1, 0))
+        self.assertEqual(self._conteos("Urgencias"), (1, 0, 0, 1))
+
+        fuera.delete()
+        self.assertIsNone(self._conteos("Urgencias"))
+
+    def test_recalcular_dia_despues_de_un_borrado_sin_senales(self):
+        registros = [self._registro() for _ in range(2)]
+        fecha = indicadores.dia_local(registros[0].fecha_creacion)
+        # _raw_delete no dispara post_delete, como un borrado masivo por SQL
+        RoundEntry.objects.filter(pk=registros[0].pk)._raw_delete(connection.alias)
+        self.assertEqual(self._conteos(), (2, 0, 0, 0))
+        indicadores.recalcular_dia(fecha, "ronda_diaria", "UCI")
+        self.assertEqual(self._conteos(), (1, 0, 0, 0))
+
+        RoundEntry.objects.all()._raw_delete(connection.alias)
+        indicadores.recalcular_dia(fecha, "ronda_diaria", "UCI")
+        self.assertIsNone(self._conteos())
+
+    def test_reconstruir_coincide_con_las_senales(self):
+        self._registro()
+        self._registro("Urgencias", sin_novedad=False)
+        SurgeryRound.objects.create(usuario=self.usuario, semana_inicio="2025-01-06", datos={})
+        antes = set(DailyRollup.objects.values_list("fecha", "subservicio", "total", "con_novedad"))
+        self.assertEqual(indicadores.reconstruir_indicadores(), (2, 1))
+        self.assertEqual(set(DailyRollup.objects.values_list("fecha", "subservicio", "total", "con_novedad")), antes)
+        self.assertEqual(WeeklySurgeryRollup.objects.get().total, 1)
+
+
+class CatalogoTests(TestCase):
+    def setUp(self):
+        # La copia en memoria sobrevive entre pruebas y la versión vuelve atrás con cada rollback
+        catalogo._catalogo = None
+
+    def test_copia_en_memoria_hasta_que_cambia_la_version(self):
+        catalogo.catalogo()
+        with self.assertNumQueries(1):
+            catalogo.catalogo()
+
+        version = catalogo.version_catalogo()
+        servicio = Service.objects.create(name="Neonatos", category="DIARIA", day_rules={"dias": [0]})
+        self.assertEqual(catalogo.version_catalogo(), version + 1)
+        self.assertIn("Neonatos", catalogo.servicios_por_dia(0)["ronda_diaria"])
+        self.assertNotIn("Neonatos", catalogo.servicios_por_dia(1)["ronda_diaria"])
+
+        servicio.active = False
+        servicio.save()
+        self.assertNotIn("Neonatos", catalogo.servicios_por_dia(0)["ronda_diaria"])
+
+    def test_salas_de_cirugia(self):
+        self.assertFalse(catalogo.surgery_available_today(6))
+        cirugia = Service.objects.create(name="Cirugía prueba", category="CIRUGIA", day_rules={"dias": [6]})
+        sala = Room.objects.create(number="Sala prueba", service=cirugia, order=999)
+        Equipment.objects.create(name="Monitor", room=sala, service=cirugia)
+        self.assertTrue(catalogo.surgery_available_today(6))
+        self.assertTrue(catalogo.servicios_por_dia(6)["surgery_available"])
+        self.assertIn({"sala": "Sala prueba", "equipos": ("Monitor",)}, catalogo.distribucion_cirugia())
+
+
+class TrazosTests(TestCase):
+    FIRMA = trazos.Trazos(400, 150, (((10, 20), (200, 140), (190, 30), (400, 0)), ((5, 5),)))
+
+    def test_codificar_y_decodificar(self):
+        datos = trazos.codificar(self.FIRMA)
+        self.assertEqual(trazos.decodificar(datos), self.FIRMA)
+        # Cabecera, cantidades y deltas en varint: pocos bytes por punto
+        self.assertLess(len(datos), 30)
+
+    def test_rechaza_datos_invalidos(self):
+        datos = trazos.codificar(self.FIRMA)
+        fuera = trazos.codificar(trazos.Trazos(100, 100, (((10, 10), (101, 10)),)))
+        for invalidos in (datos[:-1], datos + b"\x00", b"\x02" + datos[1:], fuera, b""):
+            with self.assertRaises(ValueError):
+                trazos.decodificar(invalidos)
+
+    def test_firma_vectorial_en_el_formulario(self):
+        datos = trazos.codificar(self.FIRMA)
+        valor = f"data:{trazos.CONTENT_TYPE};base64," + base64.b64encode(datos).decode()
+        preparada = FirmaField(required=False).clean(valor)
+        self.assertEqual(
+            (preparada.content_type, preparada.data, preparada.width, preparada.height),
+            (trazos.CONTENT_TYPE, datos, 400, 150),
+        )
+        imagen = trazos.rasterizar(datos)
+        self.assertEqual(imagen.size, (400, 150))
+        self.assertEqual(imagen.getextrema(), (0, 255))
+        miniatura = Image.open(BytesIO(firmas.generar_miniatura(datos, trazos.CONTENT_TYPE)))
+        self.assertLessEqual(miniatura.width, firmas.TAMANO_NORMALIZADO[0])
+
+
+class EstadosCirugiaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("biomedico")
+
+    def _ronda(self, datos, semana_inicio=date(2025, 1, 6)):
+        return SurgeryRound.objects.create(usuario=self.usuario, semana_inicio=semana_inicio, datos=datos)
+
+    def test_normaliza_dias_y_descarta_lo_desconocido(self):
+        ronda = self._ronda({
+            "1": {
+                "Monitor": {
+                    " MIÉRCOLES ": "fuera_de_servicio",
+                    "Lunes": "operativo_completo",
+                    "Feriado": "operativo_parcial",
+                },
+                "Bomba": {"Martes": "no_aplica", "Viernes": "operativo_parcial"},
+                "Lámpara": "operativo_completo",
+            },
+            "2": None,
+        })
+        self.assertEqual(
+            set(
+                SurgeryEquipmentStatus.objects.filter(ronda=ronda)
+                .values_list("sala", "equipo", "fecha", "dia", "estado")
+            ),
+            {
+                ("1", "Monitor", date(2025, 1, 8), 2, "fuera_de_servicio"),
+                ("1", "Monitor", date(2025, 1, 6), 0, "operativo_completo"),
+                ("1", "Bomba", date(2025, 1, 10), 4, "operativo_parcial"),
+            },
+        )
+
+    def test_editar_reemplaza_y_consultas(self):
+        ronda = self._ronda({"1": {"Monitor": {"Lunes": "fuera_de_servicio", "Martes": "fuera_de_servicio"}}})
+        self._ronda({"3": {"Bomba": {"Lunes": "fuera_de_servicio"}}}, date(2025, 1, 13))
+        self.assertEqual(estados_cirugia.conteo_por_estado(1, "Monitor"), {"fuera_de_servicio": 2})
+
+        ronda.datos = {"1": {"Monitor": {"Lunes": "operativo_completo"}}}
+        ronda.save()
+        self.assertEqual(estados_cirugia.conteo_por_estado(1, "Monitor"), {"operativo_completo": 1})
+        self.assertEqual(
+            list(estados_cirugia.equipos_mas_fuera_de_servicio(date(2025, 1, 1))),
+            [{"sala": "3", "equipo": "Bomba", "total": 1}],
+        )
+
+        SurgeryEquipmentStatus.objects.all().delete()
+        self.assertEqual(estados_cirugia.reconstruir_estados(), 2)
+
+
+class SincronizacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("tecnico1")
+
+    def setUp(self):
+        cache.clear()
+
+    def _registro(self, **campos):
+        return {
+            "usuario": "tecnico1",
+            "categoria": "sedes_externas",
+            "subservicio": "Sede norte",
+            "hallazgo": "Revisado",
+            "tiene_eventos_seguridad": "False",
+            "sin_novedad": "True",
+            "nombre_encargado_servicio": "Ana",
+            "nombre_encargado_ronda": "Luis",
+            idempotencia.CAMPO: str(uuid.uuid4()),
+            **campos,
+        }
+
+    def test_rechaza_registros_de_otro_usuario(self):
+        lote = {"registros": [self._registro(), self._registro(usuario="tecnico2"), self._registro(categoria="")]}
+        formularios, errores, guardados = sincronizacion.validar_lote(lote, self.usuario)
+        self.assertEqual(list(formularios), [0])
+        self.assertEqual(set(errores), {1, 2})
+        self.assertIn("tecnico2", errores[1]["__all__"][0])
+        self.assertIn("categoria", errores[2])
+        self.assertEqual(guardados, {})
+
+    def test_lote_sin_forma(self):
+        for datos in ([], {"registros": []}, {"registros": [{}] * (sincronizacion.REGISTROS_MAXIMOS + 1)}):
+            with self.assertRaises(sincronizacion.LoteInvalido):
+                sincronizacion.validar_lote(datos, self.usuario)
+
+    def test_reenvio_no_duplica(self):
+        self.client.force_login(self.usuario)
+        lote = {"registros": [self._registro(), self._registro(subservicio="Sede sur"), self._registro(usuario="otro")]}
+        respuesta = self.client.post(reverse("sincronizar_rondas"), lote, content_type="application/json").json()
+        self.assertFalse(respuesta["success"])
+        self.assertEqual(list(respuesta["errores"]), ["2"])
+        guardados = {fila["indice"]: fila["id"] for fila in respuesta["guardados"]}
+        self.assertEqual(set(guardados), {0, 1})
+        self.assertEqual(RoundEntry.objects.filter(usuario=self.usuario).count(), 2)
+        # bulk_create no dispara señales: el lote recalcula los indicadores
+        self.assertEqual(DailyRollup.objects.filter(categoria="sedes_externas").count(), 2)
+
+        lote["registros"].pop()
+        repetido = self.client.post(reverse("sincronizar_rondas"), lote, content_type="application/json").json()
+        self.assertTrue(repetido["success"])
+        self.assertEqual({fila["indice"]: fila["id"] for fila in repetido["guardados"]}, guardados)
+        self.assertEqual(RoundEntry.objects.count(), 2)
+
+
+class GrillaDiariaPanelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser("supervisor", password="x")
+
+    def setUp(self):
+        cache.clear()
+        catalogo._catalogo = None
+        self.client.force_login(self.usuario)
+
+    def test_el_panel_envia_la_grilla_del_dia(self):
+        lunes = timezone.make_aware(datetime(2025, 1, 6, 10, 0))
+        localtime = timezone.localtime
+        with mock.patch(
+            "django.utils.timezone.localtime",
+            side_effect=lambda valor=None, *args: lunes if valor is None else localtime(valor, *args),
+        ):
+            panel = self.client.get(reverse("panel_principal")).content.decode()
+        self.assertIn(f'data-url="{reverse("cirugia_diaria")}" data-fecha="2025-01-06"', panel)
+
+        # Las celdas como las arma panel.js desde las filas de la tabla
+        filas = [
+            (item["sala"], equipo)
+            for item in catalogo.distribucion_cirugia()
+            for equipo in item["equipos"]
+        ]
+        for sala, equipo in filas:
+            self.assertIn(f'data-sala="{sala}" data-equipo="{equipo}"', panel)
+        grilla = {
+            "fecha": "2025-01-06",
+            "nombre_encargado_servicio": "Ana",
+            "nombre_encargado_ronda": "Luis",
+            "firma_servicio": "",
+            "firma_ronda": "",
+            "celdas": [
+                {"sala": sala, "equipo": equipo, "equipo_en_uso": indice == 0,
+                 "estado_equipo": "operativo_completo" if indice == 0 else "", "observaciones": ""}
+                for indice, (sala, equipo) in enumerate(filas)
+            ],
+        }
+        respuesta = self.client.post(
+            reverse("cirugia_diaria"), grilla, content_type="application/json",
+            headers={"Idempotency-Key": str(uuid.uuid4())},
+        )
+        self.assertEqual(respuesta.json(), {"success": True, "guardadas": len(filas)})
+        self.assertEqual(DailySurgeryRecord.objects.filter(equipo_en_uso=True).count(), 1)
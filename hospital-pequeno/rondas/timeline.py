@@ -0,0 +1,98 @@
+"""
+Línea de tiempo del historial con paginación por llave (keyset).
+
+Combina varios querysets (registros de servicios y rondas de cirugía) en un solo
+listado ordenado de más reciente a más antiguo. Cada fuente se consulta ya
+ordenada por ``(fecha_creacion, id)`` y limitada al tamaño de la página, y los
+resultados se mezclan con ``heapq.merge``; así cada página cuesta lo mismo sin
+importar cuántos registros existan.
+"""
+
+import base64
+import binascii
+import heapq
+from datetime import datetime
+from typing import NamedTuple
+
+from django.db.models import Q
+
+
+class Pagina(NamedTuple):
+    registros: list
+    siguiente: str | None
+
+
+def codificar_cursor(fecha, fuente, pk):
+    """Cursor opaco para la posición ``(fecha_creacion, fuente, id)``."""
+    crudo = f"{fecha.isoformat()}|{fuente}|{pk}".encode()
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Devuelve ``(fecha, fuente, id)`` o ``None`` si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, fuente, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split("|")
+        return datetime.fromisoformat(fecha), int(fuente), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _despues_de(posicion, fuente):
+    """Filtro de los registros de ``fuente`` que van después de ``posicion``."""
+    fecha, fuente_cursor, pk = posicion
+    if fuente < fuente_cursor:
+        return Q(fecha_creacion__lte=fecha)
+    if fuente > fuente_cursor:
+        return Q(fecha_creacion__lt=fecha)
+    # El rango sobre la fecha va aparte del OR para que el motor busque en el índice
+    # desde el cursor en lugar de recorrerlo desde el principio
+    return Q(fecha_creacion__lte=fecha) & (Q(fecha_creacion__lt=fecha) | Q(pk__lt=pk))
+
+
+def _consultas(fuentes, posicion, tamano):
+    for indice, queryset in enumerate(fuentes):
+        if posicion is not None:
+            queryset = queryset.filter(_despues_de(posicion, indice))
+        yield queryset.order_by("-fecha_creacion", "-pk")[: tamano + 1]
+
+
+def _mezclar(resultados, tamano):
+    mezcla = heapq.merge(
+        *(
+            [((registro.fecha_creacion, indice, registro.pk), registro) for registro in registros]
+            for indice, registros in enumerate(resultados)
+        ),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+
+    registros = []
+    siguiente = None
+    for (fecha, indice, pk), registro in mezcla:
+        if len(registros) == tamano:
+            siguiente = registros[-1].cursor
+            break
+        registro.cursor = codificar_cursor(fecha, indice, pk)
+        registros.append(registro)
+    return Pagina(registros, siguiente)
+
+
+def paginar(fuentes, cursor=None, tamano=50):
+    """
+    Obtiene una página de la línea de tiempo.
+
+    ``fuentes`` es una secuencia de querysets; su posición desempata registros
+    creados en el mismo instante. Cada registro devuelto recibe el atributo
+    ``cursor`` con la posición que permite continuar desde él.
+    """
+    consultas = _consultas(fuentes, decodificar_cursor(cursor), tamano)
+    return _mezclar([list(consulta) for consulta in consultas], tamano)
+
+
+async def apaginar(fuentes, cursor=None, tamano=50):
+    """Versión asíncrona de ``paginar`` para vistas ``async``."""
+    consultas = _consultas(fuentes, decodificar_cursor(cursor), tamano)
+    return _mezclar([[registro async for registro in consulta] for consulta in consultas], tamano)
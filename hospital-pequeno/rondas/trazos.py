@@ -0,0 +1,134 @@
+"""
+Formato vectorial de firmas.
+
+El canvas envía los trazos en lugar de una imagen, como
+``data:application/x-firma-trazos;base64,...``. Los bytes son enteros sin signo en
+varint (LEB128):
+
+    versión, ancho, alto, cantidad de trazos
+    por trazo: cantidad de puntos, x e y del primer punto y, para los demás, la
+    diferencia con el punto anterior en zigzag
+
+Una firma típica ocupa menos de un kilobyte. La imagen se genera al vuelo con
+``rasterizar`` cuando hace falta (vista de la firma, miniaturas, PDF).
+"""
+
+from typing import NamedTuple
+
+from PIL import Image, ImageDraw
+
+CONTENT_TYPE = "application/x-firma-trazos"
+VERSION = 1
+
+# Límites para rechazar datos que no vienen del canvas
+LADO_MAXIMO = 4000
+TRAZOS_MAXIMOS = 500
+PUNTOS_MAXIMOS = 20000
+GROSOR_TRAZO = 2
+
+
+class Trazos(NamedTuple):
+    ancho: int
+    alto: int
+    # Cada trazo es una tupla de puntos (x, y) en píxeles del canvas
+    trazos: tuple
+
+
+def _zigzag(valor):
+    return valor * 2 if valor >= 0 else -valor * 2 - 1
+
+
+def _desde_zigzag(valor):
+    return valor // 2 if valor % 2 == 0 else -(valor + 1) // 2
+
+
+def _escribir(salida, valor):
+    while valor >= 0x80:
+        salida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+
+
+class _Lector:
+    def __init__(self, datos):
+        self.datos = datos
+        self.posicion = 0
+
+    def leer(self):
+        valor = desplazamiento = 0
+        while True:
+            if self.posicion >= len(self.datos) or desplazamiento > 28:
+                raise ValueError("La firma está incompleta.")
+            byte = self.datos[self.posicion]
+            self.posicion += 1
+            valor |= (byte & 0x7F) << desplazamiento
+            if byte < 0x80:
+                return valor
+            desplazamiento += 7
+
+
+def codificar(trazos):
+    """Bytes del formato vectorial para ``trazos`` (un ``Trazos``)."""
+    salida = bytearray()
+    for valor in (VERSION, trazos.ancho, trazos.alto, len(trazos.trazos)):
+        _escribir(salida, valor)
+    for trazo in trazos.trazos:
+        _escribir(salida, len(trazo))
+        anterior_x, anterior_y = trazo[0]
+        _escribir(salida, anterior_x)
+        _escribir(salida, anterior_y)
+        for x, y in trazo[1:]:
+            _escribir(salida, _zigzag(x - anterior_x))
+            _escribir(salida, _zigzag(y - anterior_y))
+            anterior_x, anterior_y = x, y
+    return bytes(salida)
+
+
+def decodificar(datos):
+    """
+    Lee y valida el formato vectorial. Lanza ``ValueError`` si los datos no
+    corresponden a una firma válida.
+    """
+    lector = _Lector(bytes(datos))
+    if lector.leer() != VERSION:
+        raise ValueError("Versión de firma no soportada.")
+    ancho, alto, cantidad = lector.leer(), lector.leer(), lector.leer()
+    if not (0 < ancho <= LADO_MAXIMO and 0 < alto <= LADO_MAXIMO):
+        raise ValueError("El tamaño de la firma no es válido.")
+    if not 0 < cantidad <= TRAZOS_MAXIMOS:
+        raise ValueError("La firma no tiene trazos válidos.")
+
+    trazos = []
+    total_puntos = 0
+    for _ in range(cantidad):
+        puntos = lector.leer()
+        total_puntos += puntos
+        if not puntos or total_puntos > PUNTOS_MAXIMOS:
+            raise ValueError("La firma no tiene trazos válidos.")
+        x, y = lector.leer(), lector.leer()
+        trazo = [(x, y)]
+        for _ in range(puntos - 1):
+            x += _desde_zigzag(lector.leer())
+            y += _desde_zigzag(lector.leer())
+            trazo.append((x, y))
+        if any(not (0 <= px <= ancho and 0 <= py <= alto) for px, py in trazo):
+            raise ValueError("La firma tiene puntos fuera del área de dibujo.")
+        trazos.append(tuple(trazo))
+    if lector.posicion != len(lector.datos):
+        raise ValueError("La firma tiene datos de más.")
+    return Trazos(ancho, alto, tuple(trazos))
+
+
+def rasterizar(datos):
+    """Dibuja la firma en escala de grises sobre fondo blanco, al tamaño del canvas."""
+    firma = decodificar(datos)
+    imagen = Image.new("L", (firma.ancho, firma.alto), 255)
+    dibujo = ImageDraw.Draw(imagen)
+    radio = GROSOR_TRAZO / 2
+    for trazo in firma.trazos:
+        if len(trazo) == 1:
+            (x, y), = trazo
+            dibujo.ellipse((x - radio, y - radio, x + radio, y + radio), fill=0)
+        else:
+            dibujo.line(trazo, fill=0, width=GROSOR_TRAZO, joint="curve")
+    return imagen
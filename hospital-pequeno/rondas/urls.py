@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 
 from . import views
 
@@ -7,7 +7,25 @@ urlpatterns = [
     path("historial/", views.historial_servicios, name="historial_servicios"),
     path("historial/export/excel/", views.exportar_historial_excel, name="exportar_historial_excel"),
     path("historial/export/pdf/", views.exportar_historial_pdf, name="exportar_historial_pdf"),
+    path("exportaciones/<int:trabajo_id>/", views.exportacion_detalle, name="exportacion_detalle"),
+    path(
+        "exportaciones/<int:trabajo_id>/descargar/",
+        views.exportacion_descargar,
+        name="exportacion_descargar",
+    ),
+    re_path(r"^firmas/(?P<sha256>[0-9a-f]{64})/$", views.firma_imagen, name="firma_imagen"),
+    re_path(
+        r"^firmas/(?P<sha256>[0-9a-f]{64})/miniatura/$",
+        views.firma_imagen,
+        {"variante": "miniatura"},
+        name="firma_miniatura",
+    ),
+    path("cirugia/diario/", views.cirugia_diaria, name="cirugia_diaria"),
+    path("rondas/sincronizar/", views.sincronizar_rondas, name="sincronizar_rondas"),
+    path("sw.js", views.service_worker, name="service_worker"),
+    path("api/v1/<slug:recurso>/", views.api_registros, name="api_registros"),
     path("indicadores/", views.indicadores, name="indicadores"),
+    path("metricas/", views.metricas, name="metricas"),
     path("eliminar/registro/<int:registro_id>/", views.eliminar_registro, name="eliminar_registro"),
     path("eliminar/cirugia/<int:registro_id>/", views.eliminar_registro_cirugia, name="eliminar_registro_cirugia"),
 ]
@@ -1,26 +1,48 @@
-﻿from django.contrib import messages
+﻿import hashlib
+import hmac
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required, permission_required
-from django.db.models import Count, Q
-from django.http import HttpResponseNotAllowed, JsonResponse
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.http import require_POST
+from django.templatetags.static import static
+from django.views.decorators.http import require_GET, require_POST
 
 from django.utils import timezone
-from datetime import datetime
-try:
-    import openpyxl
-except ImportError:
-    openpyxl = None
-try:
-    from xhtml2pdf import pisa
-except ImportError:
-    pisa = None
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-
-from .forms import RoundEntryForm, SurgeryRoundForm, DailySurgeryRoundForm
-from .models import RoundEntry, SurgeryRound, DailySurgeryRecord
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.formats import date_format
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+from . import api, busqueda, idempotencia, timeline, trazos
+from .catalogo import SPANISH_WEEKDAYS, catalogo
+from .cirugia_diaria import GrillaInvalida, guardar_grilla, validar_grilla
+from .consultas import filtrar_registros
+from .estados_cirugia import equipos_mas_fuera_de_servicio
+from .exportaciones import ejecutar_exportacion
+from .firmas import generar_miniatura, imagen_png
+from .fragmentos import acordeon, formulario_ronda
+from .instrumentacion import etapa, exposicion, instrumentada, logger, resumen_datos
+from .forms import RoundEntryForm, SurgeryRoundForm
+from .sincronizacion import LoteInvalido, guardar_lote, validar_lote
+from .models import (
+    DailyRollup,
+    ExportJob,
+    RoundEntry,
+    Signature,
+    SurgeryRound,
+    WeeklySurgeryRollup,
+)
 
 
 @login_required
@@ -57,94 +79,6 @@ def eliminar_registro_cirugia(request, registro_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
-@login_required
-@permission_required('rondas.view_roundentry', raise_exception=True)
-def exportar_historial_excel(request):   openpyxl = None
-try:
-    from xhtml2pdf import pisa
-except ImportError:
-    pisa = None
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-
-from .forms import RoundEntryForm, SurgeryRoundForm, DailySurgeryRoundForm
-from .models import RoundEntry, SurgeryRound, DailySurgeryRecord
-
-PRIORITARIOS = [
-    "UNIDAD DE RECIÉN NACIDOS (CUIDADOS INTERMEDIOS)",
-    "UNIDAD DE RECIÉN NACIDOS (CUIDADOS INTENSIVOS)",
-    "UNIDAD DE CUIDADOS INTENSIVOS",
-    "UNIDAD DE CUIDADO INTENSIVO PEDIÁTRICO",
-]
-SEDES_EXTERNAS = [
-    "Cuidados Paliativos",
-    "Calle 41",
-    "Intelectus",
-]
-def surgery_available_today(day):
-    """Verifica si las salas de cirugía están disponibles hoy"""
-    return day in SURGERY_AVAILABLE_DAYS
-
-def get_services_by_day(day):
-    # Servicios disponibles por día
-    ronda_diaria = {
-        0: ["Urgencias", "Salud Mental", "Trasplante de Médula"],
-        1: ["Oftalmología", "Neurociencias", "Patología", "Radiología", "Hospitalización Aislamiento", "Sexto Centro", "Medicina Nuclear"],
-        2: ["Urgencias", "Oncología", "Hemato-Oncología", "Gastroenterología"],
-        3: ["Neumología", "Nefrología", "Cardiología", "Medicina Interna", "Neurología", "Otorrino"],
-        4: ["Urgencias", "Consulta Externa", "Pediatría", "9 Piso"],
-    }
-    servicio_salas = {
-        0: ["Hospitalización Cirugía", "Lactario", "Central de Esterilización", "SIPE"],
-        2: ["Central de Esterilización", "Neurociencias", "SIPE"],
-        4: ["Central de Esterilización", "SIPE"],
-    }
-    laboratorio_clinico = {
-        0: [
-            "LC - ALMACÉN", "LC - MICROBIOLOGÍA", "LC - BIOLOGÍA MOLECULAR", "LC - CITOMETRÍA DE FLUJO",
-            "LC - INMUNOLOGÍA", "LC - HEMATOLOGÍA", "LC - QUÍMICA", "LC - TAMIZAJE",
-            "LC - REFERENCIA Y CONTRAREFERENCIA", "LC - SERVICIO TRANSFUSIONAL", "LC - TOMA DE MUESTRAS", "LC - ERRORES INNATOS"
-        ]
-    }
-    
-    # Servicios disponibles para el día actual
-    servicios_del_dia = {
-        "ronda_diaria": ronda_diaria.get(day, []),
-        "servicio_salas": servicio_salas.get(day, []),
-        "laboratorio_clinico": laboratorio_clinico.get(day, []) if day == 0 else [],
-        "surgery_available": surgery_available_today(day),
-    }
-    
-    # Agregar todos los servicios disponibles (para mostrar opciones)
-    todos_ronda_diaria = set()
-    todos_servicio_salas = set()
-    for servicios_dia in ronda_diaria.values():
-        todos_ronda_diaria.update(servicios_dia)
-    for servicios_dia in servicio_salas.values():
-        todos_servicio_salas.update(servicios_dia)
-    
-    servicios_del_dia["todos_ronda_diaria"] = sorted(list(todos_ronda_diaria))
-    servicios_del_dia["todos_servicio_salas"] = sorted(list(todos_servicio_salas))
-    servicios_del_dia["todos_laboratorio_clinico"] = laboratorio_clinico[0]
-    
-    return servicios_del_dia
-
-SURGERY_ROOMS = [str(numero) for numero in range(1, 15)]
-SURGERY_EQUIPMENT = [
-    "Máquina",
-    "Presión bala de oxígeno (O₂)",
-    "Monitor",
-    "Mesa",
-    "Lámpara",
-    "Electrobisturí",
-    "Microscopio",
-    "Otros",
-]
-SURGERY_DAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
-
-# Días en que aparecen las salas de cirugía (0=Lunes, 1=Martes, etc.)
-SURGERY_AVAILABLE_DAYS = [0, 1, 2, 3, 4, 5]  # Lunes a Sábado
-
 # Estructura de categorías para las rondas
 ROUND_STRUCTURE = {
     "prioritarios": {
@@ -169,16 +103,8 @@ ROUND_STRUCTURE = {
     },
 }
 
-SPANISH_WEEKDAYS = [
-    "Lunes",
-    "Martes",
-    "Miércoles",
-    "Jueves",
-    "Viernes",
-    "Sábado",
-    "Domingo",
-]
-
+# Registros por página en el historial
+HISTORIAL_TAMANO_PAGINA = 50
 
 def logout_redirect(request):
     if request.method not in ("GET", "POST"):
@@ -194,6 +120,7 @@ def horario_valido(moment) -> bool:
 
 
 @login_required
+@instrumentada("panel_principal")
 def panel_principal(request):
     ahora = timezone.localtime()
     if not horario_valido(ahora):
@@ -201,7 +128,9 @@ def panel_principal(request):
 
     dia_actual = SPANISH_WEEKDAYS[ahora.weekday()]
     day = ahora.weekday()
-    servicios = get_services_by_day(day)
+    # Una sola lectura de la versión del catálogo por petición
+    catalogo_actual = catalogo()
+    servicios = catalogo_actual.por_dia[day]
 
     # Formularios y lógica original
     posted_key: tuple[str, str] | None = None
@@ -209,70 +138,67 @@ def panel_principal(request):
     if request.method == "POST":
         tipo_formulario = request.POST.get("tipo_formulario")
         if tipo_formulario == "ronda":
-            print(f"DEBUG - Procesando formulario de ronda")
-            print(f"DEBUG - POST data keys: {list(request.POST.keys())}")
-            print(f"DEBUG - POST data: {dict(request.POST)}")
-            
-            from .utils import process_signature_data
-            
             posted_key = (
                 request.POST.get("categoria", ""),
                 request.POST.get("subservicio", ""),
             )
-            
-            print(f"DEBUG - Posted key: {posted_key}")
-            
-            from .utils import base64_to_image_file
-            
-            # Crear formulario normal
-            round_form = RoundEntryForm(request.POST)
-            print(f"DEBUG - Formulario válido?: {round_form.is_valid()}")
-            if not round_form.is_valid():
-                print(f"DEBUG - Errores del formulario: {round_form.errors}")
-            
-            if round_form.is_valid():
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Formulario de ronda %s: %s", posted_key, resumen_datos(request.POST))
+
+            clave = idempotencia.leer_clave(request.POST.get(idempotencia.CAMPO))
+            repetido = idempotencia.guardado(RoundEntry, clave)
+            if repetido:
+                logger.info("Registro de ronda %s reenviado con la misma clave", repetido)
+                messages.success(request, "Registro guardado correctamente.")
+                return redirect("panel_principal")
+
+            round_form = formulario_ronda(*posted_key, datos=request.POST)
+            with etapa("validacion"):
+                valido = round_form.is_valid()
+            if valido:
                 registro = round_form.save(commit=False)
                 registro.usuario = request.user
-                print(f"DEBUG - Usuario: {request.user}")
-                print(f"DEBUG - Datos del registro antes de firmas: categoria={registro.categoria}, subservicio={registro.subservicio}")
-                
-                # Las firmas ya están guardadas en el formulario como base64
-                print(f"DEBUG - Firma servicio guardada: {len(registro.firma_servicio) if registro.firma_servicio else 0} caracteres")
-                print(f"DEBUG - Firma ronda guardada: {len(registro.firma_ronda) if registro.firma_ronda else 0} caracteres")
-                
+                registro.clave_idempotencia = clave
                 try:
-                    registro.save()
-                    print(f"DEBUG - Registro guardado con ID: {registro.id}")
+                    with etapa("guardado"):
+                        registro = idempotencia.guardar(registro)
+                    logger.info("Registro de ronda %s guardado por %s", registro.pk, request.user)
                     messages.success(request, "Registro guardado correctamente.")
                     return redirect("panel_principal")
                 except Exception as e:
-                    print(f"DEBUG - Error al guardar: {str(e)}")
+                    logger.exception("Error al guardar el registro de ronda %s", posted_key)
                     messages.error(request, f"Error al guardar: {str(e)}")
             else:
-                print(f"DEBUG - El formulario no es válido")
+                logger.info("Formulario de ronda %s inválido: %s", posted_key, round_form.errors.as_json())
                 messages.error(request, "Por favor, corrija los errores en el formulario.")
             posted_form = round_form
         elif tipo_formulario == "cirugia":
-            print(f"DEBUG - Procesando formulario de cirugía...")
-            print(f"DEBUG - Datos POST: {request.POST}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Formulario de cirugía: %s", resumen_datos(request.POST))
+            clave = idempotencia.leer_clave(request.POST.get(idempotencia.CAMPO))
+            repetido = idempotencia.guardado(SurgeryRound, clave)
+            if repetido:
+                logger.info("Formato de cirugía %s reenviado con la misma clave", repetido)
+                messages.success(request, "Formato semanal de salas de cirugía guardado.")
+                return redirect("panel_principal")
             surgery_form = SurgeryRoundForm(request.POST)
-            print(f"DEBUG - Formulario creado, validando...")
-            if surgery_form.is_valid():
-                print(f"DEBUG - Formulario válido, guardando...")
+            with etapa("validacion"):
+                valido = surgery_form.is_valid()
+            if valido:
                 try:
-                    resultado = surgery_form.guardar(request.user)
-                    print(f"DEBUG - Guardado exitoso: {resultado}")
+                    with etapa("guardado"):
+                        resultado = surgery_form.guardar(request.user, clave)
+                    logger.info("Formato de cirugía %s guardado por %s", resultado.pk, request.user)
                     messages.success(request, "Formato semanal de salas de cirugía guardado.")
                     return redirect("panel_principal")
                 except Exception as e:
-                    print(f"DEBUG - Error al guardar formulario de cirugía: {str(e)}")
+                    logger.exception("Error al guardar el formato de cirugía")
                     messages.error(request, f"Error al guardar: {str(e)}")
             else:
-                print(f"DEBUG - Formulario de cirugía NO válido")
-                print(f"DEBUG - Errores: {surgery_form.errors}")
+                logger.info("Formulario de cirugía inválido: %s", surgery_form.errors.as_json())
                 messages.error(request, "Por favor, corrija los errores en el formulario de cirugía.")
         else:
-            print(f"DEBUG - Tipo de formulario no reconocido: {tipo_formulario}")
+            logger.warning("Tipo de formulario no reconocido: %r", tipo_formulario)
             messages.error(request, "No se pudo identificar el formulario enviado.")
 
     # Salas de cirugía (solo día actual)
@@ -282,136 +208,114 @@ def panel_principal(request):
     
     if servicios.get("surgery_available", False):
         # Obtener el nombre del día actual en español
-        current_day_name = SURGERY_DAYS[datetime.now().weekday()]
-        print(f"DEBUG - Día actual para cirugía: {current_day_name}")
-        
+        current_day_name = SPANISH_WEEKDAYS[day]
         # Solo mostrar salas para el día actual
-        for sala in SURGERY_ROOMS:
-            equipos = [
-                equipo
-                for equipo in SURGERY_EQUIPMENT
-                if not (equipo == "Microscopio" and sala != "1")
-            ]
-            surgery_layout.append({"sala": sala, "equipos": equipos})
+        surgery_layout = catalogo_actual.distribucion_cirugia
         surgery_form = SurgeryRoundForm()
 
     # Crear estructura de categorías para el template
-    categories = []
-    
-    # Servicios prioritarios (siempre disponibles)
-    if PRIORITARIOS:
-        prioritarios_forms = []
-        for servicio in PRIORITARIOS:
-            form_key = ("prioritarios", servicio)
-            form = RoundEntryForm(initial={"categoria": "prioritarios", "subservicio": servicio})
-            if posted_key == form_key and posted_form:
-                form = posted_form
-            prioritarios_forms.append({"nombre": servicio, "form": form})
-        
-        categories.append({
-            "clave": "prioritarios",
-            "titulo": "🚨 Servicios Prioritarios (Siempre disponibles)",
-            "subservicios": prioritarios_forms
-        })
-    
-    # Rondas diarias (según día)
-    if servicios.get("ronda_diaria"):
-        ronda_diaria_forms = []
-        for servicio in servicios["ronda_diaria"]:
-            form_key = ("ronda_diaria", servicio)
-            form = RoundEntryForm(initial={"categoria": "ronda_diaria", "subservicio": servicio})
-            if posted_key == form_key and posted_form:
-                form = posted_form
-            ronda_diaria_forms.append({"nombre": servicio, "form": form})
-        
-        categories.append({
-            "clave": "ronda_diaria",
-            "titulo": f"📅 Ronda Diaria - {dia_actual}",
-            "subservicios": ronda_diaria_forms
-        })
-    
-    # Servicios de salas (según día)
-    if servicios.get("servicio_salas"):
-        servicio_salas_forms = []
-        for servicio in servicios["servicio_salas"]:
-            form_key = ("servicio_salas", servicio)
-            form = RoundEntryForm(initial={"categoria": "servicio_salas", "subservicio": servicio})
-            if posted_key == form_key and posted_form:
-                form = posted_form
-            servicio_salas_forms.append({"nombre": servicio, "form": form})
-        
-        categories.append({
-            "clave": "servicio_salas",
-            "titulo": f"🏥 Servicio de Salas - {dia_actual}",
-            "subservicios": servicio_salas_forms
-        })
-    
-    # Laboratorio clínico (solo lunes)
-    if servicios.get("laboratorio_clinico"):
-        lab_forms = []
-        for servicio in servicios["laboratorio_clinico"]:
-            form_key = ("laboratorio_clinico", servicio)
-            form = RoundEntryForm(initial={"categoria": "laboratorio_clinico", "subservicio": servicio})
-            if posted_key == form_key and posted_form:
-                form = posted_form
-            lab_forms.append({"nombre": servicio, "form": form})
-        
-        categories.append({
-            "clave": "laboratorio_clinico",
-            "titulo": "🧪 Laboratorio Clínico (Solo Lunes)",
-            "subservicios": lab_forms
-        })
-    
-    # Sedes externas (siempre disponibles)
-    if SEDES_EXTERNAS:
-        sedes_forms = []
-        for servicio in SEDES_EXTERNAS:
-            form_key = ("sedes_externas", servicio)
-            form = RoundEntryForm(initial={"categoria": "sedes_externas", "subservicio": servicio})
-            if posted_key == form_key and posted_form:
-                form = posted_form
-            sedes_forms.append({"nombre": servicio, "form": form})
-        
-        categories.append({
-            "clave": "sedes_externas",
-            "titulo": "🏢 Sedes Externas (Siempre disponibles)",
-            "subservicios": sedes_forms
-        })
+    secciones = [
+        ("prioritarios", "🚨 Servicios Prioritarios (Siempre disponibles)", servicios["prioritarios"]),
+        ("ronda_diaria", f"📅 Ronda Diaria - {dia_actual}", servicios["ronda_diaria"]),
+        ("servicio_salas", f"🏥 Servicio de Salas - {dia_actual}", servicios["servicio_salas"]),
+        ("laboratorio_clinico", "🧪 Laboratorio Clínico (Solo Lunes)", servicios["laboratorio_clinico"]),
+        ("sedes_externas", "🏢 Sedes Externas (Siempre disponibles)", servicios["sedes_externas"]),
+    ]
+    hora_registro = date_format(ahora, "d/m/Y H:i")
+
+    # Sin formulario enviado el acordeón completo sale de la caché
+    acordeon_servicios = acordeon(
+        request,
+        secciones,
+        hora_registro,
+        catalogo_actual.version,
+        day,
+        enviado=(*posted_key, posted_form) if posted_form else None,
+    )
 
     contexto = {
         "dia_actual": dia_actual,
         "ahora": ahora,
-        "categories": categories,
+        "hora_registro": hora_registro,
+        "acordeon": acordeon_servicios,
         "surgery_days": [current_day_name] if current_day_name else [],
+        "catalogo_version": catalogo_actual.version,
         "current_day_name": current_day_name,
         "surgery_layout": surgery_layout,
         "surgery_form": surgery_form,
-        "surgery_available": servicios.get("surgery_available", False) and day in SURGERY_AVAILABLE_DAYS,
-        "surgery_available_days": [SPANISH_WEEKDAYS[day] for day in SURGERY_AVAILABLE_DAYS],
+        "surgery_available": servicios["surgery_available"],
+        "surgery_available_days": [SPANISH_WEEKDAYS[dia] for dia in catalogo_actual.dias_cirugia],
     }
-    return render(request, "rondas/panel.html", contexto)
+    with etapa("render"):
+        return render(request, "rondas/panel.html", contexto)
+
+
+def _firma_etag(sha256, variante, normalizada):
+    # La imagen de una clave solo cambia una vez: al normalizarse en el worker.
+    return quote_etag(f"{sha256}-{variante}-{'n' if normalizada else 'o'}")
 
 
 @login_required
-def historial_servicios(request):
-    from itertools import chain
-    from operator import attrgetter
-    
-    # Obtener registros de servicios
-    registros_servicios = RoundEntry.objects.select_related("usuario")
-    categoria = request.GET.get("categoria")
-    if categoria:
-        registros_servicios = registros_servicios.filter(categoria=categoria)
-    subservicio = request.GET.get("subservicio")
-    if subservicio:
-        registros_servicios = registros_servicios.filter(subservicio__icontains=subservicio)
+@instrumentada("firma_imagen")
+async def firma_imagen(request, sha256, variante="completa"):
+    """Entrega la imagen de una firma (o su miniatura) desde el almacén de firmas."""
+    firma = await Signature.objects.filter(pk=sha256).only("content_type", "thumbnail", "normalizada").afirst()
+    if firma is None:
+        raise Http404("Firma no encontrada")
+
+    etiqueta = _firma_etag(sha256, variante, firma.normalizada)
+    respuesta = get_conditional_response(request, etag=etiqueta)
+    if respuesta is None:
+        if variante == "miniatura":
+            if firma.thumbnail is None:
+                datos = await Signature.objects.values_list("data", flat=True).aget(pk=sha256)
+                firma.thumbnail = await sync_to_async(generar_miniatura)(datos, firma.content_type)
+                if firma.normalizada:
+                    # Firmas vectoriales o anteriores a las miniaturas: se conserva la generada.
+                    # Las pendientes no, porque el worker genera la definitiva.
+                    await Signature.objects.filter(pk=sha256, thumbnail__isnull=True).aupdate(thumbnail=firma.thumbnail)
+            respuesta = HttpResponse(bytes(firma.thumbnail), content_type="image/png")
+        else:
+            datos = await Signature.objects.values_list("data", flat=True).aget(pk=sha256)
+            respuesta = HttpResponse(
+                await sync_to_async(imagen_png)(sha256, firma.content_type, datos),
+                content_type="image/png" if firma.content_type == trazos.CONTENT_TYPE else firma.content_type,
+            )
+    respuesta.headers["ETag"] = etiqueta
+    if firma.normalizada:
+        patch_cache_control(respuesta, private=True, max_age=31536000, immutable=True)
+    else:
+        patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+@login_required
+@instrumentada("historial_servicios")
+async def historial_servicios(request):
+    # Obtener registros de servicios (las firmas se sirven aparte por su clave)
+    registros_servicios = filtrar_registros(RoundEntry.objects.select_related("usuario"), request.GET)
     
     # Obtener registros de cirugías
     registros_cirugias = SurgeryRound.objects.select_related("usuario")
     
-    # Combinar ambos tipos de registros y ordenar por fecha
-    registros_combinados = list(chain(registros_servicios, registros_cirugias))
-    registros = sorted(registros_combinados, key=attrgetter('fecha_creacion'), reverse=True)
+    texto = request.GET.get("q", "").strip()
+    with etapa("consulta"):
+        if texto:
+            # Búsqueda de texto: de los más relevantes a los menos, una página a la vez
+            pagina = await busqueda.apaginar(
+                [registros_servicios, registros_cirugias],
+                texto,
+                cursor=request.GET.get("despues"),
+                tamano=HISTORIAL_TAMANO_PAGINA,
+            )
+        else:
+            # Combinar ambos tipos de registros por fecha, una página a la vez
+            pagina = await timeline.apaginar(
+                [registros_servicios, registros_cirugias],
+                cursor=request.GET.get("despues"),
+                tamano=HISTORIAL_TAMANO_PAGINA,
+            )
+        registros, siguiente = pagina.registros, pagina.siguiente
 
     # Agregar categorías adicionales que no están en ROUND_STRUCTURE
     categorias_completas = ROUND_STRUCTURE.copy()
@@ -428,158 +332,276 @@ def historial_servicios(request):
         "descripcion": "Registros de rondas de cirugía"
     }
     
-    return render(
+    # La plantilla lee la sesión y el usuario (mensajes, menú): se renderiza en un hilo
+    with etapa("render"):
+        return await sync_to_async(render)(
+            request,
+            "rondas/historial.html",
+            {
+                "registros": registros,
+                "siguiente": siguiente,
+                "busqueda": texto,
+                "categorias": categorias_completas,
+            },
+        )
+
+
+@login_required
+@require_POST
+def cirugia_diaria(request):
+    """
+    Recibe en un solo JSON la grilla del día de salas de cirugía y la guarda en una
+    transacción. Responde los errores por celda si algo no es válido.
+    """
+    clave = idempotencia.leer_clave(request.META.get(idempotencia.ENCABEZADO))
+    if clave is not None:
+        guardadas = idempotencia.grilla_guardada(clave)
+        if guardadas is not None:
+            logger.info("Grilla de cirugía reenviada con la misma clave por %s", request.user)
+            return JsonResponse({"success": True, "guardadas": guardadas})
+
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"success": False, "errores": {"__all__": ["JSON inválido."]}}, status=400)
+
+    catalogo_actual = catalogo()
+    try:
+        with etapa("validacion"):
+            grilla = validar_grilla(datos, catalogo_actual.distribucion_cirugia, catalogo_actual.dias_cirugia)
+    except GrillaInvalida as exc:
+        return JsonResponse(
+            {"success": False, "errores": exc.generales, "errores_celdas": exc.celdas}, status=400
+        )
+
+    with etapa("guardado"):
+        guardadas = guardar_grilla(grilla, request.user, SPANISH_WEEKDAYS[grilla["fecha"].weekday()], clave)
+    logger.info("Grilla de cirugía del %s: %s celdas guardadas por %s", grilla["fecha"], guardadas, request.user)
+    return JsonResponse({"success": True, "guardadas": guardadas})
+
+
+@login_required
+@require_POST
+def sincronizar_rondas(request):
+    """
+    Recibe en un JSON los registros de ronda capturados sin conexión y guarda los
+    válidos en una transacción. Responde los errores de los demás por índice.
+    """
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"success": False, "errores": {"__all__": ["JSON inválido."]}}, status=400)
+
+    try:
+        with etapa("validacion"):
+            formularios, errores, guardados = validar_lote(datos, request.user)
+    except LoteInvalido as exc:
+        return JsonResponse({"success": False, "errores": {"__all__": [str(exc)]}}, status=400)
+
+    with etapa("guardado"):
+        try:
+            guardados.update(guardar_lote(formularios, request.user))
+        except IntegrityError:
+            # Otra petición guardó a la vez registros del lote: con sus claves ya
+            # guardadas, la segunda pasada solo inserta los que faltan
+            formularios, errores, guardados = validar_lote(datos, request.user)
+            guardados.update(guardar_lote(formularios, request.user))
+    logger.info(
+        "Sincronización de %s: %s registros guardados, %s con errores", request.user, len(guardados), len(errores)
+    )
+    return JsonResponse(
+        {
+            "success": not errores,
+            "guardados": [{"indice": indice, "id": pk} for indice, pk in guardados.items()],
+            "errores": errores,
+        }
+    )
+
+
+@login_required
+@require_GET
+@instrumentada("api_registros")
+def api_registros(request, recurso):
+    """Una página JSON de ``recurso`` para los tableros de calidad (ver ``rondas.api``)."""
+    if recurso not in api.RECURSOS:
+        raise Http404
+    if not request.user.has_perm(api.RECURSOS[recurso].permiso):
+        return JsonResponse({"success": False, "errores": {"__all__": ["No tiene permiso para consultar este recurso."]}}, status=403)
+    try:
+        with etapa("consulta"):
+            datos = api.pagina(recurso, request.GET)
+    except api.ParametrosInvalidos as exc:
+        return JsonResponse({"success": False, "errores": exc.errores}, status=400)
+    respuesta = JsonResponse({"success": True, **datos})
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+# Archivos que el service worker guarda para abrir el panel sin conexión
+ESTATICOS_SIN_CONEXION = ["css/styles.css", "js/signature-capture.js", "js/cola-rondas.js", "js/panel.js"]
+CDN_SIN_CONEXION = [
+    "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+    "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
+    "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css",
+]
+
+
+def service_worker(request):
+    """
+    Service worker del panel: se sirve desde la raíz para que su alcance cubra el
+    panel. La versión cambia con los estáticos, así cada despliegue lo actualiza.
+    """
+    archivos = [static(ruta) for ruta in ESTATICOS_SIN_CONEXION] + CDN_SIN_CONEXION
+    respuesta = render(
         request,
-        "rondas/historial.html",
+        "rondas/sw.js",
         {
-            "registros": registros,
-            "categorias": categorias_completas,
+            "archivos": json.dumps(archivos),
+            "version": hashlib.sha1("|".join(archivos).encode()).hexdigest()[:12],
+            "cola": static("js/cola-rondas.js"),
         },
+        content_type="application/javascript",
     )
+    patch_cache_control(respuesta, no_cache=True)
+    return respuesta
+
+
+def _token_metricas_valido(request):
+    token = settings.METRICAS_TOKEN
+    autorizacion = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(autorizacion.encode(), f"Bearer {token}".encode())
+
+
+def metricas(request):
+    """
+    Histogramas de tiempos del proceso, para Prometheus (con ``Authorization: Bearer
+    <METRICAS_TOKEN>``) o para consultar a mano como staff.
+    """
+    if not (request.user.is_staff or _token_metricas_valido(request)):
+        raise Http404
+    return HttpResponse(exposicion(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @login_required
-def indicadores(request):
-    totales = list(
-        RoundEntry.objects.values("categoria")
-        .annotate(total=Count("id"), con_novedad=Count("id", filter=Q(sin_novedad=False)))
+@instrumentada("indicadores")
+async def indicadores(request):
+    # Todo se lee de los indicadores precalculados (ver rondas/indicadores.py)
+    totales = (
+        DailyRollup.objects.values("categoria")
+        .annotate(total=Sum("total"), con_novedad=Sum("con_novedad"))
         .order_by("categoria")
     )
 
-    sin_novedad = {
-        item["categoria"]: item["total"]
-        for item in RoundEntry.objects.filter(sin_novedad=True)
-        .values("categoria")
-        .annotate(total=Count("id"))
-    }
-
     resumen = [
         {
             "clave": item["categoria"],
             "titulo": ROUND_STRUCTURE.get(item["categoria"], {}).get("titulo", item["categoria"].title()),
             "total": item["total"],
             "con_novedad": item["con_novedad"],
-            "sin_novedad": sin_novedad.get(item["categoria"], 0),
+            "sin_novedad": item["total"] - item["con_novedad"],
         }
-        for item in totales
+        async for item in totales
     ]
 
     # Indicadores adicionales
-    equipos_fuera_servicio = RoundEntry.objects.filter(
-        fuera_de_servicio=True
-    ).count()
-    
-    eventos_seguridad = RoundEntry.objects.filter(
-        tiene_eventos_seguridad=True
-    ).count()
-    
+    acumulados = await DailyRollup.objects.aaggregate(
+        fuera_de_servicio=Coalesce(Sum("fuera_de_servicio"), 0),
+        eventos=Coalesce(Sum("eventos"), 0),
+    )
+    equipos_fuera_servicio = acumulados["fuera_de_servicio"]
+    eventos_seguridad = acumulados["eventos"]
+
     # Top 5 servicios con más equipos fuera de servicio
-    top_fuera_servicio = list(
-        RoundEntry.objects.filter(fuera_de_servicio=True)
+    top_fuera_servicio = [
+        item
+        async for item in DailyRollup.objects.filter(fuera_de_servicio__gt=0)
         .values("subservicio", "categoria")
-        .annotate(total=Count("id"))
+        .annotate(total=Sum("fuera_de_servicio"))
         .order_by("-total")[:5]
-    )
-    
+    ]
+
     # Top 5 servicios con más eventos de seguridad
-    top_eventos_seguridad = list(
-        RoundEntry.objects.filter(tiene_eventos_seguridad=True)
+    top_eventos_seguridad = [
+        item
+        async for item in DailyRollup.objects.filter(eventos__gt=0)
         .values("subservicio", "categoria")
-        .annotate(total=Count("id"))
+        .annotate(total=Sum("eventos"))
         .order_by("-total")[:5]
-    )
+    ]
 
-    semanal_cirugia = (
-        SurgeryRound.objects.values("semana_inicio")
-        .annotate(total=Count("id"))
-        .order_by("-semana_inicio")[:12]
-    )
+    semanal_cirugia = [
+        semana
+        async for semana in WeeklySurgeryRollup.objects.values("semana_inicio", "total").order_by("-semana_inicio")[:12]
+    ]
 
-    return render(
-        request,
-        "rondas/indicadores.html",
-        {
-            "resumen": resumen,
-            "semanal_cirugia": semanal_cirugia,
-            "equipos_fuera_servicio": equipos_fuera_servicio,
-            "eventos_seguridad": eventos_seguridad,
-            "top_fuera_servicio": top_fuera_servicio,
-            "top_eventos_seguridad": top_eventos_seguridad,
-        },
+    # Equipos de cirugía con más días fuera de servicio en las últimas 12 semanas
+    equipos_cirugia_fuera_servicio = [
+        equipo async for equipo in equipos_mas_fuera_de_servicio(timezone.localdate() - timedelta(weeks=12))
+    ]
+
+    with etapa("render"):
+        return await sync_to_async(render)(
+            request,
+            "rondas/indicadores.html",
+            {
+                "resumen": resumen,
+                "semanal_cirugia": semanal_cirugia,
+                "equipos_fuera_servicio": equipos_fuera_servicio,
+                "eventos_seguridad": eventos_seguridad,
+                "top_fuera_servicio": top_fuera_servicio,
+                "top_eventos_seguridad": top_eventos_seguridad,
+                "equipos_cirugia_fuera_servicio": equipos_cirugia_fuera_servicio,
+            },
+        )
+
+
+def _encolar_exportacion(request, formato):
+    """Crea el trabajo de exportación y envía al usuario a la página de seguimiento."""
+    trabajo = ExportJob.objects.create(
+        usuario=request.user,
+        formato=formato,
+        parametros={clave: request.POST.get(clave, "") for clave in ("categoria", "subservicio")},
     )
+    if not getattr(settings, "EXPORTACIONES_EN_SEGUNDO_PLANO", True):
+        # Sin worker (desarrollo local) el archivo se genera en la misma petición
+        ejecutar_exportacion(trabajo)
+    return redirect("exportacion_detalle", trabajo_id=trabajo.pk)
 
 
 @login_required
 @permission_required('rondas.view_roundentry', raise_exception=True)
+@require_POST
 def exportar_historial_pdf(request):
-    # Obtener registros regulares
-    registros = RoundEntry.objects.select_related("usuario")
-    categoria = request.GET.get("categoria")
-    if categoria:
-        registros = registros.filter(categoria=categoria)
-    subservicio = request.GET.get("subservicio")
-    if subservicio:
-        registros = registros.filter(subservicio__icontains=subservicio)
-    
-    # Obtener registros de cirugía
-    registros_cirugia = SurgeryRound.objects.select_related("usuario").order_by("-fecha_creacion")
-    if pisa is None:
-        # Si no está xhtml2pdf, descarga un TXT con los datos
-        contenido = "Fecha\tCategoría\tServicio\tHallazgo\tEventos\tPlaca\tOrden\tNombre Encargado Servicio\tFirma Servicio\tNombre Encargado Ronda\tFirma Ronda\tEstado\n"
-        for r in registros:
-            eventos_seg_text = 'Sí: ' + r.eventos_seguridad if r.tiene_eventos_seguridad and r.eventos_seguridad else ('Sí' if r.tiene_eventos_seguridad else 'No')
-            contenido += f"{r.fecha_creacion.strftime('%d/%m/%Y %H:%M')}\t{r.get_categoria_display()}\t{r.subservicio}\t{r.hallazgo}\t{eventos_seg_text}\t{r.placa_equipo}\t{r.orden_trabajo}\t{getattr(r, 'nombre_encargado_servicio', '')}\t{r.firma_servicio}\t{getattr(r, 'nombre_encargado_ronda', '')}\t{r.firma_ronda}\t{'Sin novedad' if r.sin_novedad else 'Con novedad'}\n"
-        response = HttpResponse(contenido, content_type="text/plain")
-        response['Content-Disposition'] = 'attachment; filename=historial.txt'
-        return response
-    html = render_to_string("rondas/historial_pdf.html", {
-        "registros": registros,
-        "registros_cirugia": registros_cirugia
-    })
-    response = HttpResponse(content_type="application/pdf")
-    pisa.CreatePDF(html, dest=response)
-    return response
+    return _encolar_exportacion(request, ExportJob.PDF)
 
 
 @login_required
 @permission_required('rondas.view_roundentry', raise_exception=True)
+@require_POST
 def exportar_historial_excel(request):
-    registros = RoundEntry.objects.select_related("usuario")
-    categoria = request.GET.get("categoria")
-    if categoria:
-        registros = registros.filter(categoria=categoria)
-    subservicio = request.GET.get("subservicio")
-    if subservicio:
-        registros = registros.filter(subservicio__icontains=subservicio)
-    if openpyxl is None:
-        # Si no está openpyxl, descarga un TXT con los datos
-        contenido = "Fecha\tCategoría\tServicio\tHallazgo\tEventos\tPlaca\tOrden\tNombre Encargado Servicio\tFirma Servicio\tNombre Encargado Ronda\tFirma Ronda\tEstado\n"
-        for r in registros:
-            contenido += f"{r.fecha_creacion.strftime('%d/%m/%Y %H:%M')}\t{r.get_categoria_display()}\t{r.subservicio}\t{r.hallazgo}\t{r.eventos_seguridad}\t{r.placa_equipo}\t{r.orden_trabajo}\t{getattr(r, 'nombre_encargado_servicio', '')}\t{r.firma_servicio}\t{getattr(r, 'nombre_encargado_ronda', '')}\t{r.firma_ronda}\t{'Sin novedad' if r.sin_novedad else 'Con novedad'}\n"
-        response = HttpResponse(contenido, content_type="text/plain")
-        response['Content-Disposition'] = 'attachment; filename=historial.txt'
-        return response
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.append(["Fecha", "Categoría", "Servicio", "Hallazgo", "Eventos", "Placa", "Orden", "Nombre Encargado Servicio", "Tiene Firma Servicio", "Nombre Encargado Ronda", "Tiene Firma Ronda", "Estado"])
-    for r in registros:
-        ws.append([
-            r.fecha_creacion.strftime("%d/%m/%Y %H:%M"),
-            r.get_categoria_display(),
-            r.subservicio,
-            r.hallazgo,
-            'Sí: ' + r.eventos_seguridad if r.tiene_eventos_seguridad and r.eventos_seguridad else ('Sí' if r.tiene_eventos_seguridad else 'No'),
-            r.placa_equipo,
-            r.orden_trabajo,
-            getattr(r, 'nombre_encargado_servicio', ''),
-            "Sí" if r.firma_servicio else "No",
-            getattr(r, 'nombre_encargado_ronda', ''),
-            "Sí" if r.firma_ronda else "No",
-            "Sin novedad" if r.sin_novedad else "Con novedad"
-        ])
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response['Content-Disposition'] = 'attachment; filename=historial.xlsx'
-    wb.save(response)
-    return response
+    return _encolar_exportacion(request, ExportJob.EXCEL)
 
 
+@login_required
+def exportacion_detalle(request, trabajo_id):
+    """Página de seguimiento de una exportación; con ``?formato=json`` responde el estado."""
+    trabajo = get_object_or_404(ExportJob, pk=trabajo_id, usuario=request.user)
+    if request.GET.get("formato") == "json":
+        return JsonResponse({
+            "estado": trabajo.estado,
+            "progreso": trabajo.progreso,
+            "terminado": trabajo.terminado,
+            "error": trabajo.error,
+        })
+    recientes = ExportJob.objects.filter(usuario=request.user).exclude(pk=trabajo.pk)[:10]
+    return render(request, "rondas/exportacion.html", {"trabajo": trabajo, "recientes": recientes})
+
+
+@login_required
+def exportacion_descargar(request, trabajo_id):
+    trabajo = get_object_or_404(
+        ExportJob, pk=trabajo_id, usuario=request.user, estado=ExportJob.COMPLETADO
+    )
+    if not trabajo.archivo:
+        raise Http404("El archivo de la exportación ya no está disponible")
+    return FileResponse(trabajo.archivo.open("rb"), as_attachment=True, filename=trabajo.nombre_archivo)
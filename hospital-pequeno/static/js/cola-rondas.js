@@ -0,0 +1,93 @@
+// Cola de registros de ronda capturados sin conexión (IndexedDB). La usan el panel
+// y el service worker; ambos la sincronizan con POST /rondas/sincronizar/ en lotes.
+(function (global) {
+    const BASE = 'rondas-sin-conexion';
+    const ALMACEN = 'pendientes';
+    const LOTE = 25;
+
+    function abrir() {
+        return new Promise(function (resolve, reject) {
+            const solicitud = indexedDB.open(BASE, 1);
+            solicitud.onupgradeneeded = function () {
+                solicitud.result.createObjectStore(ALMACEN, { keyPath: 'id', autoIncrement: true });
+            };
+            solicitud.onsuccess = function () { resolve(solicitud.result); };
+            solicitud.onerror = function () { reject(solicitud.error); };
+        });
+    }
+
+    // Ejecuta `accion(almacen)` en una transacción y devuelve el resultado de su solicitud
+    async function transaccion(modo, accion) {
+        const db = await abrir();
+        return new Promise(function (resolve, reject) {
+            const tx = db.transaction(ALMACEN, modo);
+            const solicitud = accion(tx.objectStore(ALMACEN));
+            tx.oncomplete = function () {
+                db.close();
+                resolve(solicitud ? solicitud.result : undefined);
+            };
+            tx.onerror = tx.onabort = function () {
+                db.close();
+                reject(tx.error);
+            };
+        });
+    }
+
+    // `registro` son los campos del formulario del panel; `csrf`, el token de la página
+    function agregar(registro, csrf) {
+        return transaccion('readwrite', function (almacen) {
+            return almacen.add({ registro: registro, csrf: csrf, creado: Date.now(), errores: null });
+        });
+    }
+
+    function listar() {
+        return transaccion('readonly', function (almacen) { return almacen.getAll(); });
+    }
+
+    function eliminar(id) {
+        return transaccion('readwrite', function (almacen) { return almacen.delete(id); });
+    }
+
+    // Envía los pendientes sin errores. Los guardados salen de la cola; los rechazados
+    // se quedan con sus errores hasta que el técnico los descarte. Devuelve los guardados.
+    async function sincronizar(url) {
+        const pendientes = (await listar()).filter(function (entrada) { return !entrada.errores; });
+        let guardados = 0;
+        for (let inicio = 0; inicio < pendientes.length; inicio += LOTE) {
+            const lote = pendientes.slice(inicio, inicio + LOTE);
+            const respuesta = await fetch(url, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': lote[lote.length - 1].csrf,
+                },
+                body: JSON.stringify({ registros: lote.map(function (entrada) { return entrada.registro; }) }),
+            });
+            // Con la sesión vencida la respuesta es la página de inicio de sesión
+            const tipo = respuesta.headers.get('Content-Type') || '';
+            if (!respuesta.ok || !tipo.includes('application/json')) {
+                throw new Error('La sincronización falló (' + respuesta.status + ')');
+            }
+            const datos = await respuesta.json();
+            await transaccion('readwrite', function (almacen) {
+                datos.guardados.forEach(function (guardado) {
+                    almacen.delete(lote[guardado.indice].id);
+                });
+                Object.entries(datos.errores).forEach(function ([indice, errores]) {
+                    almacen.put(Object.assign({}, lote[indice], { errores: errores }));
+                });
+            });
+            guardados += datos.guardados.length;
+        }
+        return guardados;
+    }
+
+    global.ColaRondas = {
+        ETIQUETA: 'rondas-pendientes',
+        agregar: agregar,
+        listar: listar,
+        eliminar: eliminar,
+        sincronizar: sincronizar,
+    };
+})(self);
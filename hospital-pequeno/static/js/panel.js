@@ -0,0 +1,565 @@
+// Panel de rondas: firmas en canvas, validación de los formularios de ronda,
+// captura sin conexión y formato semanal de salas de cirugía. Requiere
+// signature-capture.js y cola-rondas.js.
+
+function enableFirma(canvasId) {
+    const canvas = document.getElementById(canvasId);
+    if (!canvas) {
+        console.warn('Canvas no encontrado:', canvasId);
+        return;
+    }
+
+    const ctx = canvas.getContext('2d');
+    let dibujando = false;
+    // Trazos de la firma; es lo que se envía al servidor
+    canvas.trazos = [];
+
+    // Configurar el contexto
+    ctx.lineWidth = 2;
+    ctx.lineCap = 'round';
+    ctx.strokeStyle = '#000';
+
+    // Llenar fondo blanco
+    ctx.fillStyle = '#ffffff';
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+
+    function getPosition(e) {
+        const rect = canvas.getBoundingClientRect();
+        return {
+            x: (e.clientX || e.touches[0].clientX) - rect.left,
+            y: (e.clientY || e.touches[0].clientY) - rect.top
+        };
+    }
+
+    function startDrawing(e) {
+        e.preventDefault();
+        dibujando = true;
+        const pos = getPosition(e);
+        ctx.beginPath();
+        ctx.moveTo(pos.x, pos.y);
+        canvas.trazos.push([]);
+        SignatureVector.addPoint(canvas.trazos[canvas.trazos.length - 1], pos.x, pos.y, canvas.width, canvas.height);
+    }
+
+    function draw(e) {
+        if (!dibujando) return;
+        e.preventDefault();
+        const pos = getPosition(e);
+        ctx.lineTo(pos.x, pos.y);
+        ctx.stroke();
+        SignatureVector.addPoint(canvas.trazos[canvas.trazos.length - 1], pos.x, pos.y, canvas.width, canvas.height);
+    }
+
+    function stopDrawing(e) {
+        if (dibujando) {
+            e.preventDefault();
+            dibujando = false;
+        }
+    }
+
+    // Eventos de mouse
+    canvas.addEventListener('mousedown', startDrawing);
+    canvas.addEventListener('mousemove', draw);
+    canvas.addEventListener('mouseup', stopDrawing);
+    canvas.addEventListener('mouseleave', stopDrawing);
+
+    // Eventos táctiles
+    canvas.addEventListener('touchstart', startDrawing);
+    canvas.addEventListener('touchmove', draw);
+    canvas.addEventListener('touchend', stopDrawing);
+    canvas.addEventListener('touchcancel', stopDrawing);
+}
+
+function limpiarFirma(canvasId) {
+    const canvas = document.getElementById(canvasId);
+    if (!canvas) return;
+
+    const ctx = canvas.getContext('2d');
+    ctx.fillStyle = '#ffffff';
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+    canvas.trazos = [];
+}
+
+function guardarFirma(canvasId, inputId) {
+    const canvas = document.getElementById(canvasId);
+    const input = document.getElementById(inputId);
+
+    if (!canvas) {
+        console.error('Canvas no encontrado:', canvasId);
+        alert('Error: Canvas de firma no encontrado');
+        return;
+    }
+
+    if (!input) {
+        console.error('Input no encontrado:', inputId);
+        alert('Error: Campo de firma no encontrado');
+        return;
+    }
+
+    if (!canvas.trazos || canvas.trazos.length === 0) {
+        alert('Por favor, dibuje su firma antes de guardar');
+        return;
+    }
+
+    try {
+        // Se envían los trazos (menos de 1 KB) en lugar de la imagen del canvas
+        input.value = SignatureVector.encode(canvas.trazos, canvas.width, canvas.height);
+        alert('Firma guardada correctamente');
+    } catch (error) {
+        console.error('Error guardando firma:', error);
+        alert('Error guardando la firma: ' + error.message);
+    }
+}
+
+function actualizarEventosSeguridad(radio) {
+    // La descripción del evento solo se habilita si se reporta uno
+    const descripcionField = radio.closest('form').querySelector('textarea[name$="eventos_seguridad"]');
+    if (!descripcionField || !radio.checked) return;
+
+    if (radio.value === 'True') {
+        descripcionField.disabled = false;
+        descripcionField.required = true;
+    } else {
+        descripcionField.disabled = true;
+        descripcionField.required = false;
+        descripcionField.value = '';
+    }
+}
+
+// Una firma con un solo trazo corto ocupa pocos bytes: se revisa el formato, no el largo
+function firmaPresente(input) {
+    const valor = input.value;
+    return valor.startsWith(`data:${SignatureVector.CONTENT_TYPE};base64,`) || valor.startsWith('data:image/');
+}
+
+function validarFormularioRonda(form, e) {
+    const sinNovedadField = form.querySelector('input[name$="sin_novedad"]');
+    if (sinNovedadField && sinNovedadField.value === 'True') return;
+
+    // Validar que los campos de nombres estén llenos
+    const nombreServicio = form.querySelector('input[name$="nombre_encargado_servicio"]');
+    const nombreRonda = form.querySelector('input[name$="nombre_encargado_ronda"]');
+
+    if (nombreServicio && !nombreServicio.value.trim()) {
+        e.preventDefault();
+        alert('Por favor, ingrese el nombre del encargado del servicio.');
+        nombreServicio.focus();
+        return;
+    }
+
+    if (nombreRonda && !nombreRonda.value.trim()) {
+        e.preventDefault();
+        alert('Por favor, ingrese el nombre del encargado de la ronda.');
+        nombreRonda.focus();
+        return;
+    }
+
+    // Validar que las firmas estén presentes
+    const firmaServicio = form.querySelector('input[name$="firma_servicio"]');
+    const firmaRonda = form.querySelector('input[name$="firma_ronda"]');
+
+    if (firmaServicio && !firmaPresente(firmaServicio)) {
+        e.preventDefault();
+        alert('Por favor, firme el campo "Firma encargado del servicio".');
+        return;
+    }
+
+    if (firmaRonda && !firmaPresente(firmaRonda)) {
+        e.preventDefault();
+        alert('Por favor, firme el campo "Firma encargado de la ronda".');
+    }
+}
+
+function prepararFormularioRonda(form) {
+    const sinNovedadButton = form.querySelector('[data-action="sin-novedad"]');
+    const guardarButton = form.querySelector('[data-action="guardar"]');
+    const sinNovedadField = form.querySelector('input[name$="sin_novedad"]');
+    const camposBloqueables = form.querySelectorAll('textarea, input[type="text"]:not([name$="firma_servicio"]):not([name$="firma_ronda"])');
+
+    form.addEventListener('submit', function (e) {
+        validarFormularioRonda(form, e);
+        if (e.defaultPrevented || !capturaDiferida()) return;
+        e.preventDefault();
+        encolarRonda(form);
+    });
+
+    sinNovedadButton?.addEventListener('click', function () {
+        camposBloqueables.forEach(function (campo) {
+            campo.value = '';
+            campo.setAttribute('disabled', 'disabled');
+        });
+        sinNovedadField.value = 'True';
+        if (capturaDiferida()) {
+            encolarRonda(form);
+        } else {
+            form.submit();
+        }
+    });
+
+    guardarButton?.addEventListener('click', function () {
+        camposBloqueables.forEach(function (campo) {
+            campo.removeAttribute('disabled');
+        });
+        sinNovedadField.value = 'False';
+    });
+}
+
+// Captura sin conexión: sin red, o si el técnico lo eligió, los registros se
+// guardan en el dispositivo y se envían juntos al sincronizar.
+const MODO_SIN_CONEXION = 'rondas-modo-sin-conexion';
+let registroServiceWorker = Promise.resolve(null);
+
+function capturaDiferida() {
+    return Boolean(window.ColaRondas && window.indexedDB) &&
+        (!navigator.onLine || localStorage.getItem(MODO_SIN_CONEXION) === '1');
+}
+
+function datosRonda(form) {
+    const datos = Object.fromEntries(new FormData(form));
+    delete datos.csrfmiddlewaretoken;
+    delete datos.tipo_formulario;
+    datos.usuario = document.getElementById('cola-rondas').dataset.usuario;
+    return datos;
+}
+
+// Clave de idempotencia de un envío (ver rondas/idempotencia.py)
+function nuevaClave() {
+    if (crypto.randomUUID) return crypto.randomUUID();
+    // Sin HTTPS (red local) randomUUID no existe: UUID v4 con getRandomValues
+    return '10000000-1000-4000-8000-100000000000'.replace(/[018]/g, function (c) {
+        return (c ^ crypto.getRandomValues(new Uint8Array(1))[0] & 15 >> c / 4).toString(16);
+    });
+}
+
+function restablecerFormularioRonda(form) {
+    form.reset();
+    form.querySelector('input[name="clave_idempotencia"]').value = nuevaClave();
+    form.querySelectorAll('canvas').forEach(function (canvas) {
+        limpiarFirma(canvas.id);
+    });
+    // reset() no limpia los campos ocultos
+    form.querySelectorAll('input[name$="firma_servicio"], input[name$="firma_ronda"]').forEach(function (input) {
+        input.value = '';
+    });
+    form.querySelector('input[name$="sin_novedad"]').value = 'False';
+    form.querySelectorAll('textarea, input[type="text"]').forEach(function (campo) {
+        campo.removeAttribute('disabled');
+    });
+    const descripcion = form.querySelector('textarea[name$="eventos_seguridad"]');
+    if (descripcion) {
+        descripcion.disabled = true;
+        descripcion.required = false;
+    }
+}
+
+async function encolarRonda(form) {
+    try {
+        await ColaRondas.agregar(datosRonda(form), form.querySelector('input[name="csrfmiddlewaretoken"]').value);
+    } catch (error) {
+        console.error('Error guardando el registro en el dispositivo:', error);
+        alert('No se pudo guardar el registro en el dispositivo: ' + error.message);
+        return;
+    }
+    restablecerFormularioRonda(form);
+    const collapse = form.closest('.collapse');
+    if (collapse && window.bootstrap) {
+        bootstrap.Collapse.getOrCreateInstance(collapse).hide();
+    }
+    alert('Registro guardado en el dispositivo. Se enviará al sincronizar.');
+    actualizarCola();
+}
+
+async function actualizarCola(mensaje) {
+    const panel = document.getElementById('cola-rondas');
+    const entradas = await ColaRondas.listar();
+    const rechazadas = entradas.filter(function (entrada) { return entrada.errores; });
+    const pendientes = entradas.length - rechazadas.length;
+
+    const partes = [];
+    if (mensaje) partes.push(mensaje);
+    if (pendientes) partes.push(pendientes + ' registro(s) pendiente(s) de sincronizar');
+    if (!navigator.onLine) partes.push('Sin conexión');
+    panel.querySelector('[data-cola-estado]').textContent = partes.join(' • ');
+    panel.querySelector('[data-action="sincronizar"]').classList.toggle('d-none', !pendientes || !navigator.onLine);
+
+    // Los rechazados por el servidor se muestran con sus errores hasta descartarlos
+    const lista = panel.querySelector('[data-cola-rechazados]');
+    lista.replaceChildren(...rechazadas.map(function (entrada) {
+        const item = document.createElement('li');
+        item.className = 'list-group-item d-flex align-items-center gap-2 small';
+        const texto = document.createElement('span');
+        texto.textContent = '❌ ' + entrada.registro.subservicio + ': ' + Object.values(entrada.errores).flat().join(' ');
+        const descartar = document.createElement('button');
+        descartar.type = 'button';
+        descartar.className = 'btn btn-sm btn-outline-danger ms-auto';
+        descartar.textContent = 'Descartar';
+        descartar.addEventListener('click', async function () {
+            if (confirm('¿Descartar este registro? Tendrá que capturarlo de nuevo.')) {
+                await ColaRondas.eliminar(entrada.id);
+                actualizarCola();
+            }
+        });
+        item.append(texto, descartar);
+        return item;
+    }));
+    lista.classList.toggle('d-none', !rechazadas.length);
+}
+
+async function sincronizarCola() {
+    if (!navigator.onLine) return;
+    const registro = await registroServiceWorker;
+    if (registro && 'sync' in registro) {
+        try {
+            // El service worker envía la cola y el navegador reintenta si falla
+            await registro.sync.register(ColaRondas.ETIQUETA);
+            return;
+        } catch (error) {
+            console.warn('Sincronización en segundo plano no disponible:', error);
+        }
+    }
+    const panel = document.getElementById('cola-rondas');
+    try {
+        const guardados = await ColaRondas.sincronizar(panel.dataset.sincronizarUrl);
+        actualizarCola(guardados ? guardados + ' registro(s) sincronizado(s)' : '');
+    } catch (error) {
+        console.warn('Error sincronizando la cola de rondas:', error);
+        actualizarCola('No se pudo sincronizar; se reintentará al recuperar la conexión');
+    }
+}
+
+function prepararCola(panel) {
+    const interruptor = panel.querySelector('#modo-sin-conexion');
+    interruptor.checked = localStorage.getItem(MODO_SIN_CONEXION) === '1';
+    interruptor.addEventListener('change', function () {
+        localStorage.setItem(MODO_SIN_CONEXION, interruptor.checked ? '1' : '0');
+    });
+    panel.querySelector('[data-action="sincronizar"]').addEventListener('click', sincronizarCola);
+
+    if ('serviceWorker' in navigator) {
+        registroServiceWorker = navigator.serviceWorker.register(panel.dataset.serviceWorker).catch(function (error) {
+            console.warn('No se pudo registrar el service worker:', error);
+            return null;
+        });
+        navigator.serviceWorker.addEventListener('message', function (e) {
+            if (e.data && e.data.tipo === 'rondas-sincronizadas') {
+                actualizarCola(e.data.guardados ? e.data.guardados + ' registro(s) sincronizado(s)' : '');
+            }
+        });
+    }
+
+    window.addEventListener('online', sincronizarCola);
+    window.addEventListener('offline', function () { actualizarCola(); });
+    actualizarCola();
+    // En modo sin conexión se espera a que el técnico sincronice
+    if (!interruptor.checked) {
+        sincronizarCola();
+    }
+}
+
+// Resumen de estados seleccionados en el formato de cirugía
+function mostrarEstadisticas() {
+    const selects = document.querySelectorAll('.estado-equipo');
+    let completo = 0, parcial = 0, fuera = 0, sinSeleccionar = 0;
+
+    selects.forEach(select => {
+        switch (select.value) {
+            case 'operativo_completo': completo++; break;
+            case 'operativo_parcial': parcial++; break;
+            case 'fuera_de_servicio': fuera++; break;
+            default: sinSeleccionar++; break;
+        }
+    });
+
+    let statsDiv = document.getElementById('stats-cirugia');
+    if (!statsDiv) {
+        statsDiv = document.createElement('div');
+        statsDiv.id = 'stats-cirugia';
+        statsDiv.className = 'alert alert-info mt-3';
+        document.querySelector('#form-cirugia .table-responsive').after(statsDiv);
+    }
+
+    statsDiv.innerHTML = `
+        <strong>📊 Resumen actual:</strong>
+        <span class="badge bg-success ms-2">Completo: ${completo}</span>
+        <span class="badge bg-warning ms-2">Parcial: ${parcial}</span>
+        <span class="badge bg-danger ms-2">Fuera: ${fuera}</span>
+        <span class="badge bg-secondary ms-2">Sin seleccionar: ${sinSeleccionar}</span>
+    `;
+}
+
+// Grilla del día para POST /cirugia/diario/ (formato en rondas/cirugia_diaria.py).
+// La columna del día es la única de la tabla; sin estado el equipo no está en uso.
+function grillaDiaria(formCirugia, fecha) {
+    const valor = function (nombre) {
+        return formCirugia.querySelector('[name="' + nombre + '"]').value;
+    };
+    return {
+        fecha: fecha,
+        nombre_encargado_servicio: valor('nombre_encargado_servicio'),
+        nombre_encargado_ronda: valor('nombre_encargado_ronda'),
+        firma_servicio: valor('firma_servicio'),
+        firma_ronda: valor('firma_ronda'),
+        celdas: Array.from(formCirugia.querySelectorAll('tbody tr'), function (row) {
+            const estado = row.querySelector('.estado-equipo').value;
+            return {
+                sala: row.dataset.sala,
+                equipo: row.dataset.equipo,
+                equipo_en_uso: Boolean(estado),
+                estado_equipo: estado,
+                observaciones: '',
+            };
+        }),
+    };
+}
+
+function mostrarErroresDiarios(formCirugia, datos) {
+    const filas = formCirugia.querySelectorAll('tbody tr');
+    filas.forEach(function (row) {
+        const select = row.querySelector('.estado-equipo');
+        select.classList.remove('is-invalid');
+        select.removeAttribute('aria-invalid');
+    });
+
+    const mensajes = Object.values(datos.errores || {}).flat();
+    Object.entries(datos.errores_celdas || {}).forEach(function ([indice, errores]) {
+        const row = filas[indice];
+        const select = row.querySelector('.estado-equipo');
+        select.classList.add('is-invalid');
+        select.setAttribute('aria-invalid', 'true');
+        mensajes.push('Sala ' + row.dataset.sala + ' - ' + row.dataset.equipo + ': ' + Object.values(errores).flat().join(' '));
+    });
+
+    const alerta = formCirugia.querySelector('[data-errores-dia]');
+    alerta.replaceChildren(...mensajes.map(function (mensaje) {
+        const linea = document.createElement('div');
+        linea.textContent = mensaje;
+        return linea;
+    }));
+    alerta.classList.toggle('d-none', !mensajes.length);
+}
+
+async function guardarGrillaDiaria(formCirugia, boton) {
+    // La misma clave mientras no cambie la grilla: reintentar no guarda dos veces
+    if (!boton.dataset.clave) boton.dataset.clave = nuevaClave();
+    boton.disabled = true;
+    try {
+        const respuesta = await fetch(boton.dataset.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': formCirugia.querySelector('input[name="csrfmiddlewaretoken"]').value,
+                'Idempotency-Key': boton.dataset.clave,
+            },
+            body: JSON.stringify(grillaDiaria(formCirugia, boton.dataset.fecha)),
+        });
+        // Con la sesión vencida la respuesta es la página de inicio de sesión
+        const tipo = respuesta.headers.get('Content-Type') || '';
+        if (!tipo.includes('application/json')) {
+            throw new Error('El servidor respondió ' + respuesta.status);
+        }
+        const datos = await respuesta.json();
+        mostrarErroresDiarios(formCirugia, datos);
+        if (datos.success) {
+            delete boton.dataset.clave;
+            alert('Registro del día guardado: ' + datos.guardadas + ' equipo(s).');
+        }
+    } catch (error) {
+        console.error('Error guardando el registro del día:', error);
+        alert('No se pudo guardar el registro del día: ' + error.message);
+    } finally {
+        boton.disabled = false;
+    }
+}
+
+function prepararFormularioCirugia(formCirugia) {
+    const botonDia = formCirugia.querySelector('[data-action="guardar-dia"]');
+    botonDia?.addEventListener('click', function () {
+        guardarGrillaDiaria(formCirugia, botonDia);
+    });
+    // Una grilla distinta es otro envío, con otra clave
+    formCirugia.addEventListener('input', function () {
+        if (botonDia) delete botonDia.dataset.clave;
+    });
+
+    formCirugia.addEventListener('submit', function () {
+        const payloadField = formCirugia.querySelector('input[name="payload"]');
+        const data = {};
+
+        formCirugia.querySelectorAll('tbody tr').forEach(function (row) {
+            const sala = row.dataset.sala;
+            const equipo = row.dataset.equipo;
+            if (!data[sala]) {
+                data[sala] = {};
+            }
+            if (!data[sala][equipo]) {
+                data[sala][equipo] = {};
+            }
+            row.querySelectorAll('.estado-equipo').forEach(function (select) {
+                data[sala][equipo][select.dataset.dia] = select.value;
+            });
+        });
+
+        payloadField.value = JSON.stringify(data);
+    });
+
+    // Colores de los selects según el estado
+    formCirugia.addEventListener('change', function (e) {
+        const select = e.target;
+        if (!select.classList.contains('estado-equipo')) return;
+
+        select.classList.remove('bg-success', 'bg-warning', 'bg-danger', 'text-white');
+        if (select.value === 'operativo_completo') {
+            select.classList.add('bg-success', 'text-white');
+        } else if (select.value === 'operativo_parcial') {
+            select.classList.add('bg-warning', 'text-white');
+        } else if (select.value === 'fuera_de_servicio') {
+            select.classList.add('bg-danger', 'text-white');
+        }
+        mostrarEstadisticas();
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    // Una clave por formulario y carga del panel; reenviarlo repite la misma
+    document.querySelectorAll('input[name="clave_idempotencia"]').forEach(function (input) {
+        input.value = nuevaClave();
+    });
+
+    // Canvas de los formularios de ronda y del formato de cirugía
+    document.querySelectorAll('canvas[id^="canvas_servicio_"], canvas[id^="canvas_ronda_"]').forEach(function (canvas) {
+        enableFirma(canvas.id);
+    });
+
+    document.querySelectorAll('.btn-clear-signature').forEach(function (btn) {
+        btn.addEventListener('click', function () {
+            if (this.dataset.canvas === 'servicio-cirugia') {
+                limpiarFirma('canvas_servicio_cirugia');
+            } else if (this.dataset.canvas === 'ronda-cirugia') {
+                limpiarFirma('canvas_ronda_cirugia');
+            }
+        });
+    });
+
+    document.querySelectorAll('input[name$="tiene_eventos_seguridad"]').forEach(function (radio) {
+        radio.addEventListener('change', function () {
+            actualizarEventosSeguridad(this);
+            if (this.value === 'True' && this.checked) {
+                this.closest('form').querySelector('textarea[name$="eventos_seguridad"]')?.focus();
+            }
+        });
+        actualizarEventosSeguridad(radio);
+    });
+
+    document.querySelectorAll('.form-ronda').forEach(prepararFormularioRonda);
+
+    const cola = document.getElementById('cola-rondas');
+    if (cola && window.ColaRondas && window.indexedDB) {
+        prepararCola(cola);
+    }
+
+    const formCirugia = document.getElementById('form-cirugia');
+    if (formCirugia) {
+        prepararFormularioCirugia(formCirugia);
+    }
+});
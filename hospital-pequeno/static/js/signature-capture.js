@@ -3,6 +3,59 @@
  * Para uso en formularios de rondas biomédicas
  */
 
+/**
+ * Codificación vectorial de las firmas (el servidor la lee en rondas/trazos.py).
+ * Enteros en varint: versión, ancho, alto y cantidad de trazos; por trazo, la
+ * cantidad de puntos, el primer punto y las diferencias con el anterior en zigzag.
+ */
+const SignatureVector = {
+    CONTENT_TYPE: 'application/x-firma-trazos',
+    VERSION: 1,
+
+    writeVarint(bytes, value) {
+        while (value >= 0x80) {
+            bytes.push((value & 0x7f) | 0x80);
+            value >>>= 7;
+        }
+        bytes.push(value);
+    },
+
+    zigzag(value) {
+        return value >= 0 ? value * 2 : -value * 2 - 1;
+    },
+
+    // Agrega un punto al trazo, redondeado y dentro del canvas; omite repetidos
+    addPoint(stroke, x, y, width, height) {
+        const px = Math.min(Math.max(Math.round(x), 0), width);
+        const py = Math.min(Math.max(Math.round(y), 0), height);
+        const last = stroke[stroke.length - 1];
+        if (!last || last[0] !== px || last[1] !== py) {
+            stroke.push([px, py]);
+        }
+    },
+
+    encode(strokes, width, height) {
+        const bytes = [];
+        const validStrokes = strokes.filter(stroke => stroke.length > 0);
+        [this.VERSION, width, height, validStrokes.length].forEach(value => this.writeVarint(bytes, value));
+        validStrokes.forEach(stroke => {
+            this.writeVarint(bytes, stroke.length);
+            let [lastX, lastY] = stroke[0];
+            this.writeVarint(bytes, lastX);
+            this.writeVarint(bytes, lastY);
+            stroke.slice(1).forEach(([x, y]) => {
+                this.writeVarint(bytes, this.zigzag(x - lastX));
+                this.writeVarint(bytes, this.zigzag(y - lastY));
+                lastX = x;
+                lastY = y;
+            });
+        });
+        let binary = '';
+        bytes.forEach(byte => { binary += String.fromCharCode(byte); });
+        return `data:${this.CONTENT_TYPE};base64,${btoa(binary)}`;
+    }
+};
+
 class SignatureCapture {
     constructor(canvasId, hiddenInputId) {
         this.canvas = document.getElementById(canvasId);
@@ -11,6 +64,7 @@ class SignatureCapture {
         this.isDrawing = false;
         this.lastX = 0;
         this.lastY = 0;
+        this.strokes = [];
         
         this.setupCanvas();
         this.bindEvents();
@@ -66,6 +120,12 @@ class SignatureCapture {
         const pos = this.getMousePos(e);
         this.lastX = pos.x;
         this.lastY = pos.y;
+        this.strokes.push([]);
+        this.addPoint(pos);
+    }
+    
+    addPoint(pos) {
+        SignatureVector.addPoint(this.strokes[this.strokes.length - 1], pos.x, pos.y, this.canvas.width, this.canvas.height);
     }
     
     draw(e) {
@@ -80,9 +140,7 @@ class SignatureCapture {
         
         this.lastX = pos.x;
         this.lastY = pos.y;
-        
-        // Actualizar input oculto con la imagen
-        this.updateHiddenInput();
+        this.addPoint(pos);
     }
     
     handleTouch(e) {
@@ -103,27 +161,21 @@ class SignatureCapture {
     }
     
     updateHiddenInput() {
-        // Convertir canvas a base64 con calidad optimizada
-        const dataURL = this.canvas.toDataURL('image/jpeg', 0.8);
-        this.hiddenInput.value = dataURL;
+        // Se envían los trazos, no la imagen del canvas
+        this.hiddenInput.value = this.isEmpty()
+            ? ''
+            : SignatureVector.encode(this.strokes, this.canvas.width, this.canvas.height);
     }
     
     clear() {
         this.ctx.fillStyle = '#ffffff';
         this.ctx.fillRect(0, 0, this.canvas.width, this.canvas.height);
+        this.strokes = [];
         this.hiddenInput.value = '';
     }
     
     isEmpty() {
-        // Verificar si el canvas está vacío (solo fondo blanco)
-        const blank = document.createElement('canvas');
-        blank.width = this.canvas.width;
-        blank.height = this.canvas.height;
-        const blankCtx = blank.getContext('2d');
-        blankCtx.fillStyle = '#ffffff';
-        blankCtx.fillRect(0, 0, blank.width, blank.height);
-        
-        return this.canvas.toDataURL() === blank.toDataURL();
+        return this.strokes.length === 0;
     }
 }
 
@@ -0,0 +1,81 @@
+// Service worker del panel de rondas (ver rondas.views.service_worker).
+// Guarda el panel y sus estáticos para abrirlo sin conexión y sincroniza la cola
+// de registros (cola-rondas.js) cuando el navegador recupera la conexión.
+importScripts('{{ cola }}');
+
+const CACHE = 'panel-{{ version }}';
+const PANEL = '{% url 'panel_principal' %}';
+const SINCRONIZAR = '{% url 'sincronizar_rondas' %}';
+const ARCHIVOS = {{ archivos|safe }};
+
+self.addEventListener('install', function (evento) {
+    // Un archivo del CDN que no responde no impide instalar el resto
+    evento.waitUntil(
+        caches.open(CACHE)
+            .then(function (cache) {
+                return Promise.all(ARCHIVOS.map(function (url) {
+                    return cache.add(url).catch(function () {});
+                }));
+            })
+            .then(function () { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function (evento) {
+    evento.waitUntil(
+        caches.keys()
+            .then(function (claves) {
+                return Promise.all(claves
+                    .filter(function (clave) { return clave.startsWith('panel-') && clave !== CACHE; })
+                    .map(function (clave) { return caches.delete(clave); }));
+            })
+            .then(function () { return self.clients.claim(); })
+    );
+});
+
+self.addEventListener('fetch', function (evento) {
+    const solicitud = evento.request;
+    if (solicitud.method !== 'GET') return;
+    const url = new URL(solicitud.url);
+
+    // El panel: primero la red; sin conexión, la última copia
+    if (solicitud.mode === 'navigate' && url.origin === location.origin && url.pathname === PANEL) {
+        evento.respondWith(
+            fetch(solicitud)
+                .then(function (respuesta) {
+                    if (respuesta.ok && !respuesta.redirected) {
+                        const copia = respuesta.clone();
+                        caches.open(CACHE).then(function (cache) { cache.put(PANEL, copia); });
+                    }
+                    return respuesta;
+                })
+                .catch(function () {
+                    return caches.match(PANEL).then(function (copia) { return copia || Response.error(); });
+                })
+        );
+        return;
+    }
+
+    // Estáticos versionados: primero la caché
+    const clave = url.origin === location.origin ? url.pathname : url.href;
+    if (ARCHIVOS.includes(clave)) {
+        evento.respondWith(
+            caches.match(solicitud).then(function (copia) { return copia || fetch(solicitud); })
+        );
+    }
+});
+
+async function sincronizarCola() {
+    const guardados = await ColaRondas.sincronizar(SINCRONIZAR);
+    const clientes = await self.clients.matchAll({ type: 'window' });
+    clientes.forEach(function (cliente) {
+        cliente.postMessage({ tipo: 'rondas-sincronizadas', guardados: guardados });
+    });
+}
+
+// Si la sincronización falla, el navegador la reintenta más tarde
+self.addEventListener('sync', function (evento) {
+    if (evento.tag === ColaRondas.ETIQUETA) {
+        evento.waitUntil(sincronizarCola());
+    }
+});